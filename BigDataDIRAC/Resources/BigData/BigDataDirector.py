@@ -13,6 +13,8 @@ from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV1Interactive        imp
 from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV2Interactive        import HadoopV2Interactive
 from BigDataDIRAC.WorkloadManagementSystem.Client.HiveV1                     import HiveV1
 from BigDataDIRAC.WorkloadManagementSystem.Client.Twister                    import Twister
+from BigDataDIRAC.WorkloadManagementSystem.Client.BigDataClientRegistry      import gBigDataClientRegistry
+from BigDataDIRAC.WorkloadManagementSystem.private.InteractiveJobWatcher      import gInteractiveJobWatcher
 
 __RCSID__ = '$Id: $'
 
@@ -20,6 +22,8 @@ class BigDataDirector( SoftBigDataDirector ):
   def __init__( self, submitPool ):
 
     SoftBigDataDirector.__init__( self, submitPool )
+    # Keep following the interactive jobs launched before a restart
+    gInteractiveJobWatcher.resume()
 
   def configure( self, csSection, submitPool ):
     """
@@ -61,11 +65,13 @@ class BigDataDirector( SoftBigDataDirector ):
       if driverversion == "hdv1":
         if HHLName == "none":
           self.log.info( "Hadoop Job Submission" )
-          hdv1 = HadoopV1( NameNode, Port, jobID, PublicIP, User, JobName, dataset )
+          hdv1 = HadoopV1( NameNode, Port, jobID, PublicIP, User, JobName, dataset,
+                           self.__getClient( runningEndPointName ) )
           if ( UsePilot == '1' ):
             result = hdv1.submitNewBigPilot()
           if ( IsInteractive == '1' ):
-            hdv1 = HadoopV1Interactive( NameNode, Port, jobID, PublicIP, User, JobName, dataset )
+            hdv1 = HadoopV1Interactive( NameNode, Port, jobID, PublicIP, User, JobName, dataset,
+                                        self.__getClient( runningEndPointName, True ) )
             result = hdv1.submitNewBigJob()
           else:
             result = hdv1.submitNewBigJob()
@@ -77,7 +83,8 @@ class BigDataDirector( SoftBigDataDirector ):
           self.log.info( "Hadoop Pig Job Submission" )
         if HHLName == "hive":
           self.log.info( "Hadoop-Hive Job Submission" )
-          hive1 = HiveV1( NameNode, Port, jobID, PublicIP, User, JobName, dataset )
+          hive1 = HiveV1( NameNode, Port, jobID, PublicIP, User, JobName, dataset,
+                          self.__getClient( runningEndPointName ) )
           result = hive1.submitNewBigJob()
           if not result[ 'OK' ]:
             return result
@@ -86,11 +93,13 @@ class BigDataDirector( SoftBigDataDirector ):
       if driverversion == "hdv2":
         if HHLName == "none":
           self.log.info( "Hadoop Job Submission" )
-          hdv2 = HadoopV2( NameNode, Port, jobID, PublicIP, User, JobName, dataset )
+          hdv2 = HadoopV2( NameNode, Port, jobID, PublicIP, User, JobName, dataset,
+                           self.__getClient( runningEndPointName ) )
           if ( UsePilot == '1' ):
             result = hdv2.submitNewBigPilot()
           if ( IsInteractive == '1' ):
-            hdv2 = HadoopV2Interactive( NameNode, Port, jobID, PublicIP, User, JobName, dataset )
+            hdv2 = HadoopV2Interactive( NameNode, Port, jobID, PublicIP, User, JobName, dataset,
+                                        self.__getClient( runningEndPointName, True ) )
             result = hdv2.submitNewBigJob()
           else:
             result = hdv2.submitNewBigJob()
@@ -102,7 +111,8 @@ class BigDataDirector( SoftBigDataDirector ):
           self.log.info( "Hadoop Pig Job Submission" )
         if HHLName == "hive":
           self.log.info( "Hadoop-Hive Job Submission" )
-          hive1 = HiveV1( NameNode, Port, jobID, PublicIP, User, JobName, dataset )
+          hive1 = HiveV1( NameNode, Port, jobID, PublicIP, User, JobName, dataset,
+                          self.__getClient( runningEndPointName ) )
           result = hive1.submitNewBigJob()
           if not result[ 'OK' ]:
             return result
@@ -119,3 +129,51 @@ class BigDataDirector( SoftBigDataDirector ):
 
     return S_ERROR( 'Unknown DIRAC BigData driver %s' % driver )
 
+  def isBatchSubmissionSupported( self, jobToSubmit ):
+    """
+     Plain Hadoop jobs, neither pilots nor interactive, are submitted in batches
+    """
+    return ( jobToSubmit['BdSoftware'] == 'hadoop' and
+             jobToSubmit['BdSoftwareVersion'] in ( 'hdv1', 'hdv2' ) and
+             jobToSubmit['HLLName'] == 'none' and
+             jobToSubmit['UsePilot'] != '1' and
+             jobToSubmit['IsInteractive'] != '1' )
+
+  def _submitBigDataJobsBatch( self, runningEndPointName, jobsToSubmit ):
+    """
+     Write every job locally, then upload and submit all of them through the
+     shared client of the endpoint, returns { JobID: HadoopID }
+    """
+    client = self.__getClient( runningEndPointName )
+    if not client:
+      return S_ERROR( 'No client for %s' % runningEndPointName )
+
+    jobs = {}
+    for jobToSubmit in jobsToSubmit:
+      if jobToSubmit['BdSoftwareVersion'] == 'hdv1':
+        submitter = HadoopV1
+      else:
+        submitter = HadoopV2
+      hadoop = submitter( jobToSubmit['BigDataEndpointNameNode'], jobToSubmit['Port'], jobToSubmit['JobId'],
+                          jobToSubmit['PublicIP'], jobToSubmit['User'], jobToSubmit['JobName'],
+                          jobToSubmit['Dataset'], client )
+      result = hadoop.prepareNewBigJob()
+      if not result[ 'OK' ]:
+        self.log.error( 'Job %s not prepared:' % jobToSubmit['JobId'], result['Message'] )
+        continue
+      jobs[int( jobToSubmit['JobId'] )] = result['Value']
+    if not jobs:
+      return S_ERROR( 'No job prepared for %s' % runningEndPointName )
+
+    return client.jobSubmitBatch( jobs )
+
+  def __getClient( self, runningEndPointName, interactive = False ):
+    """
+     Shared client of the endpoint, None lets the submitter build its own
+    """
+    result = gBigDataClientRegistry.getClient( runningEndPointName, interactive )
+    if not result['OK']:
+      self.log.warn( 'No shared client for %s:' % runningEndPointName, result['Message'] )
+      return None
+    return result['Value']
+
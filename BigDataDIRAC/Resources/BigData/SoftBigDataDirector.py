@@ -123,12 +123,15 @@ class SoftBigDataDirector:
                                               runningSiteName, PublicIP, "", "",
                                               "", BigDataSoftware, BigDataSoftwareVersion, HLLName,
                                               HLLVersion, "Submitted" )
+    if not newJob[ 'OK' ]:
+      return newJob
 
     self.log.info( 'Director:submitBigDataJobs:SubmitJob' )
     dictBDJobSubmitted = self._submitBigDataJobs( NameNode, Port, jobIds, PublicIP,
                                                   runningEndPointName, User, JobName, dataset, UsePilot, IsInteractive )
 
     if not dictBDJobSubmitted[ 'OK' ]:
+      self.__cancelSubmission( [ jobIds ] )
       return dictBDJobSubmitted
     bdjobID = dictBDJobSubmitted['Value']
     result = BigDataDB.setHadoopID( jobIds, bdjobID )
@@ -144,5 +147,77 @@ class SoftBigDataDirector:
 
     return S_OK( "OK" )
 
+  def isBatchSubmissionSupported( self, jobToSubmit ):
+    """
+    Whether the job can be submitted with submitBigDataJobsBatch
+    """
+    return False
+
+  def submitBigDataJobsBatch( self, runningEndPointName, jobsToSubmit ):
+    """
+    Big Data submission of several jobs to the same endpoint, jobsToSubmit is the
+    list of job descriptions built by the BigDataJobScheduler
+    """
+    self.log.info( 'Director:submitBigDataJobsBatch:%s jobs to %s' % ( len( jobsToSubmit ), runningEndPointName ) )
+
+    jobsToSubmitDict = {}
+    for jobToSubmit in jobsToSubmit:
+      if jobToSubmit['NumBigDataJobsAllowedToSubmit'] <= 0:
+        self.log.error( "Number of slots reached for %s in the NameNode " % jobToSubmit['SiteName'],
+                        jobToSubmit['BigDataEndpointNameNode'] )
+        continue
+      if jobToSubmit['BigDataEndpointNameNode'] not in self.runningEndPoints[jobToSubmit['BigDataEndpoint']]['NameNode']:
+        self.log.error( 'Unknown NameNode: %s' % jobToSubmit['BigDataEndpointNameNode'] )
+        continue
+      newJob = BigDataDB.insertBigDataJob( jobToSubmit['JobId'], jobToSubmit['JobName'], Time.toString(),
+                                           jobToSubmit['BigDataEndpointNameNode'], jobToSubmit['SiteName'],
+                                           jobToSubmit['PublicIP'], "", "", "", jobToSubmit['BdSoftware'],
+                                           jobToSubmit['BdSoftwareVersion'], jobToSubmit['HLLName'],
+                                           jobToSubmit['HLLVersion'], "Submitted" )
+      if not newJob[ 'OK' ]:
+        self.log.error( 'BigData job not inserted:', jobToSubmit['JobId'] )
+        continue
+      jobsToSubmitDict[int( jobToSubmit['JobId'] )] = jobToSubmit
+    if not jobsToSubmitDict:
+      return S_ERROR( 'No job to submit to %s' % runningEndPointName )
+
+    self.log.info( 'Director:submitBigDataJobsBatch:SubmitJobs' )
+    result = self._submitBigDataJobsBatch( runningEndPointName, jobsToSubmitDict.values() )
+    if not result[ 'OK' ]:
+      self.__cancelSubmission( jobsToSubmitDict.keys() )
+      return result
+    hadoopIDs = result['Value']
+    notSubmitted = [ jobID for jobID in jobsToSubmitDict if jobID not in hadoopIDs ]
+    if notSubmitted:
+      self.log.error( 'BigData jobs not submitted:', notSubmitted )
+      self.__cancelSubmission( notSubmitted )
+
+    result = BigDataDB.setHadoopIDs( hadoopIDs )
+    if not result[ 'OK' ]:
+      self.log.error( "BigData IDs not updated", result['Message'] )
+
+    result = BigDataDB.setIntoJobDBStatusBulk( [ ( jobID, "Submitted", jobsToSubmitDict[jobID]['SiteName'], hadoopID )
+                                                 for jobID, hadoopID in hadoopIDs.items() ] )
+    if not result[ 'OK' ]:
+      self.log.error( "JobDB of BigData Soft not updated", result['Message'] )
+
+    self.log.info( 'Director:submitBigDataJobsBatch:%s jobs submitted' % len( hadoopIDs ) )
+
+    return S_OK( hadoopIDs )
+
+  def __cancelSubmission( self, jobIDs ):
+    """
+    Delete the BigDataDB rows of jobs that were not submitted, they would hold the
+    slots of the endpoint with no Hadoop ID, and reschedule the jobs in the JobDB
+    ( which fails them once they reach the maximum of reschedulings )
+    """
+    result = BigDataDB.deleteBigDataJobs( jobIDs )
+    if not result[ 'OK' ]:
+      self.log.error( 'BigData jobs not deleted', result['Message'] )
+    for jobID in jobIDs:
+      result = jobDB.rescheduleJob( jobID )
+      if not result[ 'OK' ]:
+        self.log.error( 'Job %s not rescheduled' % jobID, result['Message'] )
+
   def exceptionCallBack( self, threadedJob, exceptionInfo ):
     self.log.exception( 'Error in BigDataJob Submission:', lExcInfo = exceptionInfo )
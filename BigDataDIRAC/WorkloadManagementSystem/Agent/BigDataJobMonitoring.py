@@ -22,12 +22,15 @@ from DIRAC.Core.Utilities.ThreadPool                          import ThreadPool
 from DIRAC.WorkloadManagementSystem.Client.ServerUtils        import jobDB
 from DIRAC.WorkloadManagementSystem.Client.SandboxStoreClient import SandboxStoreClient
 from DIRAC.Core.Utilities.File                                import getGlobbedTotalSize, getGlobbedFiles
+from DIRAC.Core.Utilities.Subprocess                          import systemCall
 from DIRAC.Interfaces.API.Dirac                               import Dirac
 from DIRAC.AccountingSystem.Client.Types.Job                  import Job as AccountingJob
 
 from BigDataDIRAC.Resources.BigData.BigDataDirector           import BigDataDirector
 from BigDataDIRAC.WorkloadManagementSystem.Client.ServerUtils import BigDataDB
 from BigDataDIRAC.WorkloadManagementSystem.private.ConnectionUtils import ConnectionUtils
+from BigDataDIRAC.WorkloadManagementSystem.private.JobPollingScheduler import JobPollingScheduler
+from BigDataDIRAC.WorkloadManagementSystem.Client.BigDataClientRegistry import gBigDataClientRegistry
 
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient        import gProxyManager
 __RCSID__ = "$Id: $"
@@ -55,6 +58,9 @@ class BigDataJobMonitoring( AgentModule ):
     self.callBackLock = threading.Lock()
     self.pendingJobs = {}
     self.monitoringEndPoints = {}
+    self.jobStatusChanges = []
+    self.unchangedJobs = []
+    self.dataToDelete = []
 
     """
     #SandBox Settings
@@ -63,19 +69,45 @@ class BigDataJobMonitoring( AgentModule ):
     self.sandboxClient = SandboxStoreClient()
     self.failedFlag = True
     self.sandboxSizeLimit = 1024 * 1024 * 10
-    self.fileList = 0
-    self.outputSandboxSize = 0
 
     self.cleanDataAfterFinish = True
 
+    #One 'hadoop job -list all' per endpoint and cycle instead of one query per job
+    self.am_setOption( "BulkStatusQuery", True )
+
+    #Each endpoint is monitored by its own task, no more than EndPointDeadline seconds
+    self.am_setOption( "EndPointDeadline", 300 )
+    #The endpoints are queued starting from a different one every cycle
+    self.endPointRotation = 0
+    #Only the running jobs and those finished since the previous list are asked
+    #for, the final states are kept until every job had the chance to be due
+    self.jobListTimes = {}
+    self.finalJobStates = {}
+    self.threadPool = ThreadPool( self.am_getOption( 'minThreadsInPool' ),
+                                  self.am_getOption( 'maxThreadsInPool' ),
+                                  self.am_getOption( 'totalThreadsInPool' ) )
+
+    #Every job is checked again after MinJobPollingInterval seconds, backing off
+    #by JobPollingBackoff up to MaxJobPollingInterval while its state does not change
+    self.am_setOption( "MinJobPollingInterval", 10 )
+    self.am_setOption( "MaxJobPollingInterval", 600 )
+    self.am_setOption( "JobPollingBackoff", 2.0 )
+    self.pollingScheduler = JobPollingScheduler()
+
     return DIRAC.S_OK()
 
   def execute( self ):
     """Main Agent code:
-      1.- Query BigDataDB for existing Running, Queue, or Submitted jobs
-      2.- Ask about the status
-      3.- Change the status into DB in the case of had changed
+      1.- Query BigDataDB for existing Running, Queue, or Submitted jobs,
+          only those due according to the polling scheduler are checked
+      2.- Ask about the status, once per endpoint with due jobs, the endpoints
+          are monitored in parallel by the thread pool
+      3.- Change the status into DB in the case of had changed, all the
+          changes of the cycle are flushed at once
     """
+    self.jobStatusChanges = []
+    self.unchangedJobs = []
+    self.dataToDelete = []
 
     self.pendingJobs['Submitted'] = BigDataDB.getBigDataJobsByStatus( "Submitted" )
     self.pendingJobs['Running'] = BigDataDB.getBigDataJobsByStatus( "Running" )
@@ -84,118 +116,262 @@ class BigDataJobMonitoring( AgentModule ):
     self.__getMonitoringPools()
     self.log.verbose( 'monitoring pools', self.monitoringEndPoints )
 
+    self.pollingScheduler.minInterval = self.am_getOption( 'MinJobPollingInterval' )
+    self.pollingScheduler.maxInterval = self.am_getOption( 'MaxJobPollingInterval' )
+    self.pollingScheduler.backoffFactor = self.am_getOption( 'JobPollingBackoff' )
+    allJobs = []
     for status in self.pendingJobs:
-      self.log.verbose( 'Analizing %s jobs' % status )
-      JobStatus = 0
       if self.pendingJobs[status]['OK']:
-        for jobId in self.pendingJobs[status]['Value']:
-          self.log.verbose( 'Analizing job %s' % jobId )
-          getSoftIdAndSiteName = BigDataDB.getSoftwareJobIDByJobID( jobId[0] )
-          self.log.verbose( 'Site and SoftID:', getSoftIdAndSiteName )
-          for runningEndPoint in  self.monitoringEndPoints:
-            if ( ( self.monitoringEndPoints[runningEndPoint]['NameNode'] == getSoftIdAndSiteName[0][1] ) and
-                 ( getSoftIdAndSiteName[0][0] != "" ) ):
-              #Depending on the BigData Software the Query should be different
-              if self.monitoringEndPoints[runningEndPoint]['BigDataSoftware'] == 'hadoop':
-                if self.monitoringEndPoints[runningEndPoint]['BigDataSoftwareVersion'] == 'hdv1':
-                  if self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLName'] == 'none':
-                    self.log.info( "Hadoop V.1 Monitoring submmission command with Hadoop jobID: ", getSoftIdAndSiteName[0][0] )
-                    from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV1Client import HadoopV1Client
-                    HadoopV1cli = HadoopV1Client( self.monitoringEndPoints[runningEndPoint]['User'] ,
-                                                  self.monitoringEndPoints[runningEndPoint]['PublicIP'] ,
-                                                  self.monitoringEndPoints[runningEndPoint]['Port'] )
-                    JobStatus = HadoopV1cli.jobStatus( getSoftIdAndSiteName[0][0],
-                                                       self.monitoringEndPoints[runningEndPoint]['User'],
-                                                       self.monitoringEndPoints[runningEndPoint]['PublicIP'] )
-                    if ( JobStatus['OK'] == True ) and ( self.monitoringEndPoints[runningEndPoint]['IsInteractive'] == "1" ):
-                      if ( JobStatus['Value'][1].strip() == "Succeded" ):
-                        result = HadoopV1cli.newJob( self.__tmpSandBoxDir, jobId[0], getSoftIdAndSiteName[0][0] )
-
-                        if ( result['OK'] == True ):
-                          result = BigDataDB.updateHadoopIDAndJobStatus( jobId[0], result['Value'] )
-                          BigDataDB.setJobStatus( jobId[0], "Running" )
-                          JobStatus['OK'] = False
-                        else:
-                          self.log.info( "New result from new Job", result )
-                    if JobStatus['OK'] == True:
-                      if ( JobStatus['Value'][1].strip() == "Succeded" ):
-                        BigDataDB.setJobStatus( jobId[0], "Done" )
-                        if ( self.monitoringEndPoints[runningEndPoint]['IsInteractive'] == "1" ):
-                          self.__updateInteractiveSandBox( jobId[0],
-                                               self.monitoringEndPoints[runningEndPoint]['BigDataSoftware'],
-                                               self.monitoringEndPoints[runningEndPoint]['BigDataSoftwareVersion'] ,
-                                               self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLName'],
-                                               self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLVersion'],
-                                               HadoopV1cli )
-                        else:
-                          self.__updateSandBox( jobId[0],
-                                               self.monitoringEndPoints[runningEndPoint]['BigDataSoftware'],
-                                               self.monitoringEndPoints[runningEndPoint]['BigDataSoftwareVersion'] ,
-                                               self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLName'],
-                                               self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLVersion'],
-                                               HadoopV1cli )
-                        getStatus = HadoopV1cli.jobCompleteStatus( getSoftIdAndSiteName[0][0] )
-                        if getStatus['OK']:
-                          result = self.getJobFinalStatusInfo( getStatus['Value'][1] )
-                        if result['OK']:
-                          self.sendJobAccounting( result['Value'], jobId[0] )
-                        if self.cleanDataAfterFinish:
-                          self.__deleteData( jobId[0], HadoopV1cli )
-                      if ( JobStatus['Value'][1].strip() == "Unknown" ):
-                        BigDataDB.setJobStatus( jobId[0], "Submitted" )
-                      if ( JobStatus['Value'][1].strip() == "Running" ):
-                        BigDataDB.setJobStatus( jobId[0], "Running" )
-
-              if self.monitoringEndPoints[runningEndPoint]['BigDataSoftware'] == 'hadoop':
-                if self.monitoringEndPoints[runningEndPoint]['BigDataSoftwareVersion'] == 'hdv2':
-                  if self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLName'] == 'none':
-                    self.log.info( "Hadoop V.2 Monitoring submmission command with Hadoop jobID: ", getSoftIdAndSiteName[0][0] )
-                    from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV2Client import HadoopV2Client
-                    HadoopV2cli = HadoopV2Client( self.monitoringEndPoints[runningEndPoint]['User'] ,
-                                                  self.monitoringEndPoints[runningEndPoint]['PublicIP'] )
-                    JobStatus = HadoopV2cli.jobStatus( getSoftIdAndSiteName[0][0],
-                                                       self.monitoringEndPoints[runningEndPoint]['User'],
-                                                       self.monitoringEndPoints[runningEndPoint]['PublicIP'] )
-                    if ( JobStatus['OK'] == True ) and ( self.monitoringEndPoints[runningEndPoint]['IsInteractive'] == "1" ):
-                      if ( JobStatus['Value'].strip() == "Succeded" ):
-                        result = HadoopV2cli.newJob( self.__tmpSandBoxDir, jobId[0], getSoftIdAndSiteName[0][0] )
-
-                        if ( result['OK'] == True ):
-                          result = BigDataDB.updateHadoopIDAndJobStatus( jobId[0], result['Value'] )
-                          BigDataDB.setJobStatus( jobId[0], "Running" )
-                          JobStatus['OK'] = False
-                        else:
-                          self.log.info( "New result from new Job", result )
-                    if JobStatus['OK'] == True:
-                      if ( JobStatus['Value'] == "Succeded" ):
-                        BigDataDB.setJobStatus( jobId[0], "Done" )
-                        if ( self.monitoringEndPoints[runningEndPoint]['IsInteractive'] == "1" ):
-                          self.__updateInteractiveSandBox( jobId[0],
-                                               self.monitoringEndPoints[runningEndPoint]['BigDataSoftware'],
-                                               self.monitoringEndPoints[runningEndPoint]['BigDataSoftwareVersion'] ,
-                                               self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLName'],
-                                               self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLVersion'],
-                                               HadoopV2cli )
-                        else:
-                          self.__updateSandBox( jobId[0],
-                                               self.monitoringEndPoints[runningEndPoint]['BigDataSoftware'],
-                                               self.monitoringEndPoints[runningEndPoint]['BigDataSoftwareVersion'] ,
-                                               self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLName'],
-                                               self.monitoringEndPoints[runningEndPoint]['HighLevelLanguage']['HLLVersion'],
-                                               HadoopV2cli )
-                        getStatus = HadoopV2cli.jobCompleteStatus( getSoftIdAndSiteName[0][0] )
-                        if getStatus['OK']:
-                          result = self.getJobFinalStatusInfo( getStatus['Value'][1] )
-                        if result['OK']:
-                          self.sendJobAccounting( result['Value'], jobId[0] )
-                        #if self.cleanDataAfterFinish:
-                        #  self.__deleteData( jobId[0], HadoopV2cli )
-                      if ( JobStatus['Value'] == "Unknown" ):
-                        BigDataDB.setJobStatus( jobId[0], "Submitted" )
-                      if ( JobStatus['Value'] == "Running" ):
-                        BigDataDB.setJobStatus( jobId[0], "Running" )
+        allJobs.extend( [ jobId[0] for jobId in self.pendingJobs[status]['Value'] ] )
+    dueJobs = self.pollingScheduler.getDueJobs( allJobs )
+    self.log.verbose( '%s jobs due out of %s' % ( len( dueJobs ), len( allJobs ) ) )
+
+    jobsByEndPoint = {}
+    for status in self.pendingJobs:
+      self.log.verbose( 'Analizing %s jobs' % status )
+      if not self.pendingJobs[status]['OK']:
+        continue
+      for jobId in self.pendingJobs[status]['Value']:
+        if jobId[0] not in dueJobs:
+          continue
+        self.log.verbose( 'Analizing job %s' % jobId )
+        getSoftIdAndSiteName = BigDataDB.getSoftwareJobIDByJobID( jobId[0] )
+        self.log.verbose( 'Site and SoftID:', getSoftIdAndSiteName )
+        for runningEndPoint in  self.monitoringEndPoints:
+          if ( ( self.monitoringEndPoints[runningEndPoint]['NameNode'] == getSoftIdAndSiteName[0][1] ) and
+               ( getSoftIdAndSiteName[0][0] != "" ) ):
+            if runningEndPoint not in jobsByEndPoint:
+              jobsByEndPoint[runningEndPoint] = []
+            jobsByEndPoint[runningEndPoint].append( ( jobId[0], getSoftIdAndSiteName[0][0], status ) )
+
+    endPoints = sorted( jobsByEndPoint )
+    if endPoints:
+      self.endPointRotation = ( self.endPointRotation + 1 ) % len( endPoints )
+      endPoints = endPoints[self.endPointRotation:] + endPoints[:self.endPointRotation]
+    for runningEndPoint in endPoints:
+      result = self.threadPool.generateJobAndQueueIt( self.__monitorEndPoint,
+                                                      args = ( runningEndPoint, jobsByEndPoint[runningEndPoint] ),
+                                                      oCallback = self.callBack,
+                                                      oExceptionCallback = self.exceptionCallBack,
+                                                      blocking = True )
+      if not result['OK']:
+        self.log.error( 'Could not queue the monitoring of %s:' % runningEndPoint, result['Message'] )
+    #Wait for all the endpoints, the cycle takes as long as the slowest one
+    self.threadPool.processAllResults()
+
+    result = self.__flushJobStatusChanges()
+    #The data of the finished jobs is only deleted once they are recorded as Done
+    if result['OK']:
+      for jobId, cli in self.dataToDelete:
+        self.__deleteData( jobId, cli )
+
     return DIRAC.S_OK()
 
+  def __setJobStatus( self, jobId, status, currentStatus ):
+    """
+      Keep the status change to be flushed at the end of the cycle, the jobs
+      already in that status only get their last update time refreshed
+    """
+    self.callBackLock.acquire()
+    try:
+      if status == currentStatus:
+        self.unchangedJobs.append( jobId )
+      else:
+        self.jobStatusChanges.append( ( jobId, status ) )
+    finally:
+      self.callBackLock.release()
+
+  def __flushJobStatusChanges( self ):
+    """
+      Write all the status changes of the cycle in one go
+    """
+    self.callBackLock.acquire()
+    try:
+      jobStatusChanges = self.jobStatusChanges
+      self.jobStatusChanges = []
+      unchangedJobs = self.unchangedJobs
+      self.unchangedJobs = []
+    finally:
+      self.callBackLock.release()
+    if unchangedJobs:
+      result = BigDataDB.touchJobs( unchangedJobs )
+      if not result['OK']:
+        self.log.error( 'Could not update the last update time of the jobs', result['Message'] )
+    if not jobStatusChanges:
+      return S_OK( 0 )
+    result = BigDataDB.setJobsStatus( jobStatusChanges )
+    if not result['OK']:
+      self.log.error( 'Could not update the status of the jobs', result['Message'] )
+    else:
+      self.log.info( '%s job status changes flushed' % result['Value'] )
+    return result
+
+  def callBack( self, threadedJob, result ):
+    if not result['OK']:
+      self.log.error( 'Endpoint monitoring failed:', result['Message'] )
+
+  def exceptionCallBack( self, threadedJob, exceptionInfo ):
+    self.log.exception( 'Error in endpoint monitoring thread:', lExcInfo = exceptionInfo )
+
+  def __monitorEndPoint( self, runningEndPoint, jobs ):
+    """
+      Get the status of the given ( jobId, softwareJobId, status ) jobs of a single endpoint.
+      With BulkStatusQuery the whole list of jobs of the endpoint is retrieved once
+      and every tracked job is updated from it. Jobs not processed in the
+      EndPointDeadline seconds since the task started are left for the next cycle.
+    """
+    deadline = time.time() + self.am_getOption( 'EndPointDeadline' )
+    endPointDict = self.monitoringEndPoints[runningEndPoint]
+    #Depending on the BigData Software the Query should be different
+    if endPointDict['BigDataSoftware'] != 'hadoop' or endPointDict['HighLevelLanguage']['HLLName'] != 'none':
+      return S_OK()
+
+    version = endPointDict['BigDataSoftwareVersion']
+    if version not in [ 'hdv1', 'hdv2' ]:
+      return S_OK()
+    result = gBigDataClientRegistry.getClient( runningEndPoint )
+    if not result['OK']:
+      self.log.error( 'Could not get the client of %s:' % runningEndPoint, result['Message'] )
+      return result
+    cli = result['Value']
+
+    bulkQuery = self.am_getOption( 'BulkStatusQuery', True )
+    if bulkQuery:
+      result = self.__getJobStates( runningEndPoint, cli )
+      if not result['OK']:
+        return result
+      jobStates = result['Value']
+
+    for jobId, softwareJobId, currentStatus in jobs:
+      if time.time() > deadline:
+        self.log.warn( 'Deadline reached monitoring %s, jobs left for the next cycle' % runningEndPoint )
+        break
+      self.log.info( "Hadoop %s Monitoring submmission command with Hadoop jobID: " % version, softwareJobId )
+      if bulkQuery:
+        jobState = jobStates.get( softwareJobId.strip(), "Unknown" )
+        #A Running job missing from the list is asked alone instead of demoted
+        if softwareJobId.strip() not in jobStates and currentStatus == "Running":
+          result = self.__getJobState( cli, version, softwareJobId )
+          if not result['OK']:
+            continue
+          jobState = result['Value']
+      else:
+        result = self.__getJobState( cli, version, softwareJobId )
+        if not result['OK']:
+          continue
+        jobState = result['Value']
+      newStatus = self.__updateJobState( runningEndPoint, cli, jobId, softwareJobId, jobState, currentStatus )
+      if newStatus == "Done":
+        self.pollingScheduler.jobFinished( jobId, runningEndPoint )
+        self.finalJobStates.get( runningEndPoint, {} ).pop( softwareJobId.strip(), None )
+      else:
+        self.pollingScheduler.update( jobId, runningEndPoint, ( jobState, softwareJobId ) )
+
+    return S_OK()
+
+  def __getJobStates( self, runningEndPoint, cli ):
+    """
+      List the RUNNING jobs of the endpoint and the FINISHED ones since the previous
+      list, the rest of the states are reported as Unknown anyway
+    """
+    listTime = time.time()
+    finishedSince = None
+    if runningEndPoint in self.jobListTimes:
+      #Some margin for the clock of the endpoint
+      finishedSince = self.jobListTimes[runningEndPoint] - 60
+    result = cli.jobStatusList( [ 'RUNNING', 'FINISHED' ], finishedSince )
+    if not result['OK']:
+      self.log.error( 'Could not get the list of jobs of %s:' % runningEndPoint, result['Message'] )
+      return result
+    self.log.verbose( '%s jobs listed in %s' % ( len( result['Value'] ), runningEndPoint ) )
+
+    finalStates = self.finalJobStates.setdefault( runningEndPoint, {} )
+    expiration = listTime - 2 * self.am_getOption( 'MaxJobPollingInterval' )
+    for softwareJobId in finalStates.keys():
+      if finalStates[softwareJobId][1] < expiration:
+        del finalStates[softwareJobId]
+    jobStates = {}
+    for softwareJobId, ( jobState, _listTime ) in finalStates.items():
+      jobStates[softwareJobId] = jobState
+    for softwareJobId, jobState in result['Value'].items():
+      if jobState != "Running":
+        finalStates[softwareJobId] = ( jobState, listTime )
+      jobStates[softwareJobId] = jobState
+    #Only a checked list moves the start of the next one, the jobs finished
+    #since a failed list are asked for again
+    self.jobListTimes[runningEndPoint] = listTime
+    return S_OK( jobStates )
+
+  def __getJobState( self, cli, version, softwareJobId ):
+    """
+      Ask the endpoint for the state of a single job
+    """
+    endPointUser = cli.user
+    endPointIP = cli.publicIP
+    JobStatus = cli.jobStatus( softwareJobId, endPointUser, endPointIP )
+    if not JobStatus['OK']:
+      return JobStatus
+    if version == 'hdv1':
+      return S_OK( JobStatus['Value'][1].strip() )
+    return S_OK( JobStatus['Value'].strip() )
+
+  def __updateJobState( self, runningEndPoint, cli, jobId, softwareJobId, jobState, currentStatus ):
+    """
+      Change the status into DB, retrieve the output and send the accounting
+      of the finished jobs. Returns the new status of the job.
+    """
+    endPointDict = self.monitoringEndPoints[runningEndPoint]
+    isInteractive = ( endPointDict['IsInteractive'] == "1" )
+
+    if isInteractive and jobState == "Succeded":
+      result = cli.newJob( self.__tmpSandBoxDir, jobId, softwareJobId )
+      if ( result['OK'] == True ):
+        result = BigDataDB.updateHadoopIDAndJobStatus( jobId, result['Value'] )
+        self.__setJobStatus( jobId, "Running", currentStatus )
+        return "Running"
+      self.log.info( "New result from new Job", result )
+
+    if jobState == "Succeded":
+      self.__setJobStatus( jobId, "Done", currentStatus )
+      if isInteractive:
+        result = self.__updateInteractiveSandBox( jobId,
+                                         endPointDict['BigDataSoftware'],
+                                         endPointDict['BigDataSoftwareVersion'] ,
+                                         endPointDict['HighLevelLanguage']['HLLName'],
+                                         endPointDict['HighLevelLanguage']['HLLVersion'],
+                                         cli )
+      else:
+        result = self.__updateSandBox( jobId,
+                              endPointDict['BigDataSoftware'],
+                              endPointDict['BigDataSoftwareVersion'] ,
+                              endPointDict['HighLevelLanguage']['HLLName'],
+                              endPointDict['HighLevelLanguage']['HLLVersion'],
+                              cli )
+      sandboxInfo = { 'OutputSandboxFiles': 0, 'OutputSandboxSize': 0 }
+      if result['OK']:
+        sandboxInfo = result['Value']
+      getStatus = cli.jobCompleteStatus( softwareJobId )
+      if getStatus['OK']:
+        result = self.getJobFinalStatusInfo( getStatus['Value'][1] )
+        if result['OK']:
+          result['Value'].update( sandboxInfo )
+          self.sendJobAccounting( result['Value'], jobId )
+      #Data of Hadoop V.2 jobs is kept in the cluster
+      if self.cleanDataAfterFinish and endPointDict['BigDataSoftwareVersion'] == 'hdv1':
+        self.callBackLock.acquire()
+        try:
+          self.dataToDelete.append( ( jobId, cli ) )
+        finally:
+          self.callBackLock.release()
+      return "Done"
+    if jobState == "Unknown":
+      self.__setJobStatus( jobId, "Submitted", currentStatus )
+      return "Submitted"
+    if jobState == "Running":
+      self.__setJobStatus( jobId, "Running", currentStatus )
+      return "Running"
+    return currentStatus
+
   def sendJobAccounting( self, dataFromBDSoft, jobId ):
     accountingReport = AccountingJob()
     accountingReport.setStartTime()
@@ -231,10 +407,10 @@ class BigDataJobMonitoring( AgentModule ):
             'InputDataSize' : dataFromBDSoft['InputDataSize'],
             'OutputDataSize' : dataFromBDSoft['OutputDataSize'],
             'InputDataFiles' : dataFromBDSoft['InputDataFiles'],
-            'OutputDataFiles' : len( self.fileList ),
+            'OutputDataFiles' : dataFromBDSoft.get( 'OutputSandboxFiles', 0 ),
             'DiskSpace' : 0,
             'InputSandBoxSize' : 0,
-            'OutputSandBoxSize' : self.outputSandboxSize,
+            'OutputSandBoxSize' : dataFromBDSoft.get( 'OutputSandboxSize', 0 ),
             'ProcessedEvents' : 0
             }
     accountingReport.setEndTime()
@@ -311,16 +487,17 @@ class BigDataJobMonitoring( AgentModule ):
       self.log.warn( 'Output sandbox file resolution failed:' )
       self.log.warn( resolvedSandbox['Message'] )
       self.__report( 'Failed', 'Resolving Output Sandbox' )
-    self.fileList = resolvedSandbox['Value']['Files']
+    fileList = resolvedSandbox['Value']['Files']
     missingFiles = resolvedSandbox['Value']['Missing']
     if missingFiles:
       self.jobReport.setJobParameter( 'OutputSandboxMissingFiles', ', '.join( missingFiles ), sendFlag = False )
 
-    if self.fileList and jobid:
-      self.outputSandboxSize = getGlobbedTotalSize( self.fileList )
+    outputSandboxSize = 0
+    if fileList and jobid:
+      outputSandboxSize = getGlobbedTotalSize( fileList )
       self.log.info( 'Attempting to upload Sandbox with limit:', self.sandboxSizeLimit )
 
-      result = self.sandboxClient.uploadFilesAsSandboxForJob( self.fileList, jobid,
+      result = self.sandboxClient.uploadFilesAsSandboxForJob( fileList, jobid,
                                                          'Output', self.sandboxSizeLimit ) # 1024*1024*10
       if not result['OK']:
         self.log.error( 'Output sandbox upload failed with message', result['Message'] )
@@ -340,7 +517,7 @@ class BigDataJobMonitoring( AgentModule ):
           self.__report( 'Completed', 'Output Sandbox Uploaded' )
         self.log.info( 'Sandbox uploaded successfully' )
 
-    return "OK"
+    return S_OK( { 'OutputSandboxFiles': len( fileList ), 'OutputSandboxSize': outputSandboxSize } )
 
   def __updateSandBox( self, jobid, software, version, hll, hllversion, cli ):
     jobInfo = BigDataDB.getJobIDInfo( jobid )
@@ -368,16 +545,17 @@ class BigDataJobMonitoring( AgentModule ):
       self.log.warn( 'Output sandbox file resolution failed:' )
       self.log.warn( resolvedSandbox['Message'] )
       self.__report( 'Failed', 'Resolving Output Sandbox' )
-    self.fileList = resolvedSandbox['Value']['Files']
+    fileList = resolvedSandbox['Value']['Files']
     missingFiles = resolvedSandbox['Value']['Missing']
     if missingFiles:
       self.jobReport.setJobParameter( 'OutputSandboxMissingFiles', ', '.join( missingFiles ), sendFlag = False )
 
-    if self.fileList and jobid:
-      self.outputSandboxSize = getGlobbedTotalSize( self.fileList )
+    outputSandboxSize = 0
+    if fileList and jobid:
+      outputSandboxSize = getGlobbedTotalSize( fileList )
       self.log.info( 'Attempting to upload Sandbox with limit:', self.sandboxSizeLimit )
 
-      result = self.sandboxClient.uploadFilesAsSandboxForJob( self.fileList, jobid,
+      result = self.sandboxClient.uploadFilesAsSandboxForJob( fileList, jobid,
                                                          'Output', self.sandboxSizeLimit ) # 1024*1024*10
       if not result['OK']:
         self.log.error( 'Output sandbox upload failed with message', result['Message'] )
@@ -397,7 +575,7 @@ class BigDataJobMonitoring( AgentModule ):
           self.__report( 'Completed', 'Output Sandbox Uploaded' )
         self.log.info( 'Sandbox uploaded successfully' )
 
-    return "OK"
+    return S_OK( { 'OutputSandboxFiles': len( fileList ), 'OutputSandboxSize': outputSandboxSize } )
 
   def __getLFNfromOutputFile( self, outputFile, outputPath = '' ):
     """Provides a generic convention for VO output data
@@ -440,7 +618,8 @@ class BigDataJobMonitoring( AgentModule ):
 
   def __resolveOutputSandboxFiles( self, outputSandbox ):
     """Checks the output sandbox file list and resolves any specified wildcards.
-       Also tars any specified directories.
+       Also tars any specified directories, the directory is removed once
+       archived so the output is not kept twice on disk.
     """
     missing = []
     okFiles = []
@@ -453,7 +632,7 @@ class BigDataJobMonitoring( AgentModule ):
           okFiles.append( check )
         if os.path.isdir( check ):
           self.log.verbose( 'Found locally existing OutputSandbox directory: %s' % check )
-          cmd = ['tar', 'cf', '%s.tar' % check, check]
+          cmd = ['tar', 'cf', '%s.tar' % check, '--remove-files', check]
           result = systemCall( 60, cmd )
           if not result['OK']:
             self.log.error( 'Failed to create OutputSandbox tar', result['Message'] )
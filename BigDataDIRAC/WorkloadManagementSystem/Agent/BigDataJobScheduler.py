@@ -15,6 +15,9 @@
        - PollingTime:
        - ControlDirectory:
        - MaxCycles:
+       - ReplicaCacheLifeTime: seconds the dataset replicas are kept in memory
+       - BatchSubmission: submit the jobs of an endpoint in batches when the director supports it
+       - MaxJobsPerBatch: maximum number of jobs in a batch submission
 
      The following parameters are searched for in WorkloadManagement/BigDataDirector:
        - ThreadStartDelay:
@@ -25,7 +28,7 @@
 
 import random, time, re
 import DIRAC
-from DIRAC  import gLogger, S_OK, S_ERROR
+from DIRAC  import gLogger, S_OK, S_ERROR, DictCache
 
 from numpy.random import poisson
 from random       import shuffle
@@ -40,6 +43,7 @@ from DIRAC.WorkloadManagementSystem.Client.ServerUtils        import jobDB
 from DIRAC.Resources.Catalog.FileCatalog                      import FileCatalog
 from BigDataDIRAC.Resources.BigData.BigDataDirector           import BigDataDirector
 from BigDataDIRAC.WorkloadManagementSystem.Client.ServerUtils import BigDataDB
+from BigDataDIRAC.WorkloadManagementSystem.Client.BigDataClientRegistry import gBigDataClientRegistry
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight                import ClassAd
 from DIRAC.Interfaces.API.Dirac                               import Dirac
 
@@ -56,7 +60,6 @@ class BigDataJobScheduler( AgentModule ):
     import threading
 
     self.__tmpSandBoxDir = "/tmp/"
-    self.jobDataset = ""
     self.am_setOption( "PollingTime", 60.0 )
 
     self.am_setOption( "ThreadStartDelay", 1 )
@@ -67,11 +70,27 @@ class BigDataJobScheduler( AgentModule ):
     self.am_setOption( "maxThreadsInPool", 2 )
     self.am_setOption( "totalThreadsInPool", 40 )
 
+    self.am_setOption( "ReplicaCacheLifeTime", 600 )
+    #LFNs without replicas are not looked up again for this time
+    self.am_setOption( "MissingReplicaCacheLifeTime", 60 )
+    self.am_setOption( "BatchSubmission", True )
+    self.am_setOption( "MaxJobsPerBatch", 50 )
+
+    self.fileCatalogue = FileCatalog()
+    self.replicaCache = DictCache()
+
     self.directors = {}
     self.pools = {}
 
     self.directorDict = {}
     self.pendingTaskQueueJobs = {}
+    self.jobRequirementsCache = {}
+    self.jobEndPointsCache = {}
+
+    self.localityIndexSignature = None
+    self.endPointNames = set()
+    self.seEndPointsIndex = {}
+    self.softwareEndPointsIndex = {}
 
     self.callBackLock = threading.Lock()
 
@@ -86,21 +105,28 @@ class BigDataJobScheduler( AgentModule ):
     self.__checkSubmitPools()
 
     bigDataJobsToSubmit = {}
-    bigDataJobIdsToSubmit = {}
 
+    result = BigDataDB.getBigDataJobsCountByEndpoint( [ 'Submitted', 'Running' ] )
+    if not result['OK']:
+      self.log.error( 'Could not count the jobs by endpoint', result['Message'] )
+      return result
+    jobsCountByNameNode = result['Value']
+
+    self.__purgePendingJobs()
+    self.__updateLocalityIndex()
+    self.jobEndPointsCache = {}
+    #Replicas of the jobs left pending by the previous cycles, to know where they can run
+    self.__prefetchReplicas( self.__getPendingJobsInputData() )
+
+    endPointsToMatch = []
+    claimedJobs = set()
     for directorName, directorDict in self.directors.items():
       self.log.verbose( 'Checking Director:', directorName )
       self.log.verbose( 'RunningEndPoints:', directorDict['director'].runningEndPoints )
       for runningEndPointName in directorDict['director'].runningEndPoints:
         runningEndPointDict = directorDict['director'].runningEndPoints[runningEndPointName]
         NameNode = runningEndPointDict['NameNode']
-        jobsByEndPoint = 0
-        result = BigDataDB.getBigDataJobsByStatusAndEndpoint( 'Submitted', NameNode )
-        if result['OK']:
-          jobsByEndPoint += len( result['Value'] )
-        result = BigDataDB.getBigDataJobsByStatusAndEndpoint( 'Running', NameNode )
-        if result['OK']:
-          jobsByEndPoint += len( result['Value'] )
+        jobsByEndPoint = sum( jobsCountByNameNode.get( NameNode, {} ).values() )
         self.log.verbose( 'Checking Jobs By EndPoint %s:' % jobsByEndPoint )
         jobLimitsEndPoint = runningEndPointDict['LimitQueueJobsEndPoint']
 
@@ -123,170 +149,102 @@ class BigDataJobScheduler( AgentModule ):
         jobs = 0
         priority = 0
         cpu = 0
-        jobsID = 0
         self.log.info( 'Pending Jobs from TaskQueue, which not matching before: ', self.pendingTaskQueueJobs )
         for tq in taskQueueDict:
           jobs += taskQueueDict[tq]['Jobs']
           priority += taskQueueDict[tq]['Priority']
           cpu += taskQueueDict[tq]['Jobs'] * taskQueueDict[tq]['CPUTime']
 
-          #Matching of Jobs with BigData Softwares
-          #This process is following the sequence:
-          #Retrieve a job from taskqueueDict
-          #Get job name and try to match with the resources        
-          #If not match store the var pendingTaskQueueJobs for the
-          #next iteration
-          #
-          #This matching is doing with the following JobName Pattern
-          # NameSoftware _ SoftwareVersion _ HighLanguageName _ HighLanguageVersion _ DataSetName          
-          #extract a job from the TaskQueue
-          if tq not in self.pendingTaskQueueJobs.keys():
-            self.pendingTaskQueueJobs[tq] = {}
-          getJobFromTaskQueue = taskQueueDB.matchAndGetJob( taskQueueDict[tq] )
-          if not getJobFromTaskQueue['OK']:
-            self.log.error( 'Could not get Job and FromTaskQueue', getJobFromTaskQueue['Message'] )
-            return getJobFromTaskQueue
-
-          jobInfo = getJobFromTaskQueue['Value']
-          jobID = jobInfo['jobId']
-          jobAttrInfo = jobDB.getJobAttributes( jobID )
-
-          if not jobAttrInfo['OK']:
-            self.log.error( 'Could not get Job Attributes', jobAttrInfo['Message'] )
-            return jobAttrInfo
-          jobInfoUniq = jobAttrInfo['Value']
-          jobName = jobInfoUniq['JobName']
-          self.pendingTaskQueueJobs[tq][jobID] = jobName
-
-
-          result = jobDB.getJobJDL( jobID, True )
-          classAdJob = ClassAd( result['Value'] )
-          arguments = 0
-          if classAdJob.lookupAttribute( 'Arguments' ):
-            arguments = classAdJob.getAttributeString( 'Arguments' )
-          #if not classAdJob.lookupAttribute( 'Arguments' ):
-          #  continue
-
-          jobsToSubmit = self.matchingJobsForBDSubmission( arguments,
-                                                       runningEndPointName,
-                                                       runningEndPointDict['BigDataSoftware'],
-                                                       runningEndPointDict['BigDataSoftwareVersion'],
-                                                       runningEndPointDict['HighLevelLanguage']['HLLName'],
-                                                       runningEndPointDict['HighLevelLanguage']['HLLVersion'],
-                                                       jobID )
+        jobsToExtract = self.__getJobsToExtract( runningEndPointName, bigDataJobs, claimedJobs )
+        result = self.__extractJobs( taskQueueDict, jobsToExtract )
+        if not result['OK']:
+          return result
+
+        endPointsToMatch.append( ( directorName, runningEndPointName, runningEndPointDict,
+                                   bigDataJobs, jobs, priority, cpu ) )
+
+    #Replicas of the input data of all pending jobs in a single catalog call
+    self.__prefetchReplicas( self.__getPendingJobsInputData() )
+
+    for directorName, runningEndPointName, runningEndPointDict, bigDataJobs, jobs, priority, cpu in endPointsToMatch:
+      NameNode = runningEndPointDict['NameNode']
+      #Matching of Jobs with BigData Softwares
+      #This process is following the sequence:
+      #Get job name and try to match with the resources
+      #If not match keep it in pendingTaskQueueJobs for the
+      #next iteration
+      #
+      #This matching is doing with the following JobName Pattern
+      # NameSoftware _ SoftwareVersion _ HighLanguageName _ HighLanguageVersion _ DataSetName
+      #Older jobs are matched first and the batch is limited by the free slots
+      endPointJobs = []
+      for tq in self.pendingTaskQueueJobs.keys():
+        for jobid in sorted( self.pendingTaskQueueJobs[tq].keys() ):
+          if len( endPointJobs ) >= bigDataJobs:
+            break
+          result = self.__getJobRequirements( jobid )
+          if not result['OK']:
+            self.log.error( 'Could not get Job Requirements', result['Message'] )
+            continue
+          jobRequirements = result['Value']
+          #do the match with the runningEndPoint
+          jobsToSubmit = self.matchingJobsForBDSubmission( jobRequirements, runningEndPointName )
           if ( jobsToSubmit == "OK" ):
-            if directorName not in bigDataJobsToSubmit:
-              bigDataJobsToSubmit[directorName] = {}
-            if runningEndPointName not in bigDataJobsToSubmit[directorName]:
-              bigDataJobsToSubmit[directorName][runningEndPointName] = {}
-            bigDataJobsToSubmit[directorName][runningEndPointName] = { 'JobId': jobID,
-                                                        'JobName': jobName,
-                                                        'TQPriority': priority,
-                                                        'CPUTime': cpu,
-                                                        'BigDataEndpoint': runningEndPointName,
-                                                        'BigDataEndpointNameNode': runningEndPointDict['NameNode'],
-                                                        'BdSoftware': runningEndPointDict['BigDataSoftware'],
-                                                        'BdSoftwareVersion': runningEndPointDict['BigDataSoftwareVersion'],
-                                                        'HLLName' : runningEndPointDict['HighLevelLanguage']['HLLName'],
-                                                        'HLLVersion' : runningEndPointDict['HighLevelLanguage']['HLLVersion'],
-                                                        'NumBigDataJobsAllowedToSubmit': bigDataJobs,
-                                                        'SiteName': runningEndPointDict['SiteName'],
-                                                        'PublicIP': runningEndPointDict['PublicIP'],
-                                                        'User': runningEndPointDict['User'],
-                                                        'Port': runningEndPointDict['Port'],
-                                                        'UsePilot': runningEndPointDict['UsePilot'],
-                                                        'IsInteractive': runningEndPointDict['IsInteractive'],
-                                                        'Arguments': arguments }
-            del self.pendingTaskQueueJobs[tq][jobID]
+            endPointJobs.append( self.__getJobToSubmit( tq, jobid, self.pendingTaskQueueJobs[tq][jobid],
+                                                        priority, cpu, bigDataJobs - len( endPointJobs ),
+                                                        runningEndPointName, runningEndPointDict, jobRequirements ) )
+            del self.pendingTaskQueueJobs[tq][jobid]
           else:
             self.log.error( jobsToSubmit )
-        self.log.info( 'Pending Jobs from TaskQueue, which not matching after: ', self.pendingTaskQueueJobs )
-        for tq in self.pendingTaskQueueJobs.keys():
-          for jobid in self.pendingTaskQueueJobs[tq].keys():
-            result = jobDB.getJobJDL( jobid, True )
-            classAdJob = ClassAd( result['Value'] )
-            arguments = 0
-            if classAdJob.lookupAttribute( 'Arguments' ):
-              arguments = classAdJob.getAttributeString( 'Arguments' )
-            #if not classAdJob.lookupAttribute( 'Arguments' ):
-            #  continue
-            #do the match with the runningEndPoint
-            jobsToSubmit = self.matchingJobsForBDSubmission( arguments,
-                                                             runningEndPointName,
-                                                             runningEndPointDict['BigDataSoftware'],
-                                                             runningEndPointDict['BigDataSoftwareVersion'],
-                                                             runningEndPointDict['HighLevelLanguage']['HLLName'],
-                                                             runningEndPointDict['HighLevelLanguage']['HLLVersion'],
-                                                             jobid )
-            if ( jobsToSubmit == "OK" ):
-              if directorName not in bigDataJobsToSubmit:
-                bigDataJobsToSubmit[directorName] = {}
-              if runningEndPointName not in bigDataJobsToSubmit[directorName]:
-                bigDataJobsToSubmit[directorName][runningEndPointName] = {}
-              bigDataJobsToSubmit[directorName][runningEndPointName] = { 'JobId': jobid,
-                                                          'JobName': self.pendingTaskQueueJobs[tq][jobid],
-                                                          'TQPriority': priority,
-                                                          'CPUTime': cpu,
-                                                          'BigDataEndpoint': runningEndPointName,
-                                                          'BigDataEndpointNameNode': runningEndPointDict['NameNode'],
-                                                          'BdSoftware': runningEndPointDict['BigDataSoftware'],
-                                                          'BdSoftwareVersion': runningEndPointDict['BigDataSoftwareVersion'],
-                                                          'HLLName' : runningEndPointDict['HighLevelLanguage']['HLLName'],
-                                                          'HLLVersion' : runningEndPointDict['HighLevelLanguage']['HLLVersion'],
-                                                          'NumBigDataJobsAllowedToSubmit': bigDataJobs,
-                                                          'SiteName': runningEndPointDict['SiteName'],
-                                                          'PublicIP': runningEndPointDict['PublicIP'],
-                                                          'User': runningEndPointDict['User'],
-                                                          'Port': runningEndPointDict['Port'],
-                                                          'UsePilot': runningEndPointDict['UsePilot'],
-                                                          'IsInteractive': runningEndPointDict['IsInteractive'],
-                                                          'Arguments': arguments  }
-              del self.pendingTaskQueueJobs[tq][jobid]
-            else:
-             self.log.error( jobsToSubmit )
-        if not jobs and not self.pendingTaskQueueJobs:
-          self.log.info( 'No matching jobs for %s found, skipping' % NameNode )
-          continue
+      self.log.info( 'Pending Jobs from TaskQueue, which not matching after: ', self.pendingTaskQueueJobs )
+
+      if endPointJobs:
+        if directorName not in bigDataJobsToSubmit:
+          bigDataJobsToSubmit[directorName] = {}
+        bigDataJobsToSubmit[directorName][runningEndPointName] = endPointJobs
+
+      if not jobs and not self.pendingTaskQueueJobs:
+        self.log.info( 'No matching jobs for %s found, skipping' % NameNode )
+        continue
 
-        self.log.info( '___BigDataJobsTo Submit:', bigDataJobsToSubmit )
+      self.log.info( '___BigDataJobsTo Submit:', bigDataJobsToSubmit )
 
     for directorName, JobsToSubmitDict in bigDataJobsToSubmit.items():
-      for runningEndPointName, jobsToSubmitDict in JobsToSubmitDict.items():
-        if self.directors[directorName]['isEnabled']:
-          self.log.info( 'Requesting submission to %s of %s' % ( runningEndPointName, directorName ) )
-
-          director = self.directors[directorName]['director']
-          pool = self.pools[self.directors[directorName]['pool']]
-
-          jobIDs = JobsToSubmitDict[runningEndPointName]['JobId']
-          jobName = JobsToSubmitDict[runningEndPointName]['JobName']
-          endpoint = JobsToSubmitDict[runningEndPointName]['BigDataEndpoint']
-          runningSiteName = JobsToSubmitDict[runningEndPointName]['SiteName']
-          NameNode = JobsToSubmitDict[runningEndPointName]['BigDataEndpointNameNode']
-          BigDataSoftware = JobsToSubmitDict[runningEndPointName]['BdSoftware']
-          BigDataSoftwareVersion = JobsToSubmitDict[runningEndPointName]['BdSoftwareVersion']
-          HLLName = JobsToSubmitDict[runningEndPointName]['HLLName']
-          HLLVersion = JobsToSubmitDict[runningEndPointName]['HLLVersion']
-          PublicIP = JobsToSubmitDict[runningEndPointName]['PublicIP']
-          User = JobsToSubmitDict[runningEndPointName]['User']
-          Port = JobsToSubmitDict[runningEndPointName]['Port']
-          UsePilot = JobsToSubmitDict[runningEndPointName]['UsePilot']
-          IsInteractive = JobsToSubmitDict[runningEndPointName]['IsInteractive']
-          Arguments = JobsToSubmitDict[runningEndPointName]['Arguments']
-          numBigDataJobsAllowed = JobsToSubmitDict[runningEndPointName]['NumBigDataJobsAllowedToSubmit']
+      for runningEndPointName, jobsToSubmitList in JobsToSubmitDict.items():
+        if not self.directors[directorName]['isEnabled']:
+          self.__returnJobsToPending( jobsToSubmitList )
+          continue
+        self.log.info( 'Requesting submission of %s jobs to %s of %s' % ( len( jobsToSubmitList ), runningEndPointName, directorName ) )
+
+        director = self.directors[directorName]['director']
+        pool = self.pools[self.directors[directorName]['pool']]
+
+        jobsToSubmitList = self.__submitBatches( directorName, runningEndPointName, jobsToSubmitList )
+        if not self.directors[directorName]['isEnabled']:
+          continue
 
+        for i in range( len( jobsToSubmitList ) ):
+          jobToSubmit = jobsToSubmitList[i]
           ret = pool.generateJobAndQueueIt( director.submitBigDataJobs,
-                                            args = ( endpoint, numBigDataJobsAllowed, runningSiteName, NameNode,
-                                                     BigDataSoftware, BigDataSoftwareVersion, HLLName, HLLVersion,
-                                                     PublicIP, Port, jobIDs, runningEndPointName, jobName, User, self.jobDataset, UsePilot, IsInteractive ),
+                                            args = ( jobToSubmit['BigDataEndpoint'], jobToSubmit['NumBigDataJobsAllowedToSubmit'],
+                                                     jobToSubmit['SiteName'], jobToSubmit['BigDataEndpointNameNode'],
+                                                     jobToSubmit['BdSoftware'], jobToSubmit['BdSoftwareVersion'],
+                                                     jobToSubmit['HLLName'], jobToSubmit['HLLVersion'],
+                                                     jobToSubmit['PublicIP'], jobToSubmit['Port'], jobToSubmit['JobId'],
+                                                     runningEndPointName, jobToSubmit['JobName'], jobToSubmit['User'],
+                                                     jobToSubmit['Dataset'], jobToSubmit['UsePilot'], jobToSubmit['IsInteractive'] ),
                                             oCallback = self.callBack,
                                             oExceptionCallback = director.exceptionCallBack,
                                             blocking = False )
           if not ret['OK']:
-            # Disable submission until next iteration
+            # Disable submission until next iteration, jobs not queued are retried then
             self.directors[directorName]['isEnabled'] = False
-          else:
-            time.sleep( self.am_getOption( 'ThreadStartDelay' ) )
+            self.__returnJobsToPending( jobsToSubmitList[i:] )
+            break
+          if jobToSubmit['JobId'] in self.jobRequirementsCache:
+            del self.jobRequirementsCache[jobToSubmit['JobId']]
+        else:
+          time.sleep( self.am_getOption( 'ThreadStartDelay' ) )
 
     if 'Default' in self.pools:
       # only for those in "Default' thread Pool
@@ -295,81 +253,339 @@ class BigDataJobScheduler( AgentModule ):
 
     return DIRAC.S_OK()
 
-  def matchingJobsForBDSubmission( self, arguments, bigdataendpoint, BigDataSoftware,
-                                   BigDataSoftwareVersion, HLLName, HLLVersion, jobid ):
+  def __submitBatches( self, directorName, runningEndPointName, jobsToSubmitList ):
+    """
+     Queue the jobs the director can submit in batches, one task per batch of up to
+     MaxJobsPerBatch jobs. Returns the jobs left to be submitted one by one.
+    """
+    director = self.directors[directorName]['director']
+    if not self.am_getOption( 'BatchSubmission' ):
+      return jobsToSubmitList
+    batchJobs = [ job for job in jobsToSubmitList if director.isBatchSubmissionSupported( job ) ]
+    if not batchJobs:
+      return jobsToSubmitList
+    singleJobs = [ job for job in jobsToSubmitList if not director.isBatchSubmissionSupported( job ) ]
+
+    pool = self.pools[self.directors[directorName]['pool']]
+    batchSize = max( 1, self.am_getOption( 'MaxJobsPerBatch' ) )
+    for i in range( 0, len( batchJobs ), batchSize ):
+      batch = batchJobs[i:i + batchSize]
+      ret = pool.generateJobAndQueueIt( director.submitBigDataJobsBatch,
+                                        args = ( runningEndPointName, batch ),
+                                        oCallback = self.callBack,
+                                        oExceptionCallback = director.exceptionCallBack,
+                                        blocking = False )
+      if not ret['OK']:
+        # Disable submission until next iteration, jobs not queued are retried then
+        self.directors[directorName]['isEnabled'] = False
+        self.__returnJobsToPending( batchJobs[i:] + singleJobs )
+        return []
+      for jobToSubmit in batch:
+        if jobToSubmit['JobId'] in self.jobRequirementsCache:
+          del self.jobRequirementsCache[jobToSubmit['JobId']]
+    return singleJobs
+
+  def __getJobToSubmit( self, tq, jobID, jobName, priority, cpu, bigDataJobs,
+                        runningEndPointName, runningEndPointDict, jobRequirements ):
+    """
+     Build the submission description of a matched job for the given endpoint
+    """
+    return { 'TaskQueue': tq,
+             'JobId': jobID,
+             'JobName': jobName,
+             'TQPriority': priority,
+             'CPUTime': cpu,
+             'BigDataEndpoint': runningEndPointName,
+             'BigDataEndpointNameNode': runningEndPointDict['NameNode'],
+             'BdSoftware': runningEndPointDict['BigDataSoftware'],
+             'BdSoftwareVersion': runningEndPointDict['BigDataSoftwareVersion'],
+             'HLLName' : runningEndPointDict['HighLevelLanguage']['HLLName'],
+             'HLLVersion' : runningEndPointDict['HighLevelLanguage']['HLLVersion'],
+             'NumBigDataJobsAllowedToSubmit': bigDataJobs,
+             'SiteName': runningEndPointDict['SiteName'],
+             'PublicIP': runningEndPointDict['PublicIP'],
+             'User': runningEndPointDict['User'],
+             'Port': runningEndPointDict['Port'],
+             'UsePilot': runningEndPointDict['UsePilot'],
+             'IsInteractive': runningEndPointDict['IsInteractive'],
+             'Dataset': jobRequirements['Dataset'],
+             'Arguments': jobRequirements['Arguments'] }
+
+  def __getJobsToExtract( self, runningEndPointName, bigDataJobs, claimedJobs ):
+    """
+     Number of jobs to extract from the TaskQueues for the free slots of the endpoint.
+     Only the pending jobs that can run in the endpoint and are not claimed by the
+     endpoints seen before in the cycle count, so the ones that never match do not
+     block the extraction. The jobs claimed by the endpoint are added to claimedJobs.
+    """
+    matchingJobs = []
+    for tq in self.pendingTaskQueueJobs:
+      for jobid in self.pendingTaskQueueJobs[tq]:
+        if jobid in claimedJobs:
+          continue
+        result = self.__getJobRequirements( jobid )
+        if result['OK'] and self.matchingJobsForBDSubmission( result['Value'], runningEndPointName ) == "OK":
+          matchingJobs.append( jobid )
+    matchingJobs = sorted( matchingJobs )[:bigDataJobs]
+    claimedJobs.update( matchingJobs )
+    return bigDataJobs - len( matchingJobs )
+
+  def __extractJobs( self, taskQueueDict, jobsToExtract ):
+    """
+     Extract up to jobsToExtract jobs from the TaskQueues, they are kept in
+     pendingTaskQueueJobs until they are matched
+    """
+    extracted = 0
+    for tq in taskQueueDict:
+      if tq not in self.pendingTaskQueueJobs.keys():
+        self.pendingTaskQueueJobs[tq] = {}
+      for i in range( max( 0, min( jobsToExtract - extracted, taskQueueDict[tq]['Jobs'] ) ) ):
+        getJobFromTaskQueue = taskQueueDB.matchAndGetJob( taskQueueDict[tq] )
+        if not getJobFromTaskQueue['OK']:
+          self.log.error( 'Could not get Job and FromTaskQueue', getJobFromTaskQueue['Message'] )
+          return getJobFromTaskQueue
+
+        jobInfo = getJobFromTaskQueue['Value']
+        if 'jobId' not in jobInfo:
+          break
+        jobID = jobInfo['jobId']
+        jobAttrInfo = jobDB.getJobAttributes( jobID )
+
+        if not jobAttrInfo['OK']:
+          self.log.error( 'Could not get Job Attributes', jobAttrInfo['Message'] )
+          return jobAttrInfo
+        jobInfoUniq = jobAttrInfo['Value']
+        self.pendingTaskQueueJobs[tq][jobID] = jobInfoUniq['JobName']
+        extracted += 1
+    return S_OK( extracted )
+
+  def __returnJobsToPending( self, jobsToSubmitList ):
+    """
+     Keep the jobs that could not be queued for the next iteration
+    """
+    for jobToSubmit in jobsToSubmitList:
+      tq = jobToSubmit['TaskQueue']
+      if tq not in self.pendingTaskQueueJobs:
+        self.pendingTaskQueueJobs[tq] = {}
+      self.pendingTaskQueueJobs[tq][jobToSubmit['JobId']] = jobToSubmit['JobName']
+
+  def matchingJobsForBDSubmission( self, jobRequirements, bigdataendpoint ):
     """
      Jobs matching, first with the dataset and the SITE, find in the Database the matching with the Dataset key
      As the second step the endpoind is matched with the resulting SITES and in the case of 
      was matching, in the third step the job will be matched with the bigdatasoft of the SITE.
+     The endpoints of a job are resolved once per cycle from the locality index.
     """
-    self.jobDataset = ""
-    returned = jobDB.getInputData( jobid )
-    if not returned['OK']:
-      self.log.error( "There is not Input Data stored in the Job" )
-      return "Error"
-
-    if returned['Value'] != []:
-      self.jobDataset = returned['Value'][0]
+    jobid = jobRequirements['JobID']
+    if jobid not in self.jobEndPointsCache:
+      self.jobEndPointsCache[jobid] = self.__getJobEndPoints( jobRequirements )
+    result = self.jobEndPointsCache[jobid]
+    if not result['OK']:
+      return result['Message']
+    dataEndPoints, softwareEndPoints = result['Value']
+
+    if bigdataendpoint not in dataEndPoints:
+      return "Dataset does not match with any Site"
+    if softwareEndPoints is not None and bigdataendpoint not in softwareEndPoints:
+      return "Dataset match with SiteName but Site doesn't have the software"
+    return "OK"
+
+  def __getJobEndPoints( self, jobRequirements ):
+    """
+     Return the set of endpoints holding a replica of the job dataset and the set
+     of endpoints providing the requested software (None if the job does not
+     request any software)
+    """
+    arguments = jobRequirements['Arguments']
+    jobDataset = jobRequirements['Dataset']
 
-    if arguments == 0 and self.jobDataset == "":
+    if arguments == 0 and jobDataset == "":
       self.log.error( "Error reading the job arguments for BigData Submission:", arguments )
-      return "Error"
-    if arguments == 0 and self.jobDataset != "":
-      self.fileCatalogue = FileCatalog()
-      result = self.fileCatalogue.getReplicas( self.jobDataset )
-      if not result['OK'] or result['Value']['Successful'] == {}:
-        return S_ERROR( result )
-      return_exit = False
-      for SiteName in result['Value']['Successful'][self.jobDataset]:
-        if bigdataendpoint in SiteName:
-            return( "OK" )
-        else:
-            return_exit = True
-      if return_exit:
-        return "Dataset match with SiteName but Site doesn't have the software"
+      return S_ERROR( "Error" )
 
-    self.log.info( "BigDataEndpoint", bigdataendpoint )
-    self.log.info( "BigDataSoftware", BigDataSoftware )
-    self.log.info( "BigDataSoftwareVersion", BigDataSoftwareVersion )
-    self.log.info( "HLLName", HLLName )
-    self.log.info( "HLLVersion", HLLVersion )
+    replicas = {}
+    if jobDataset:
+      replicas = self.__getReplicas( jobDataset )
+    if not replicas:
+      return S_ERROR( "No replicas found for dataset %s" % jobDataset )
+    dataEndPoints = set()
+    for seName in replicas:
+      dataEndPoints.update( self.__getSEEndPoints( seName ) )
 
-    jobNameSplitted = re.split( ' ', arguments )
+    if arguments == 0:
+      return S_OK( ( dataEndPoints, None ) )
 
-    jobBigDataSoft = jobNameSplitted[0]
+    jobBigDataSoft = jobRequirements['BigDataSoftware']
     if jobBigDataSoft not in BigDataDB.validSoftware:
       self.log.error( "Argument %s for valid B.D. software is not in the list of accepted:" % ( jobBigDataSoft ), BigDataDB.validSoftware )
-      return "Error"
+      return S_ERROR( "Error" )
 
-    jobBigDataVersion = jobNameSplitted[1]
+    jobBigDataVersion = jobRequirements['BigDataSoftwareVersion']
     if jobBigDataVersion not in BigDataDB.validSoftwareVersion:
       self.log.error( "Argument %s for valid B.D. software version is not in the list of accepted:" % ( jobBigDataVersion ), BigDataDB.validSoftwareVersion )
-      return "Error"
+      return S_ERROR( "Error" )
 
-    jobHHLSoft = jobNameSplitted[2]
+    jobHHLSoft = jobRequirements['HLLName']
     if jobHHLSoft not in BigDataDB.validHighLevelLang:
       self.log.error( "Argument %s for valid B.D. H.L. software is not in the list of accepted:" % ( jobHHLSoft ), BigDataDB.validHighLevelLang )
-      return "Error"
+      return S_ERROR( "Error" )
 
-    jobHHLVersion = jobNameSplitted[3]
+    jobHHLVersion = jobRequirements['HLLVersion']
     #if jobHHLVersion not in BigDataDB.validHighLevelLangVersion:
     #  self.log.error( "Argument %s for valid B.D. H.L. software version is not in the list of accepted:" % ( jobHHLVersion ), BigDataDB.validHighLevelLangVersion )
-    #  return "Error"
+    #  return S_ERROR( "Error" )
 
-    #Old-one
-    #JobSiteNames = BigDataDB.getSiteNameByDataSet( self.jobDataset );
-    self.fileCatalogue = FileCatalog()
-    result = self.fileCatalogue.getReplicas( self.jobDataset )
-    if not result['OK'] or result['Value']['Successful'] == {}:
-      return S_ERROR( result )
-    for SiteName in result['Value']['Successful'][self.jobDataset]:
-      if bigdataendpoint in SiteName:
-        if ( jobBigDataSoft == BigDataSoftware ) and ( jobBigDataVersion == BigDataSoftwareVersion ) and ( HLLName == jobHHLSoft ) and ( HLLVersion == jobHHLVersion ):
-          return( "OK" )
-        else:
-          return "Dataset match with SiteName but Site doesn't have the software"
+    softwareKey = ( jobBigDataSoft, jobBigDataVersion, jobHHLSoft, jobHHLVersion )
+    return S_OK( ( dataEndPoints, self.softwareEndPointsIndex.get( softwareKey, set() ) ) )
+
+  def __updateLocalityIndex( self ):
+    """
+     Rebuild the SE and software to endpoint indexes when the endpoints
+     definition of the directors changes
+    """
+    endPoints = []
+    for directorName in self.directors:
+      runningEndPoints = self.directors[directorName]['director'].runningEndPoints
+      for runningEndPointName, runningEndPointDict in runningEndPoints.items():
+        endPoints.append( ( runningEndPointName,
+                            runningEndPointDict['BigDataSoftware'],
+                            runningEndPointDict['BigDataSoftwareVersion'],
+                            runningEndPointDict['HighLevelLanguage']['HLLName'],
+                            runningEndPointDict['HighLevelLanguage']['HLLVersion'] ) )
+    endPoints.sort()
+    if endPoints == self.localityIndexSignature:
+      return
+
+    self.log.info( 'Rebuilding locality index for %s endpoints' % len( endPoints ) )
+    self.localityIndexSignature = endPoints
+    self.endPointNames = set()
+    self.seEndPointsIndex = {}
+    self.softwareEndPointsIndex = {}
+    for endPoint in endPoints:
+      self.endPointNames.add( endPoint[0] )
+      self.softwareEndPointsIndex.setdefault( endPoint[1:], set() ).add( endPoint[0] )
+    #Close the connections of the endpoints no longer in use
+    gBigDataClientRegistry.purge( self.endPointNames )
+
+  def __getSEEndPoints( self, seName ):
+    """
+     Return the set of endpoints whose name is part of the SE name
+    """
+    if seName not in self.seEndPointsIndex:
+      self.seEndPointsIndex[seName] = set( [ endPoint for endPoint in self.endPointNames if endPoint in seName ] )
+    return self.seEndPointsIndex[seName]
 
-    return "Dataset does not match with any Site"
+  def __getJobRequirements( self, jobid ):
+    """
+     Return the BigData requirements of a job: Arguments, Dataset, BigDataSoftware,
+     BigDataSoftwareVersion, HLLName and HLLVersion. They do not change once the
+     job is in the TaskQueue, so they are parsed only once and kept in the cache
+     until the job is submitted or leaves the TaskQueue.
+    """
+    if jobid in self.jobRequirementsCache:
+      return S_OK( self.jobRequirementsCache[jobid] )
+
+    result = jobDB.getJobJDL( jobid, True )
+    if not result['OK']:
+      return result
+    classAdJob = ClassAd( result['Value'] )
+    arguments = 0
+    if classAdJob.lookupAttribute( 'Arguments' ):
+      arguments = classAdJob.getAttributeString( 'Arguments' )
+
+    returned = jobDB.getInputData( jobid )
+    if not returned['OK']:
+      self.log.error( "There is not Input Data stored in the Job" )
+      return returned
+    jobDataset = ""
+    if returned['Value'] != []:
+      jobDataset = returned['Value'][0]
+
+    #Arguments pattern:
+    # NameSoftware SoftwareVersion HighLanguageName HighLanguageVersion ...
+    jobNameSplitted = [ None ] * 4
+    if arguments != 0:
+      jobNameSplitted = ( re.split( ' ', arguments ) + jobNameSplitted )[:4]
+
+    jobRequirements = { 'JobID': jobid,
+                        'Arguments': arguments,
+                        'Dataset': jobDataset,
+                        'BigDataSoftware': jobNameSplitted[0],
+                        'BigDataSoftwareVersion': jobNameSplitted[1],
+                        'HLLName': jobNameSplitted[2],
+                        'HLLVersion': jobNameSplitted[3] }
+    self.jobRequirementsCache[jobid] = jobRequirements
+    return S_OK( jobRequirements )
+
+  def __purgePendingJobs( self ):
+    """
+     Forget the pending jobs that are no longer Waiting (killed, deleted, rescheduled...)
+     and the cached requirements of jobs that are no longer pending
+    """
+    pendingJobs = {}
+    for tq in self.pendingTaskQueueJobs:
+      for jobid in self.pendingTaskQueueJobs[tq]:
+        pendingJobs[jobid] = tq
+
+    for jobid in self.jobRequirementsCache.keys():
+      if jobid not in pendingJobs:
+        del self.jobRequirementsCache[jobid]
+
+    if not pendingJobs:
+      return S_OK()
+    result = jobDB.getAttributesForJobList( pendingJobs.keys(), [ 'Status' ] )
+    if not result['OK']:
+      self.log.error( 'Could not get the status of pending jobs', result['Message'] )
+      return result
+    for jobid, tq in pendingJobs.items():
+      if result['Value'].get( jobid, {} ).get( 'Status' ) != 'Waiting':
+        self.log.verbose( 'Job %s left the TaskQueue, removing it from pending jobs' % jobid )
+        del self.pendingTaskQueueJobs[tq][jobid]
+        if jobid in self.jobRequirementsCache:
+          del self.jobRequirementsCache[jobid]
+    return S_OK()
+
+  def __getPendingJobsInputData( self ):
+    """
+     Return the input data LFNs of the jobs waiting in pendingTaskQueueJobs
+    """
+    lfns = []
+    for tq in self.pendingTaskQueueJobs:
+      for jobid in self.pendingTaskQueueJobs[tq]:
+        result = self.__getJobRequirements( jobid )
+        if result['OK'] and result['Value']['Dataset']:
+          lfns.append( result['Value']['Dataset'] )
+    return lfns
+
+  def __prefetchReplicas( self, lfns ):
+    """
+     Retrieve in one FileCatalog call the replicas of the LFNs not yet cached
+    """
+    lfns = [ lfn for lfn in set( lfns ) if lfn and not self.replicaCache.exists( lfn ) ]
+    if not lfns:
+      return S_OK( 0 )
+    result = self.fileCatalogue.getReplicas( lfns )
+    if not result['OK']:
+      self.log.error( 'Could not retrieve replicas from FileCatalog', result['Message'] )
+      return result
+    cacheLifeTime = self.am_getOption( 'ReplicaCacheLifeTime' )
+    for lfn, replicas in result['Value']['Successful'].items():
+      self.replicaCache.add( lfn, cacheLifeTime, replicas )
+    #The LFNs without replicas are cached empty for a short time
+    missingLifeTime = self.am_getOption( 'MissingReplicaCacheLifeTime' )
+    for lfn, error in result['Value']['Failed'].items():
+      self.log.verbose( 'No replicas for %s:' % lfn, error )
+      self.replicaCache.add( lfn, missingLifeTime, {} )
+    return S_OK( len( result['Value']['Successful'] ) )
+
+  def __getReplicas( self, lfn ):
+    """
+     Return the {SE: PFN} replicas of an LFN from the cache, it is only looked
+     up in the FileCatalog when it was not prefetched
+    """
+    if not self.replicaCache.exists( lfn ):
+      self.__prefetchReplicas( [ lfn ] )
+    return self.replicaCache.get( lfn )
 
   def submitPilotsForTaskQueue( self, taskQueueDict, waitingPilots ):
 
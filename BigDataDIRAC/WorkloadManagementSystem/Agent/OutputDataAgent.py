@@ -52,6 +52,9 @@ class OutputDataAgent( AgentModule ):
 
     self.log.info( "Transferred %d files" % self.__outDataExecutor.getNumOKTransferredFiles() )
     self.log.info( "Transferred %d bytes" % self.__outDataExecutor.getNumOKTransferredBytes() )
+    rates = self.__outDataExecutor.getTransferRates()
+    for seName in sorted( rates ):
+      self.log.info( "Transfers to %s at %.0f bytes/s" % ( seName, rates[ seName ] ) )
 
 
     return S_OK()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+#
+# Tests of the extraction of jobs from the TaskQueues of the BigDataJobScheduler,
+# the jobs left pending only limit the endpoints where they can run
+#
+import unittest
+
+from DIRAC import gLogger, S_OK
+
+import BigDataDIRAC.WorkloadManagementSystem.Agent.BigDataJobScheduler as BigDataJobScheduler
+
+class FakeTaskQueueDB:
+
+  def __init__( self, jobIDs ):
+    self.jobIDs = list( jobIDs )
+
+  def matchAndGetJob( self, tqDict ):
+    if not self.jobIDs:
+      return S_OK( {} )
+    return S_OK( { 'jobId': self.jobIDs.pop( 0 ) } )
+
+class FakeJobDB:
+
+  def getJobAttributes( self, jobID ):
+    return S_OK( { 'JobName': 'Job%s' % jobID } )
+
+class BigDataJobSchedulerTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.taskQueueDB = BigDataJobScheduler.taskQueueDB
+    self.jobDB = BigDataJobScheduler.jobDB
+    BigDataJobScheduler.taskQueueDB = FakeTaskQueueDB( range( 100, 110 ) )
+    BigDataJobScheduler.jobDB = FakeJobDB()
+
+    self.scheduler = BigDataJobScheduler.BigDataJobScheduler.__new__( BigDataJobScheduler.BigDataJobScheduler )
+    self.scheduler.log = gLogger
+    self.scheduler.pendingTaskQueueJobs = {}
+    self.scheduler.jobRequirementsCache = {}
+    # The pending jobs run only in the endpoint named in their requirements
+    self.scheduler.matchingJobsForBDSubmission = lambda requirements, endPoint: \
+                                                 requirements['EndPoint'] == endPoint and "OK" or "NO"
+
+  def tearDown( self ):
+    BigDataJobScheduler.taskQueueDB = self.taskQueueDB
+    BigDataJobScheduler.jobDB = self.jobDB
+
+  def __addPendingJobs( self, tq, jobIDs, endPoint ):
+    self.scheduler.pendingTaskQueueJobs.setdefault( tq, {} )
+    for jobID in jobIDs:
+      self.scheduler.pendingTaskQueueJobs[tq][jobID] = 'Job%s' % jobID
+      self.scheduler.jobRequirementsCache[jobID] = { 'JobID': jobID, 'EndPoint': endPoint }
+
+  def __getJobsToExtract( self, endPoint, bigDataJobs, claimedJobs ):
+    return self.scheduler._BigDataJobScheduler__getJobsToExtract( endPoint, bigDataJobs, claimedJobs )
+
+  def test_unmatchablePendingJobs( self ):
+    # Pending jobs that never match fill the quota of the endpoint
+    self.__addPendingJobs( 1, [ 1, 2, 3 ], 'OtherEndPoint' )
+    jobsToExtract = self.__getJobsToExtract( 'EndPoint', 3, set() )
+    self.assertEqual( jobsToExtract, 3 )
+    result = self.scheduler._BigDataJobScheduler__extractJobs( { 2: { 'Jobs': 5 } }, jobsToExtract )
+    self.assertEqual( result['Value'], 3 )
+    self.assertEqual( sorted( self.scheduler.pendingTaskQueueJobs[2].keys() ), [ 100, 101, 102 ] )
+
+  def test_matchingPendingJobs( self ):
+    self.__addPendingJobs( 1, [ 1, 2 ], 'EndPoint' )
+    self.__addPendingJobs( 1, [ 3 ], 'OtherEndPoint' )
+    self.assertEqual( self.__getJobsToExtract( 'EndPoint', 3, set() ), 1 )
+    self.assertEqual( self.__getJobsToExtract( 'EndPoint', 1, set() ), 0 )
+
+  def test_claimedJobs( self ):
+    # The pending jobs claimed by an endpoint do not count for the next ones
+    self.__addPendingJobs( 1, [ 1, 2, 3 ], 'EndPoint' )
+    claimedJobs = set()
+    self.assertEqual( self.__getJobsToExtract( 'EndPoint', 2, claimedJobs ), 0 )
+    self.assertEqual( claimedJobs, set( [ 1, 2 ] ) )
+    self.assertEqual( self.__getJobsToExtract( 'EndPoint', 2, claimedJobs ), 1 )
+    self.assertEqual( claimedJobs, set( [ 1, 2, 3 ] ) )
+
+  def test_emptyTaskQueue( self ):
+    BigDataJobScheduler.taskQueueDB = FakeTaskQueueDB( [ 100 ] )
+    result = self.scheduler._BigDataJobScheduler__extractJobs( { 2: { 'Jobs': 5 } }, 3 )
+    self.assertEqual( result['Value'], 1 )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( BigDataJobSchedulerTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,178 @@
+########################################################################
+# $HeadURL$
+# File :   BigDataClientRegistry.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Registry of the BigData clients, one instance per endpoint shared by the
+  scheduler, the directors and the monitoring agent.
+
+  A client is built from the endpoint definition in /Resources/BigDataEndPoints
+  the first time it is requested, and kept together with its ssh connection
+  state until the definition of the endpoint changes.
+"""
+
+import threading
+
+from DIRAC                                                                   import gConfig, gLogger, S_OK, S_ERROR
+
+from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV1Client             import HadoopV1Client
+from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV2Client             import HadoopV2Client
+from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV1InteractiveClient  import HadoopV1InteractiveClient
+from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV2InteractiveClient  import HadoopV2InteractiveClient
+from BigDataDIRAC.WorkloadManagementSystem.Client.HiveV1Client               import HiveV1Client
+from BigDataDIRAC.WorkloadManagementSystem.Client.YarnRestClient             import YarnRestClient
+from BigDataDIRAC.WorkloadManagementSystem.private.SandboxCache              import SandboxCache
+
+__RCSID__ = '$Id: $'
+
+ENDPOINTS_CS_PATH = '/Resources/BigDataEndPoints'
+
+class BigDataClientRegistry:
+
+  def __init__( self ):
+    self.log = gLogger.getSubLogger( "BigDataClientRegistry" )
+    self.__clients = {}
+    self.__lock = threading.Lock()
+
+  def getClient( self, endPointName, interactive = False ):
+    """
+      Return the client of the endpoint, a new one is only created when there was
+      none or the CS definition of the endpoint has changed
+    """
+    result = self.__getEndPointDefinition( endPointName )
+    if not result['OK']:
+      return result
+    signature, endPointDict = result['Value']
+
+    key = ( endPointName, bool( interactive ) )
+    self.__lock.acquire()
+    try:
+      if key in self.__clients and self.__clients[key][0] == signature:
+        return S_OK( self.__clients[key][1] )
+    finally:
+      self.__lock.release()
+
+    result = self.__createClient( endPointDict, interactive )
+    if not result['OK']:
+      return result
+    client = result['Value']
+    if endPointDict.get( 'SandboxCache', 'False' ).lower() in ( 'true', 'yes', '1' ):
+      client.setSandboxCache( SandboxCache( client.sshConnect,
+                                            endPointDict.get( 'SandboxCacheDirectory', '/tmp/BigDataSandboxCache' ),
+                                            float( endPointDict.get( 'SandboxCacheMaxSize', 2048 ) ),
+                                            float( endPointDict.get( 'SandboxCacheMaxAge', 168 ) ),
+                                            byPort = ( endPointDict['BigDataSoftwareVersion'] == 'hdv1' and
+                                                       endPointDict['HighLevelLanguage'].get( 'HLLName' ) == 'none' ) ) )
+
+    self.__lock.acquire()
+    try:
+      oldClient = self.__clients.get( key )
+      if oldClient and oldClient[0] == signature:
+        # Another thread built it meanwhile, its connection is shared already
+        return S_OK( oldClient[1] )
+      self.__clients[key] = ( signature, client )
+    finally:
+      self.__lock.release()
+    if oldClient:
+      self.log.info( 'Definition of %s has changed, client renewed' % endPointName )
+      self.__closeClient( oldClient[1] )
+    else:
+      self.log.verbose( 'New client for', endPointName )
+    return S_OK( client )
+
+  def invalidate( self, endPointName ):
+    """
+      Drop the clients of the endpoint and close their connections
+    """
+    self.__lock.acquire()
+    try:
+      oldClients = []
+      for key in self.__clients.keys():
+        if key[0] == endPointName:
+          oldClients.append( self.__clients.pop( key )[1] )
+    finally:
+      self.__lock.release()
+    for client in oldClients:
+      self.__closeClient( client )
+    return S_OK( len( oldClients ) )
+
+  def purge( self, endPointNames ):
+    """
+      Drop the clients of the endpoints not in the given list
+    """
+    self.__lock.acquire()
+    try:
+      oldEndPoints = set( [ key[0] for key in self.__clients if key[0] not in endPointNames ] )
+    finally:
+      self.__lock.release()
+    for endPointName in oldEndPoints:
+      self.invalidate( endPointName )
+    return S_OK( len( oldEndPoints ) )
+
+  def __closeClient( self, client ):
+    client.sshConnect.closeSession()
+    if getattr( client, 'statusBackend', None ):
+      client.statusBackend.close()
+
+  def __getEndPointDefinition( self, endPointName ):
+    """
+      Read the endpoint definition from CS, the signature allows to detect changes
+    """
+    endPointCSPath = '%s/%s' % ( ENDPOINTS_CS_PATH, endPointName )
+    result = gConfig.getOptionsDict( endPointCSPath )
+    if not result['OK']:
+      return S_ERROR( 'Missing BigDataEndpoint "%s"' % endPointName )
+    endPointDict = result['Value']
+    result = gConfig.getOptionsDict( '%s/HighLevelLanguage' % endPointCSPath )
+    if not result['OK']:
+      return S_ERROR( 'Missing HighLevelLang in "%s"' % endPointCSPath )
+    endPointDict['HighLevelLanguage'] = result['Value']
+
+    for option in [ 'User', 'PublicIP', 'Port', 'BigDataSoftware', 'BigDataSoftwareVersion' ]:
+      if option not in endPointDict:
+        return S_ERROR( 'Missing option in "%s" EndPoint definition: %s' % ( endPointName, option ) )
+
+    signature = ( endPointDict['User'], endPointDict['PublicIP'], endPointDict['Port'],
+                  endPointDict['BigDataSoftware'], endPointDict['BigDataSoftwareVersion'],
+                  endPointDict['HighLevelLanguage'].get( 'HLLName' ),
+                  endPointDict['HighLevelLanguage'].get( 'HLLVersion' ),
+                  endPointDict.get( 'StatusBackend', 'SSH' ),
+                  endPointDict.get( 'ResourceManagerURL', '' ),
+                  endPointDict.get( 'SandboxCache', 'False' ),
+                  endPointDict.get( 'SandboxCacheDirectory', '' ),
+                  endPointDict.get( 'SandboxCacheMaxSize', '' ),
+                  endPointDict.get( 'SandboxCacheMaxAge', '' ) )
+    return S_OK( ( signature, endPointDict ) )
+
+  def __createClient( self, endPointDict, interactive ):
+    """
+      Instantiate the client matching the software of the endpoint
+    """
+    software = endPointDict['BigDataSoftware']
+    version = endPointDict['BigDataSoftwareVersion']
+    hllName = endPointDict['HighLevelLanguage'].get( 'HLLName', 'none' )
+    user = endPointDict['User']
+    publicIP = endPointDict['PublicIP']
+
+    if software == 'hadoop' and hllName == 'hive':
+      return S_OK( HiveV1Client( user, publicIP ) )
+    if software == 'hadoop' and hllName == 'none':
+      if version == 'hdv1':
+        if interactive:
+          return S_OK( HadoopV1InteractiveClient( user, publicIP, int( endPointDict['Port'] ) ) )
+        return S_OK( HadoopV1Client( user, publicIP, int( endPointDict['Port'] ) ) )
+      if version == 'hdv2':
+        if interactive:
+          return S_OK( HadoopV2InteractiveClient( user, publicIP ) )
+        client = HadoopV2Client( user, publicIP )
+        if endPointDict.get( 'StatusBackend', 'SSH' ) == 'REST':
+          if not endPointDict.get( 'ResourceManagerURL' ):
+            return S_ERROR( 'StatusBackend REST requires ResourceManagerURL' )
+          client.setStatusBackend( YarnRestClient( endPointDict['ResourceManagerURL'] ) )
+        return S_OK( client )
+
+    return S_ERROR( 'No client for %s %s with %s' % ( software, version, hllName ) )
+
+gBigDataClientRegistry = BigDataClientRegistry()
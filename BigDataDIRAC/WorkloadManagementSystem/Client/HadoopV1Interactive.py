@@ -8,8 +8,8 @@ from urlparse import urlparse
 from DIRAC import gLogger, gConfig, S_OK, S_ERROR
 
 from DIRAC.WorkloadManagementSystem.Client.ServerUtils              import jobDB
-from DIRAC.FrameworkSystem.Client.ProxyManagerClient                import gProxyManager
 from BigDataDIRAC.WorkloadManagementSystem.private.ConnectionUtils  import ConnectionUtils
+from BigDataDIRAC.WorkloadManagementSystem.private.ProxyCache       import gProxyCache
 from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV1InteractiveClient      import HadoopV1InteractiveClient
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight                      import ClassAd
 
@@ -22,7 +22,7 @@ class HadoopV1Interactive:
   An Hadoop V.1 provides the functionality of Hadoop that is required to use it for infrastructure.
   """
 
-  def __init__( self, NameNode, Port, jobID, PublicIP, User, JobName, Dataset ):
+  def __init__( self, NameNode, Port, jobID, PublicIP, User, JobName, Dataset, Client = None ):
 
     self.__tmpSandBoxDir = "/tmp/"
 
@@ -33,8 +33,7 @@ class HadoopV1Interactive:
     self.__User = User
     self.__JobName = JobName
     self.__Dataset = Dataset
-
-    self.defaultProxyLength = gConfig.getValue( '/Registry/DefaultProxyLifeTime', 86400 * 5 )
+    self.__client = Client
 
     self.log = gLogger.getSubLogger( "Hadoop Version 1, HadoopInteractive HHL, NameNode: %s" % ( NameNode ) )
     self.log.info( "Hadoop Version 1, HadoopInteractive Version 1, Port: %s" % ( Port ) )
@@ -61,8 +60,8 @@ class HadoopV1Interactive:
 
     #3.- Move the data to client
     self.log.debug( 'Step2::: download inputsandbox to temp folder' )
-    HadoopV1InteractiveCli = HadoopV1InteractiveClient( self.__User , self.__publicIP, self.__Port )
-    returned = HadoopV1InteractiveCli.dataCopy( tempPath, self.__tmpSandBoxDir )
+    HadoopV1InteractiveCli = self.__client or HadoopV1InteractiveClient( self.__User , self.__publicIP, self.__Port )
+    returned = HadoopV1InteractiveCli.sandboxCopy( tempPath, self.__tmpSandBoxDir )
     self.log.debug( 'Returned of copy the job contain to the Hadoop Master with HadoopInteractive::: ', returned )
 
     #3.- Get executable file
@@ -76,12 +75,10 @@ class HadoopV1Interactive:
     jobInfo = jobDB.getJobAttributes( self.__jobID )
     if not jobInfo['OK']:
       return S_ERROR( jobInfo['Value'] )
-    proxy = ""
     jobInfo = jobInfo['Value']
-    if gProxyManager.userHasProxy( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] ):
-      proxy = gProxyManager.downloadProxyToFile( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
-    else:
-      proxy = self.__requestProxyFromProxyManager( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
+    proxy = gProxyCache.getProxy( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
+    if not proxy['OK']:
+      return proxy
 
     HadoopInteractiveJob = "InputSandbox" + str( self.__jobID ) + "/" + executableFile
     HadoopInteractiveJobCommand = "InputSandbox" + str( self.__jobID ) + "/" + executableFile + " " + self.__JobName
@@ -112,7 +109,7 @@ class HadoopV1Interactive:
     self.log.debug( 'Step4::: Making CMD for submission: ', cmd )
 
     self.log.debug( 'Step5::: Submit file to hadoop: ' )
-    returned = HadoopV1InteractiveCli.jobSubmit( tempPath, HadoopInteractiveJob, proxy['chain'],
+    returned = HadoopV1InteractiveCli.jobSubmit( tempPath, HadoopInteractiveJob, proxy['Value'],
                                                  HadoopInteractiveJobOutput, cmd )
     self.log.info( 'Launch Hadoop-HadoopInteractive job to the Master: ', returned )
 
@@ -122,23 +119,3 @@ class HadoopV1Interactive:
       self.log.info( 'Hadoop-HadoopInteractive Job ID: ', returned['Value'] )
 
     return S_OK( returned['Value'] )
-
-  def __requestProxyFromProxyManager( self, ownerDN, ownerGroup ):
-    """Retrieves user proxy with correct role for job and sets up environment to
-       run job locally.
-    """
-    self.log.info( "Requesting proxy for %s@%s" % ( ownerDN, ownerGroup ) )
-    token = gConfig.getValue( "/Security/ProxyToken", "" )
-    if not token:
-      self.log.info( "No token defined. Trying to download proxy without token" )
-      token = False
-    retVal = gProxyManager.getPayloadProxyFromDIRACGroup( ownerDN, ownerGroup,
-                                                          self.defaultProxyLength, token )
-    if not retVal[ 'OK' ]:
-      self.log.error( 'Could not retrieve proxy' )
-      self.log.warn( retVal )
-      os.system( 'dirac-proxy-info' )
-      sys.stdout.flush()
-      return S_ERROR( 'Error retrieving proxy' )
-    chain = retVal[ 'Value' ]
-    return S_OK( chain )
@@ -7,9 +7,8 @@
 import random, time, re, os, glob, shutil, sys, base64, bz2, tempfile, stat, string, thread
 
 from BigDataDIRAC.WorkloadManagementSystem.private.ConnectionUtils import ConnectionUtils
-
-from BigDataDIRAC.WorkloadManagementSystem.private.InteractiveJobLaunchPort import InteractiveJobLaunchPortThread
-from BigDataDIRAC.WorkloadManagementSystem.private.InteractiveJobMonitor import InteractiveJobMonitorThread
+from BigDataDIRAC.WorkloadManagementSystem.private.ProxyCache import gProxyCache
+from BigDataDIRAC.WorkloadManagementSystem.private.ProgressReader import getProgressReader, parseEvents
 
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient       import gProxyManager
 from DIRAC.ConfigurationSystem.Client.Helpers import CSGlobals, getVO, Registry, Operations, Resources
@@ -39,6 +38,7 @@ class HadoopV1InteractiveClient( object ):
     self.publicIP = PublicIP
     self.port = Port
     self.sshConnect = ConnectionUtils( self.user , self.publicIP, self.port )
+    self.sandboxCache = None
 
   def jobSubmit( self, tempPath, HadoopInteractiveJob, proxy,
                  HadoopInteractiveJobOutput, HadoopInteractiveJobCommand ):
@@ -52,7 +52,7 @@ class HadoopV1InteractiveClient( object ):
    self.log.debug( 'Step6::: Creating jar Path: ', HadoopInteractiveJobPath )
    if proxy:
     self.log.verbose( 'Setting up proxy for payload' )
-    compressedAndEncodedProxy = base64.encodestring( bz2.compress( proxy.dumpAllToString()['Value'] ) ).replace( '\n', '' )
+    compressedAndEncodedProxy = gProxyCache.encodeProxy( proxy )
     compressedAndEncodedExecutable = base64.encodestring( bz2.compress( open( HadoopInteractiveJobPath, "rb" ).read(), 9 ) ).replace( '\n', '' )
 
     wrapperContent = """#!/usr/bin/env python
@@ -87,31 +87,7 @@ shutil.rmtree( workingDirectory )
     self.log.debug( 'Step7::: Creating payload: ' )
     submitFile = name
 
-    wrapperContent = """#!/usr/bin/env python
-# Wrapper script for executable and proxy
-import os, tempfile, sys, base64, bz2, shutil, getopt,re
-
-def main(argv):
-   inputfile = ''
-   command = ''
-   try:
-      opts, args = getopt.getopt(argv,'h:c:',[''])
-   except getopt.GetoptError:
-      print 'name.py -c <command>'
-      sys.exit(2)
-   for opt, arg in opts:
-      if opt == '-h':
-         print 'name.py -c <command>'
-         sys.exit()
-      elif opt in ('-c', '--command'):
-         command = arg
-   if (command == 'step1'):
-        cmd = 'grep "Running job:" %(HadoopInteractiveJobOutput)s'
-        returned = os.system(cmd)
-
-if __name__ == '__main__':
-   main(sys.argv[1:])     
-              """ % { 'HadoopInteractiveJobOutput': HadoopInteractiveJobOutput }
+    wrapperContent = getProgressReader( HadoopInteractiveJobOutput )
 
     fd, name = tempfile.mkstemp( suffix = '_getInfo.py', prefix = 'BigDat_', dir = tempPath )
     wrapper = os.fdopen( fd, 'w' )
@@ -135,38 +111,37 @@ if __name__ == '__main__':
    if not returned2['OK']:
       return S_ERROR( returned2['Message'] )
 
-   # submit submitFile to the batch system
-   cmd = submitFile
+   # submit submitFile detached, the job ID is read from its output
+   cmd = 'nohup %s < /dev/null > /dev/null 2>&1 &' % submitFile
 
    self.log.verbose( 'BigData submission command: %s' % ( cmd ) )
 
-   thread1 = InteractiveJobLaunchPortThread( self.user, self.publicIP , cmd, self.port )
-   #thread2 = InteractiveJobMonitorThread( self.user, self.publicIP, self.monitoringloop,
-   #                                       thread1, tempPath + HadoopInteractiveJobOutput, submitFile2 )
-
-   thread1.start()
-
-   time.sleep( 5 )
-
-   if not thread1.isAlive():
-     self.log.warn( '===========> SSH BigData Hadoop-HadoopInteractive thread V.1 result NOT OK' )
-     return S_ERROR( "Error launching Hadoop-HadoopInteractive Thread" )
+   returned = self.sshConnect.sshCallByPort( 100, cmd )
+   if not returned['OK']:
+     self.log.warn( '===========> SSH BigData Hadoop-HadoopInteractive V.1 launch NOT OK' )
+     return S_ERROR( "Error launching Hadoop-HadoopInteractive Job" )
 
-   self.log.debug( 'BigData Hadoop-HadoopInteractive V.1 result OK', thread1.getName() )
+   self.log.debug( 'BigData Hadoop-HadoopInteractive V.1 result OK' )
 
    self.log.debug( 'Step10::: Stop process for get the JobID: ' )
    cmd = '/bin/chmod 555 ' + submitFile2
    self.sshConnect.sshCallByPort( 100, cmd )
 
-   cmd = submitFile2 + ' -c step1'
-   returned = self.sshConnect.sshCallByPort( 100, cmd )
-   self.log.debug( 'Step11:::InteractiveJobMonitorThread:step1:getJobID:', returned )
-   if returned != None:
-     if ( returned['Value'][1] != "" ):
-       resulting = re.search( "job_+([^:]+)", returned['Value'][1] )
-       if ( resulting != None ):
-         self.log.debug( 'Step12:::InteractiveJobMonitorThread:step1:JobID:', resulting.group( 0 ).rstrip() )
-         return S_OK( resulting.group( 0 ).rstrip() )
+   # Each call only reads the output appended since the previous one
+   cmd = submitFile2 + ' -c events'
+   for _attempt in range( 5 ):
+     time.sleep( 1 )
+     returned = self.sshConnect.sshCallByPort( 100, cmd )
+     self.log.debug( 'Step11:::ProgressReader:events:', returned )
+     if not returned['OK']:
+       continue
+     for event in parseEvents( returned['Value'][1] ):
+       if event['event'] == 'running':
+         self.log.debug( 'Step12:::ProgressReader:JobID:', event['job'] )
+         return S_OK( event['job'] )
+       if event['event'] == 'failed':
+         return S_ERROR( event['message'] )
+   return S_ERROR( 'No Hadoop job ID found in %s' % HadoopInteractiveJobOutput )
 
   def getData( self, temSRC, tempDest ):
     cmdSeq = "hadoop dfs - get " + temSRC + " " + tempDest
@@ -176,11 +151,27 @@ if __name__ == '__main__':
     cmdSeq = "rm - Rf " + tempPath
     return self.sshConnect.sshCallByPort( 100, cmdSeq )
 
+  def setSandboxCache( self, sandboxCache ):
+    """ Upload the job sandboxes through the given SandboxCache of the endpoint
+    """
+    self.sandboxCache = sandboxCache
+
+  def sandboxCopy( self, tempPath, tmpSandBoxDir ):
+    """ Copy the job sandbox to the master, only the files not in the endpoint
+        cache are sent when it is enabled
+    """
+    if self.sandboxCache:
+      result = self.sandboxCache.upload( 100, tempPath, tmpSandBoxDir )
+      if result['OK']:
+        return result
+      self.log.warn( 'Sandbox cache upload failed, copying the whole sandbox:', result['Message'] )
+    return self.dataCopy( tempPath, tmpSandBoxDir )
+
   def dataCopy( self, tempPath, tmpSandBoxDir ):
-    return self.sshConnect.scpCallByPort( 100, tempPath, tmpSandBoxDir )
+    return self.sshConnect.transferCall( 100, tempPath, tmpSandBoxDir, byPort = True )
 
   def getdata( self, tempPath, tmpSandBoxDir ):
-    return self.sshConnect.scpCallByPort( 100, tempPath, tmpSandBoxDir, False )
+    return self.sshConnect.transferCall( 100, tempPath, tmpSandBoxDir, False, byPort = True )
 
   def jobStatus( self, jobId, user, host ):
     cmdSeq = "ssh - l " + user + " " + host + " 'hadoop job -list all | awk -v job_id=" + jobId.strip() + " "\
@@ -6,9 +6,9 @@ from urlparse import urlparse
 # DIRAC
 from DIRAC import gLogger, gConfig, S_OK, S_ERROR
 from DIRAC.WorkloadManagementSystem.Client.ServerUtils        import jobDB
-from DIRAC.FrameworkSystem.Client.ProxyManagerClient        import gProxyManager
 
 from BigDataDIRAC.WorkloadManagementSystem.private.ConnectionUtils import ConnectionUtils
+from BigDataDIRAC.WorkloadManagementSystem.private.ProxyCache import gProxyCache
 from BigDataDIRAC.WorkloadManagementSystem.Client.HadoopV2Client import HadoopV2Client
 
 from DIRAC.Interfaces.API.Dirac import Dirac
@@ -20,7 +20,7 @@ class HadoopV2:
   An Hadoop V.2 provides the functionality of Hadoop that is required to use it for infrastructure.
   """
 
-  def __init__( self, NameNode, Port, jobID, PublicIP, User, JobName, Dataset ):
+  def __init__( self, NameNode, Port, jobID, PublicIP, User, JobName, Dataset, Client = None ):
 
     self.__tmpSandBoxDir = "/tmp/"
 
@@ -31,8 +31,7 @@ class HadoopV2:
     self.__User = User
     self.__JobName = JobName
     self.__Dataset = Dataset
-
-    self.defaultProxyLength = gConfig.getValue( '/Registry/DefaultProxyLifeTime', 86400 * 5 )
+    self.__client = Client
 
     self.log = gLogger.getSubLogger( "Hadoop Version 2, no HHL, NameNode: %s" % ( NameNode ) )
     self.log.info( "Hadoop Version 2, no HHL, Port: %s" % ( Port ) )
@@ -57,21 +56,19 @@ class HadoopV2:
         temp_file.write( self.jobWrapper() )
     self.log.info( 'Writting temporal Hadoop Job.xml' )
 
-    HadoopV1cli = HadoopV2Client( self.__User , self.__publicIP )
-    returned = HadoopV1cli.dataCopy( tempPath, self.__tmpSandBoxDir )
+    HadoopV1cli = self.__client or HadoopV2Client( self.__User , self.__publicIP )
+    returned = HadoopV1cli.sandboxCopy( tempPath, self.__tmpSandBoxDir )
     self.log.info( 'Copy the job contain to the Hadoop Master: ', returned )
 
     jobInfo = jobDB.getJobAttributes( self.__jobID )
     if not jobInfo['OK']:
       return S_ERROR( jobInfo['Value'] )
-    proxy = ""
     jobInfo = jobInfo['Value']
-    if gProxyManager.userHasProxy( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] ):
-      proxy = gProxyManager.downloadProxyToFile( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
-    else:
-      proxy = self.__requestProxyFromProxyManager( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
+    proxy = gProxyCache.getProxy( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
+    if not proxy['OK']:
+      return proxy
 
-    returned = HadoopV1cli.jobSubmit( tempPath, jobXMLName, proxy['chain'] )
+    returned = HadoopV1cli.jobSubmit( tempPath, jobXMLName, proxy['Value'] )
     self.log.info( 'Launch Hadoop job to the Hadoop Master: ', returned )
 
     if not returned['OK']:
@@ -81,6 +78,35 @@ class HadoopV2:
 
     return S_OK( returned['Value'] )
 
+  def prepareNewBigJob( self ):
+    """ Write the job directory and its submission wrapper locally for a batch
+        submission, returns ( tempPath, submitFile )
+    """
+    tempPath = self.__tmpSandBoxDir + str( self.__jobID )
+    dirac = Dirac()
+    if not os.path.exists( tempPath ):
+      os.makedirs( tempPath )
+
+    settingJobSandBoxDir = dirac.getInputSandbox( self.__jobID, tempPath )
+    self.log.info( 'Writting temporal SandboxDir in Server', settingJobSandBoxDir )
+
+    jobXMLName = "job:" + str( self.__jobID ) + '.xml'
+    with open( os.path.join( tempPath, jobXMLName ), 'wb' ) as temp_file:
+        temp_file.write( self.jobWrapper() )
+    self.log.info( 'Writting temporal Hadoop Job.xml' )
+
+    jobInfo = jobDB.getJobAttributes( self.__jobID )
+    if not jobInfo['OK']:
+      return S_ERROR( jobInfo['Value'] )
+    jobInfo = jobInfo['Value']
+    proxy = gProxyCache.getProxy( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
+    if not proxy['OK']:
+      return proxy
+
+    cli = self.__client or HadoopV2Client( self.__User , self.__publicIP )
+    submitFile = cli.writeJobWrapper( tempPath, jobXMLName, proxy['Value'] )
+    return S_OK( ( tempPath, submitFile ) )
+
   def submitNewBigPilot( self ):
 
     tempPath = self.__tmpSandBoxDir + str( self.__jobID )
@@ -96,21 +122,19 @@ class HadoopV2:
         temp_file.write( self.jobWrapper() )
     self.log.info( 'Writting temporal Hadoop Job.xml' )
 
-    HadoopV2cli = HadoopV2Client( self.__User , self.__publicIP )
+    HadoopV2cli = self.__client or HadoopV2Client( self.__User , self.__publicIP )
     #returned = HadoopV1cli.dataCopy( tempPath, self.__tmpSandBoxDir )
     #self.log.info( 'Copy the job contain to the Hadoop Master: ', returned )
 
     jobInfo = jobDB.getJobAttributes( self.__jobID )
     if not jobInfo['OK']:
       return S_ERROR( jobInfo['Value'] )
-    proxy = ""
     jobInfo = jobInfo['Value']
-    if gProxyManager.userHasProxy( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] ):
-      proxy = gProxyManager.downloadProxyToFile( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
-    else:
-      proxy = self.__requestProxyFromProxyManager( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
+    proxy = gProxyCache.getProxy( jobInfo["OwnerDN"], jobInfo["OwnerGroup"] )
+    if not proxy['OK']:
+      return proxy
 
-    returned = HadoopV2cli.submitPilotJob( tempPath, jobXMLName, proxy['chain'] )
+    returned = HadoopV2cli.submitPilotJob( tempPath, jobXMLName, proxy['Value'] )
 
     self.log.info( 'Launch Hadoop pilot to the Hadoop Master: ', returned )
 
@@ -121,26 +145,6 @@ class HadoopV2:
 
     return S_OK( returned['Value'] )
 
-  def __requestProxyFromProxyManager( self, ownerDN, ownerGroup ):
-    """Retrieves user proxy with correct role for job and sets up environment to
-       run job locally.
-    """
-    self.log.info( "Requesting proxy for %s@%s" % ( ownerDN, ownerGroup ) )
-    token = gConfig.getValue( "/Security/ProxyToken", "" )
-    if not token:
-      self.log.info( "No token defined. Trying to download proxy without token" )
-      token = False
-    retVal = gProxyManager.getPayloadProxyFromDIRACGroup( ownerDN, ownerGroup,
-                                                          self.defaultProxyLength, token )
-    if not retVal[ 'OK' ]:
-      self.log.error( 'Could not retrieve proxy' )
-      self.log.warn( retVal )
-      os.system( 'dirac-proxy-info' )
-      sys.stdout.flush()
-      return S_ERROR( 'Error retrieving proxy' )
-    chain = retVal[ 'Value' ]
-    return S_OK( chain )
-
   def jobWrapper( self ):
     tempPath = self.__tmpSandBoxDir + str( self.__jobID ) + "/InputSandbox" + str( self.__jobID )
 
@@ -6,6 +6,8 @@
 import random, time, re, os, glob, shutil, sys, base64, bz2, tempfile, stat, string
 
 from BigDataDIRAC.WorkloadManagementSystem.private.ConnectionUtils import ConnectionUtils
+from BigDataDIRAC.WorkloadManagementSystem.private.ProxyCache import gProxyCache
+from BigDataDIRAC.WorkloadManagementSystem.private.PayloadCache import gPayloadCache
 
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient       import gProxyManager
 from DIRAC.ConfigurationSystem.Client.Helpers import CSGlobals, getVO, Registry, Operations, Resources
@@ -23,6 +25,49 @@ WAITING_PILOT_STATUS = ['Submitted', 'Waiting', 'Scheduled', 'Ready']
 FINAL_PILOT_STATUS = ['Aborted', 'Failed', 'Done']
 ERROR_TOKEN = 'Invalid proxy token request'
 
+PILOT_WRAPPER_TEMPLATE = """#!/bin/bash
+/usr/bin/env python << EOF
+#
+import os, tempfile, sys, shutil, base64, bz2
+try:
+  pilotExecDir = '%(pilotExecDir)s'
+  if not pilotExecDir:
+    pilotExecDir = None
+  pilotWorkingDirectory = tempfile.mkdtemp( suffix = 'pilot', prefix = 'DIRAC_', dir = pilotExecDir )
+  pilotWorkingDirectory = os.path.realpath( pilotWorkingDirectory )
+  os.chdir( pilotWorkingDirectory )
+  if %(proxyFlag)s:
+    open( 'proxy', "w" ).write(bz2.decompress( base64.decodestring( \"\"\"%(compressedAndEncodedProxy)s\"\"\" ) ) )
+    os.chmod("proxy",0600)
+    os.environ["X509_USER_PROXY"]=os.path.join(pilotWorkingDirectory, 'proxy')
+  open( '%(pilotScript)s', "w" ).write(bz2.decompress( base64.decodestring( \"\"\"%(compressedAndEncodedPilot)s\"\"\" ) ) )
+  open( '%(installScript)s', "w" ).write(bz2.decompress( base64.decodestring( \"\"\"%(compressedAndEncodedInstall)s\"\"\" ) ) )
+  os.chmod("%(pilotScript)s",0700)
+  os.chmod("%(installScript)s",0700)
+  if "LD_LIBRARY_PATH" not in os.environ:
+    os.environ["LD_LIBRARY_PATH"]=""
+  if "%(httpProxy)s":
+    os.environ["HTTP_PROXY"]="%(httpProxy)s"
+  os.environ["X509_CERT_DIR"]=os.path.join(pilotWorkingDirectory, 'etc/grid-security/certificates')
+  # TODO: structure the output
+  print '==========================================================='
+  print 'Environment of execution host'
+  for key in os.environ.keys():
+    print key + '=' + os.environ[key]
+  print '==========================================================='
+except Exception, x:
+  print >> sys.stderr, x
+  sys.exit(-1)
+cmd = "python %(pilotScript)s %(pilotOptions)s"
+print 'Executing: ', cmd
+sys.stdout.flush()
+os.system( cmd )
+
+shutil.rmtree( pilotWorkingDirectory )
+
+EOF
+"""
+
 # Classes
 ###################
 class HadoopV2Client:
@@ -40,14 +85,22 @@ class HadoopV2Client:
     self.user = User
     self.publicIP = PublicIP
     self.sshConnect = ConnectionUtils( self.user , self.publicIP )
+    self.statusBackend = None
+    self.sandboxCache = None
+
+  def setStatusBackend( self, statusBackend ):
+    """ Ask the job states to the given backend ( e.g. YarnRestClient ) instead
+        of running 'hadoop job' on the master
+    """
+    self.statusBackend = statusBackend
 
   def getData( self, temSRC, tempDest ):
     cmdSeq = "hadoop dfs -get " + temSRC + " " + tempDest
     return self.sshConnect.sshCall( 100, cmdSeq )
 
 
-  def jobSubmit( self, tempPath, jobXMLName, proxy ):
-   """ Method to submit job
+  def writeJobWrapper( self, tempPath, jobXMLName, proxy ):
+   """ Write the executable submitting the job, wrapped with the proxy if given
    """
    executableFile = tempPath + "/" + jobXMLName
     # if no proxy is supplied, the executable can be submitted directly
@@ -56,7 +109,7 @@ class HadoopV2Client:
     # recommended to transfer a proxy inside the executable if possible.
    if proxy:
     self.log.verbose( 'Setting up proxy for payload' )
-    compressedAndEncodedProxy = base64.encodestring( bz2.compress( proxy.dumpAllToString()['Value'] ) ).replace( '\n', '' )
+    compressedAndEncodedProxy = gProxyCache.encodeProxy( proxy )
     compressedAndEncodedExecutable = base64.encodestring( bz2.compress( open( executableFile, "rb" ).read(), 9 ) ).replace( '\n', '' )
 
     wrapperContent = """#!/usr/bin/env python
@@ -92,8 +145,15 @@ shutil.rmtree( workingDirectory )
    else: # no proxy
      submitFile = executableFile
 
-   # Copy the executable
    os.chmod( submitFile, stat.S_IRUSR | stat.S_IXUSR )
+   return submitFile
+
+  def jobSubmit( self, tempPath, jobXMLName, proxy ):
+   """ Method to submit job
+   """
+   submitFile = self.writeJobWrapper( tempPath, jobXMLName, proxy )
+
+   # Copy the executable
    sFile = os.path.basename( submitFile )
    result = self.sshConnect.scpCall( 10, submitFile, '%s/%s' % ( tempPath, os.path.basename( submitFile ) ) )
 
@@ -123,6 +183,47 @@ shutil.rmtree( workingDirectory )
        return S_OK( resulting.group( 0 ).rstrip() )
    return S_ERROR( result['Value'] )
 
+  def jobSubmitBatch( self, jobs ):
+    """ Submit several jobs at once, jobs is a dictionary { JobID: ( tempPath, submitFile ) }
+        with the job directories and wrappers already written. All the directories are
+        uploaded in one transfer and a single remote script runs the wrappers, printing
+        "<JobID> <Hadoop JobID>" per job. Returns the dictionary of submitted jobs.
+    """
+    uploads = {}
+    for tempPath, _submitFile in jobs.values():
+      uploads.setdefault( os.path.dirname( tempPath.rstrip( '/' ) ), [] ).append( tempPath )
+    for tmpSandBoxDir, tempPaths in uploads.items():
+      if self.sandboxCache:
+        for tempPath in tempPaths:
+          result = self.sandboxCopy( tempPath, tmpSandBoxDir )
+          if not result['OK']:
+            return result
+      else:
+        result = self.sshConnect.transferCall( 100, tempPaths, tmpSandBoxDir )
+        if not result['OK']:
+          return result
+
+    lines = []
+    for jobID, ( _tempPath, submitFile ) in sorted( jobs.items() ):
+      lines.append( "id=$( %s 2>&1 | grep -o 'job_[0-9]*_[0-9]*' | head -n 1 ); echo \"%s $id\"" % ( submitFile, jobID ) )
+    script = tempfile.NamedTemporaryFile( prefix = 'BigDat_', suffix = '_submit.sh' )
+    try:
+      script.write( '\n'.join( lines ) + '\n' )
+      script.flush()
+      self.log.verbose( 'BigData batch submission of %s jobs' % len( jobs ) )
+      result = self.sshConnect.pipeCall( max( 100, 10 * len( jobs ) ), 'cat %s' % script.name, 'sh', True )
+    finally:
+      script.close()
+    if not result['OK']:
+      return result
+
+    hadoopIDs = {}
+    for line in result['Value'][1].splitlines():
+      fields = line.split()
+      if len( fields ) == 2 and fields[1].startswith( 'job_' ):
+        hadoopIDs[int( fields[0] )] = fields[1]
+    return S_OK( hadoopIDs )
+
   def delHadoopData( self, tempPath ):
     cmdSeq = "hadoop dfs -rm -r " + tempPath
     #cmdSeq = "hadoop dfs -ls " + tempPath
@@ -132,13 +233,31 @@ shutil.rmtree( workingDirectory )
     cmdSeq = "rm -Rf " + tempPath
     return self.sshConnect.sshCall( 100, cmdSeq )
 
+  def setSandboxCache( self, sandboxCache ):
+    """ Upload the job sandboxes through the given SandboxCache of the endpoint
+    """
+    self.sandboxCache = sandboxCache
+
+  def sandboxCopy( self, tempPath, tmpSandBoxDir ):
+    """ Copy the job sandbox to the master, only the files not in the endpoint
+        cache are sent when it is enabled
+    """
+    if self.sandboxCache:
+      result = self.sandboxCache.upload( 100, tempPath, tmpSandBoxDir )
+      if result['OK']:
+        return result
+      self.log.warn( 'Sandbox cache upload failed, copying the whole sandbox:', result['Message'] )
+    return self.dataCopy( tempPath, tmpSandBoxDir )
+
   def dataCopy( self, tempPath, tmpSandBoxDir ):
-    return self.sshConnect.scpCall( 100, tempPath, tmpSandBoxDir )
+    return self.sshConnect.transferCall( 100, tempPath, tmpSandBoxDir )
 
   def getdata( self, tempPath, tmpSandBoxDir ):
-    return self.sshConnect.scpCall( 100, tempPath, tmpSandBoxDir, False )
+    return self.sshConnect.transferCall( 100, tempPath, tmpSandBoxDir, False )
 
   def jobStatus( self, jobId, user, host ):
+    if self.statusBackend:
+      return self.statusBackend.jobStatus( jobId )
     cmdSeq = "ssh -l " + user + " " + host + " 'hadoop job -status " + jobId + "'"
 
     gLogger.info( 'Command Submitted: ', cmdSeq )
@@ -165,6 +284,50 @@ shutil.rmtree( workingDirectory )
           return DIRAC.S_OK( "Running" )
     return DIRAC.S_ERROR( result )
 
+  def jobStatusList( self, states = None, finishedSince = None ):
+    """ Get the state of every job known by the cluster with a single
+        'hadoop job -list all', returns a dictionary of Hadoop job ID and state.
+        The YARN states and end time filters are only applied by the REST backend.
+    """
+    if self.statusBackend:
+      return self.statusBackend.jobStatusList( states, finishedSince )
+
+    cmdSeq = "hadoop job -list all"
+
+    gLogger.info( 'Command Submitted: ', cmdSeq )
+    result = self.sshConnect.sshCall( 100, cmdSeq )
+    if not result['OK']:
+      return result
+    status, jobList, error = result['Value']
+    if status != 0:
+      return S_ERROR( 'Could not list the jobs: %s' % ( error or jobList ) )
+    jobStates = self.parseJobList( jobList )
+    if jobStates is None:
+      return S_ERROR( 'No job list in the output: %s' % jobList[:200] )
+    return S_OK( jobStates )
+
+  def parseJobList( self, jobList ):
+    """ Parse the output of 'hadoop job -list all', the states are reported
+        the same way as jobStatus does. Returns None if the output has no JobId
+        header, it is not a list
+    """
+    jobStates = {}
+    header = False
+    for line in jobList.splitlines():
+      fields = line.split()
+      if fields and fields[0] == "JobId":
+        header = True
+      elif len( fields ) > 1 and fields[0].startswith( "job_" ):
+        if fields[1] == "SUCCEEDED":
+          jobStates[fields[0]] = "Succeded"
+        elif fields[1] == "RUNNING":
+          jobStates[fields[0]] = "Running"
+        else:
+          jobStates[fields[0]] = "Unknown"
+    if not header:
+      return None
+    return jobStates
+
   def newJob( self, path, jobDiracId, bdJobId ):
 
     cmdSeq = "ssh -l " + self.user + " " + self.publicIP + " /" + path + "/" + str( jobDiracId ) + "/BigDat_*_getInfo.py -c step1 | wc -l"
@@ -246,64 +409,22 @@ shutil.rmtree( workingDirectory )
       compressedAndEncodedProxy = ''
       proxyFlag = 'False'
       if proxy:
-        compressedAndEncodedProxy = base64.encodestring( bz2.compress( proxy.dumpAllToString()['Value'] ) )
+        compressedAndEncodedProxy = gProxyCache.encodeProxy( proxy )
         proxyFlag = 'True'
-      compressedAndEncodedPilot = base64.encodestring( bz2.compress( open( self.pilot, "rb" ).read(), 9 ) )
-      compressedAndEncodedInstall = base64.encodestring( bz2.compress( open( self.install, "rb" ).read(), 9 ) )
+      pilotTemplate = gPayloadCache.getTemplate( PILOT_WRAPPER_TEMPLATE,
+                                                 { 'compressedAndEncodedPilot': self.pilot,
+                                                   'compressedAndEncodedInstall': self.install } )
     except:
       self.log.exception( 'Exception during file compression of proxy, dirac-pilot or dirac-install' )
       return S_ERROR( 'Exception during file compression of proxy, dirac-pilot or dirac-install' )
 
-    localPilot = """#!/bin/bash
-/usr/bin/env python << EOF
-#
-import os, tempfile, sys, shutil, base64, bz2
-try:
-  pilotExecDir = '%(pilotExecDir)s'
-  if not pilotExecDir:
-    pilotExecDir = None
-  pilotWorkingDirectory = tempfile.mkdtemp( suffix = 'pilot', prefix = 'DIRAC_', dir = pilotExecDir )
-  pilotWorkingDirectory = os.path.realpath( pilotWorkingDirectory )
-  os.chdir( pilotWorkingDirectory )
-  if %(proxyFlag)s:
-    open( 'proxy', "w" ).write(bz2.decompress( base64.decodestring( \"\"\"%(compressedAndEncodedProxy)s\"\"\" ) ) )
-    os.chmod("proxy",0600)
-    os.environ["X509_USER_PROXY"]=os.path.join(pilotWorkingDirectory, 'proxy')
-  open( '%(pilotScript)s', "w" ).write(bz2.decompress( base64.decodestring( \"\"\"%(compressedAndEncodedPilot)s\"\"\" ) ) )
-  open( '%(installScript)s', "w" ).write(bz2.decompress( base64.decodestring( \"\"\"%(compressedAndEncodedInstall)s\"\"\" ) ) )
-  os.chmod("%(pilotScript)s",0700)
-  os.chmod("%(installScript)s",0700)
-  if "LD_LIBRARY_PATH" not in os.environ:
-    os.environ["LD_LIBRARY_PATH"]=""
-  if "%(httpProxy)s":
-    os.environ["HTTP_PROXY"]="%(httpProxy)s"
-  os.environ["X509_CERT_DIR"]=os.path.join(pilotWorkingDirectory, 'etc/grid-security/certificates')
-  # TODO: structure the output
-  print '==========================================================='
-  print 'Environment of execution host'
-  for key in os.environ.keys():
-    print key + '=' + os.environ[key]
-  print '==========================================================='
-except Exception, x:
-  print >> sys.stderr, x
-  sys.exit(-1)
-cmd = "python %(pilotScript)s %(pilotOptions)s"
-print 'Executing: ', cmd
-sys.stdout.flush()
-os.system( cmd )
-
-shutil.rmtree( pilotWorkingDirectory )
-
-EOF
-""" % { 'compressedAndEncodedProxy': compressedAndEncodedProxy,
-        'compressedAndEncodedPilot': compressedAndEncodedPilot,
-        'compressedAndEncodedInstall': compressedAndEncodedInstall,
-        'httpProxy': httpProxy,
-        'pilotExecDir': pilotExecDir,
-        'pilotScript': os.path.basename( self.pilot ),
-        'installScript': os.path.basename( self.install ),
-        'pilotOptions': ' '.join( pilotOptions ),
-        'proxyFlag': proxyFlag }
+    localPilot = pilotTemplate % { 'compressedAndEncodedProxy': compressedAndEncodedProxy,
+                                   'httpProxy': httpProxy,
+                                   'pilotExecDir': pilotExecDir,
+                                   'pilotScript': os.path.basename( self.pilot ),
+                                   'installScript': os.path.basename( self.install ),
+                                   'pilotOptions': ' '.join( pilotOptions ),
+                                   'proxyFlag': proxyFlag }
 
     fd, name = tempfile.mkstemp( suffix = '_pilotwrapper.py', prefix = 'DIRAC_', dir = workingDirectory )
     pilotWrapper = os.fdopen( fd, 'w' )
@@ -7,9 +7,9 @@
 import random, time, re, os, glob, shutil, sys, base64, bz2, tempfile, stat, string, thread
 
 from BigDataDIRAC.WorkloadManagementSystem.private.ConnectionUtils import ConnectionUtils
+from BigDataDIRAC.WorkloadManagementSystem.private.ProxyCache import gProxyCache
 
-from BigDataDIRAC.WorkloadManagementSystem.private.InteractiveJobLaunch import InteractiveJobLaunchThread
-from BigDataDIRAC.WorkloadManagementSystem.private.InteractiveJobMonitor import InteractiveJobMonitorThread
+from BigDataDIRAC.WorkloadManagementSystem.private.InteractiveJobWatcher import gInteractiveJobWatcher
 
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient       import gProxyManager
 from DIRAC.ConfigurationSystem.Client.Helpers import CSGlobals, getVO, Registry, Operations, Resources
@@ -38,6 +38,7 @@ class HiveV1Client( object ):
     self.user = User
     self.publicIP = PublicIP
     self.sshConnect = ConnectionUtils( self.user , self.publicIP )
+    self.sandboxCache = None
 
   def jobSubmit( self, tempPath, HiveJob, proxy, HiveJobOutput ):
    """ Method to submit job
@@ -49,7 +50,7 @@ class HiveV1Client( object ):
    HiveJobPath = tempPath + HiveJob
    if proxy:
     self.log.verbose( 'Setting up proxy for payload' )
-    compressedAndEncodedProxy = base64.encodestring( bz2.compress( proxy.dumpAllToString()['Value'] ) ).replace( '\n', '' )
+    compressedAndEncodedProxy = gProxyCache.encodeProxy( proxy )
     compressedAndEncodedExecutable = base64.encodestring( bz2.compress( open( HiveJobPath, "rb" ).read(), 9 ) ).replace( '\n', '' )
 
     wrapperContent = """#!/usr/bin/env python
@@ -84,45 +85,6 @@ shutil.rmtree( workingDirectory )
 
     submitFile = name
 
-    wrapperContent = """#!/usr/bin/env python
-# Wrapper script for executable and proxy
-import os, tempfile, sys, base64, bz2, shutil, getopt,re
-
-def main(argv):
-   inputfile = ''
-   command = ''
-   try:
-      opts, args = getopt.getopt(argv,'h:c:',[''])
-   except getopt.GetoptError:
-      print 'name.py -c <command>'
-      sys.exit(2)
-   for opt, arg in opts:
-      if opt == '-h':
-         print 'name.py -c <command>'
-         sys.exit()
-      elif opt in ('-c', '--command'):
-         command = arg
-   if (command == 'step1'):
-        cmd = 'grep "Total MapReduce jobs" %(HiveJobOutput)s'
-        returned = os.system(cmd)
-   if (command == 'step2'):
-        cmd = 'grep "Starting Job" %(HiveJobOutput)s'
-        returned = os.system(cmd)
-   if (command == 'step3'):
-        cmd = 'grep "Ended Job" %(HiveJobOutput)s'
-        returned = os.system(cmd)
-
-if __name__ == '__main__':
-   main(sys.argv[1:])     
-              """ % { 'HiveJobOutput': tempPath + HiveJobOutput }
-
-    fd, name = tempfile.mkstemp( suffix = '_getInfo.py', prefix = 'BigDat_', dir = tempPath )
-    wrapper = os.fdopen( fd, 'w' )
-    wrapper.write( wrapperContent )
-    wrapper.close()
-
-    submitFile2 = name
-
    else: # no proxy
      submitFile = HiveJob
 
@@ -130,31 +92,27 @@ if __name__ == '__main__':
    os.chmod( submitFile, stat.S_IRUSR | stat.S_IXUSR )
    sFile = os.path.basename( submitFile )
    returned = self.sshConnect.scpCall( 10, submitFile, '%s/%s' % ( tempPath, os.path.basename( submitFile ) ) )
-   returned2 = self.sshConnect.scpCall( 10, submitFile2, '%s/%s' % ( tempPath, os.path.basename( submitFile2 ) ) )
 
    if not returned['OK']:
       return S_ERROR( returned['Message'] )
-   if not returned2['OK']:
-      return S_ERROR( returned2['Message'] )
 
-   # submit submitFile to the batch system
-   cmd = submitFile
+   # submit submitFile detached, the shared watcher follows its output and its process
+   cmd = 'nohup %s < /dev/null > /dev/null 2>&1 & echo $!' % submitFile
 
    self.log.verbose( 'BigData submission command: %s' % ( cmd ) )
 
-   thread1 = InteractiveJobLaunchThread( self.user, self.publicIP , cmd )
-   thread2 = InteractiveJobMonitorThread( self.user, self.publicIP, self.monitoringloop, thread1, tempPath + HiveJobOutput, submitFile2 )
-
-   thread1.start()
-   thread2.start()
+   returned = self.sshConnect.sshCall( 100, cmd )
+   if not returned['OK']:
+     self.log.warn( '===========> SSH BigData Hadoop-Hive V.1 launch NOT OK' )
+     return S_ERROR( "Error launching Hadoop-Hive Job" )
 
-   self.log.debug( 'BigData Hadoop-HIVE V.1 result OK', thread1.getName() )
-   if not thread1.isAlive():
-     self.log.warn( '===========> SSH BigData Hadoop-Hive thread V.1 result NOT OK' )
-     return S_ERROR( "Error launching Hadoop-Hive Thread" )
-   else:
-     self.log.debug( 'BigData Hadoop-Hive Thread V.1 result OK' )
-     return S_OK( " Hadoop-Hive Job" )
+   pid = returned['Value'][1].strip()
+   if not pid.isdigit():
+     pid = None
+   jobID = int( os.path.basename( HiveJobOutput ).split( '_' )[0] )
+   gInteractiveJobWatcher.watch( jobID, self.user, self.publicIP, None, tempPath + HiveJobOutput, pid )
+   self.log.debug( 'BigData Hadoop-Hive V.1 result OK' )
+   return S_OK( " Hadoop-Hive Job" )
 
   def getData( self, temSRC, tempDest ):
     cmdSeq = "hadoop dfs - get " + temSRC + " " + tempDest
@@ -164,11 +122,27 @@ if __name__ == '__main__':
     cmdSeq = "rm -Rf " + tempPath
     return self.sshConnect.sshCall( 100, cmdSeq )
 
+  def setSandboxCache( self, sandboxCache ):
+    """ Upload the job sandboxes through the given SandboxCache of the endpoint
+    """
+    self.sandboxCache = sandboxCache
+
+  def sandboxCopy( self, tempPath, tmpSandBoxDir ):
+    """ Copy the job sandbox to the master, only the files not in the endpoint
+        cache are sent when it is enabled
+    """
+    if self.sandboxCache:
+      result = self.sandboxCache.upload( 100, tempPath, tmpSandBoxDir )
+      if result['OK']:
+        return result
+      self.log.warn( 'Sandbox cache upload failed, copying the whole sandbox:', result['Message'] )
+    return self.dataCopy( tempPath, tmpSandBoxDir )
+
   def dataCopy( self, tempPath, tmpSandBoxDir ):
-    return self.sshConnect.scpCall( 100, tempPath, tmpSandBoxDir )
+    return self.sshConnect.transferCall( 100, tempPath, tmpSandBoxDir )
 
   def getdata( self, tempPath, tmpSandBoxDir ):
-    return self.sshConnect.scpCall( 100, tempPath, tmpSandBoxDir, False )
+    return self.sshConnect.transferCall( 100, tempPath, tmpSandBoxDir, False )
 
   def jobStatus( self, jobId, user, host ):
     cmdSeq = "ssh - l " + user + " " + host + " 'hadoop job -list all | awk -v job_id=" + jobId.strip() + " "\
@@ -0,0 +1,161 @@
+########################################################################
+# $HeadURL$
+# File :   YarnRestClient.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Status backend for Hadoop V.2 endpoints using the ResourceManager REST API
+  ( /ws/v1/cluster/apps ) instead of running 'hadoop job' through ssh.
+
+  A single keep-alive HTTP connection is kept per client and the states of all
+  the applications of the cluster are retrieved in one request. It is enabled
+  per endpoint in /Resources/BigDataEndPoints/<EndPoint> with:
+    StatusBackend = REST
+    ResourceManagerURL = http://<resourcemanager>:8088
+"""
+
+import httplib
+import json
+import socket
+import threading
+from urlparse import urlparse
+
+from DIRAC                                                    import S_OK, S_ERROR, gLogger
+
+__RCSID__ = '$Id: $'
+
+APPS_PATH = '/ws/v1/cluster/apps'
+FINAL_STATES = [ 'FINISHED', 'FAILED', 'KILLED' ]
+
+class YarnRestClient:
+
+  def __init__( self, url, timeout = 30 ):
+    self.log = gLogger.getSubLogger( "YarnRestClient" )
+    parsedURL = urlparse( url )
+    self.secure = ( parsedURL.scheme == 'https' )
+    self.host = parsedURL.hostname
+    self.port = parsedURL.port
+    self.timeout = timeout
+    self.__connection = None
+    self.__lock = threading.Lock()
+
+  def __getConnection( self ):
+    if self.__connection is None:
+      if self.secure:
+        self.__connection = httplib.HTTPSConnection( self.host, self.port, timeout = self.timeout )
+      else:
+        self.__connection = httplib.HTTPConnection( self.host, self.port, timeout = self.timeout )
+    return self.__connection
+
+  def close( self ):
+    self.__lock.acquire()
+    try:
+      if self.__connection is not None:
+        self.__connection.close()
+        self.__connection = None
+    finally:
+      self.__lock.release()
+
+  def __get( self, path ):
+    """ GET a JSON document over the kept-alive connection, the connection is
+        opened again once if the server has closed it
+    """
+    self.__lock.acquire()
+    try:
+      for retry in ( True, False ):
+        connection = self.__getConnection()
+        try:
+          connection.request( 'GET', path, headers = { 'Accept': 'application/json',
+                                                       'Connection': 'keep-alive' } )
+          response = connection.getresponse()
+          body = response.read()
+        except ( httplib.HTTPException, socket.error ), error:
+          connection.close()
+          self.__connection = None
+          if retry:
+            continue
+          return S_ERROR( 'Error querying %s%s: %s' % ( self.host, path, error ) )
+        if response.status != 200:
+          return S_ERROR( 'Error querying %s%s: HTTP %s %s' % ( self.host, path, response.status, response.reason ) )
+        try:
+          return S_OK( json.loads( body ) )
+        except ValueError, error:
+          return S_ERROR( 'Invalid answer from %s%s: %s' % ( self.host, path, error ) )
+    finally:
+      self.__lock.release()
+
+  def getApplications( self, states = None, finishedTimeBegin = None ):
+    """ Return the list of applications of the cluster, optionally filtered by
+        YARN states ( RUNNING, FINISHED, ... ) and by end time, in milliseconds
+        since the epoch
+    """
+    query = []
+    if states:
+      query.append( 'states=%s' % ','.join( states ) )
+    if finishedTimeBegin is not None:
+      query.append( 'finishedTimeBegin=%d' % finishedTimeBegin )
+    path = APPS_PATH
+    if query:
+      path += '?%s' % '&'.join( query )
+    result = self.__get( path )
+    if not result['OK']:
+      return result
+    #"apps" is null when no application matches, missing if this is not a list
+    if not isinstance( result['Value'], dict ) or 'apps' not in result['Value']:
+      return S_ERROR( 'No application list in the answer of %s' % path )
+    apps = result['Value']['apps'] or {}
+    return S_OK( apps.get( 'app', [] ) )
+
+  def jobStatusList( self, states = None, finishedSince = None ):
+    """ Get the state of the jobs with a single request, returns a dictionary of
+        Hadoop job ID and state reported the same way as HadoopV2Client does.
+        With finishedSince, in seconds since the epoch, the jobs in a final state
+        are only returned if they ended after it, which takes a second request.
+    """
+    if finishedSince is None:
+      queries = [ ( states, None ) ]
+    else:
+      states = states or [ 'NEW', 'NEW_SAVING', 'SUBMITTED', 'ACCEPTED', 'RUNNING' ] + FINAL_STATES
+      queries = [ ( [ state for state in states if state not in FINAL_STATES ], None ),
+                  ( [ state for state in states if state in FINAL_STATES ], int( finishedSince * 1000 ) ) ]
+    jobStates = {}
+    for queryStates, finishedTimeBegin in queries:
+      if finishedSince is not None and not queryStates:
+        continue
+      result = self.getApplications( queryStates, finishedTimeBegin )
+      if not result['OK']:
+        return result
+      for app in result['Value']:
+        jobStates[self.getJobID( app['id'] )] = self.getJobState( app )
+    return S_OK( jobStates )
+
+  def jobStatus( self, jobId ):
+    """ Get the state of a single job
+    """
+    result = self.__get( '%s/%s' % ( APPS_PATH, self.getApplicationID( jobId.strip() ) ) )
+    if not result['OK']:
+      return result
+    app = result['Value'].get( 'app' )
+    if not app:
+      return S_OK( "Unknown" )
+    return S_OK( self.getJobState( app ) )
+
+  def getJobState( self, app ):
+    if app.get( 'state' ) == 'FINISHED' and app.get( 'finalStatus' ) == 'SUCCEEDED':
+      return "Succeded"
+    if app.get( 'state' ) == 'RUNNING':
+      return "Running"
+    return "Unknown"
+
+  def getJobID( self, applicationId ):
+    """ application_<cluster>_<id> is known as job_<cluster>_<id> by MapReduce
+    """
+    if applicationId.startswith( 'application_' ):
+      return 'job_' + applicationId[len( 'application_' ):]
+    return applicationId
+
+  def getApplicationID( self, jobId ):
+    if jobId.startswith( 'job_' ):
+      return 'application_' + jobId[len( 'job_' ):]
+    return jobId
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Tests of YarnRestClient against a local stub of the ResourceManager REST API
+#
+import json
+import threading
+import unittest
+import urlparse
+import BaseHTTPServer
+
+from BigDataDIRAC.WorkloadManagementSystem.Client.YarnRestClient import YarnRestClient
+
+APPS = [ { 'id': 'application_1400000000000_0001', 'state': 'FINISHED', 'finalStatus': 'SUCCEEDED',
+           'finishedTime': 1400000500000 },
+         { 'id': 'application_1400000000000_0002', 'state': 'RUNNING', 'finalStatus': 'UNDEFINED',
+           'finishedTime': 0 },
+         { 'id': 'application_1400000000000_0003', 'state': 'FINISHED', 'finalStatus': 'FAILED',
+           'finishedTime': 1400000100000 },
+         { 'id': 'application_1400000000000_0004', 'state': 'ACCEPTED', 'finalStatus': 'UNDEFINED',
+           'finishedTime': 0 } ]
+
+class StubResourceManagerHandler( BaseHTTPServer.BaseHTTPRequestHandler ):
+
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET( self ):
+    self.server.requests.append( self.path )
+    self.server.connections.add( self.client_address )
+    path, _sep, query = self.path.partition( '?' )
+    if path == '/ws/v1/cluster/apps':
+      apps = APPS
+      query = urlparse.parse_qs( query )
+      if query.get( 'states' ) == [ 'NOLIST' ]:
+        # An answer without the application list, like an error page
+        self.__send( 200, {} )
+        return
+      if 'states' in query:
+        states = query['states'][0].split( ',' )
+        apps = [ app for app in apps if app['state'] in states ]
+      if 'finishedTimeBegin' in query:
+        finishedTimeBegin = int( query['finishedTimeBegin'][0] )
+        apps = [ app for app in apps if app['finishedTime'] >= finishedTimeBegin ]
+      self.__send( 200, { 'apps': { 'app': apps } if apps else None } )
+    elif path.startswith( '/ws/v1/cluster/apps/' ):
+      appId = path.split( '/' )[-1]
+      for app in APPS:
+        if app['id'] == appId:
+          self.__send( 200, { 'app': app } )
+          return
+      self.__send( 404, { 'RemoteException': { 'message': 'app not found' } } )
+    else:
+      self.__send( 404, {} )
+
+  def __send( self, status, document ):
+    body = json.dumps( document )
+    self.send_response( status )
+    self.send_header( 'Content-Type', 'application/json' )
+    self.send_header( 'Content-Length', str( len( body ) ) )
+    self.end_headers()
+    self.wfile.write( body )
+
+  def log_message( self, *args ):
+    pass
+
+class YarnRestClientTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.server = BaseHTTPServer.HTTPServer( ( '127.0.0.1', 0 ), StubResourceManagerHandler )
+    self.server.requests = []
+    self.server.connections = set()
+    self.thread = threading.Thread( target = self.server.serve_forever )
+    self.thread.setDaemon( True )
+    self.thread.start()
+    self.client = YarnRestClient( 'http://127.0.0.1:%s' % self.server.server_address[1] )
+
+  def tearDown( self ):
+    self.client.close()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def test_jobStatusList( self ):
+    result = self.client.jobStatusList()
+    self.assertTrue( result['OK'] )
+    self.assertEqual( result['Value'], { 'job_1400000000000_0001': 'Succeded',
+                                         'job_1400000000000_0002': 'Running',
+                                         'job_1400000000000_0003': 'Unknown',
+                                         'job_1400000000000_0004': 'Unknown' } )
+
+  def test_stateFilter( self ):
+    result = self.client.jobStatusList( [ 'RUNNING' ] )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( result['Value'], { 'job_1400000000000_0002': 'Running' } )
+    self.assertEqual( self.server.requests, [ '/ws/v1/cluster/apps?states=RUNNING' ] )
+
+  def test_finishedSince( self ):
+    result = self.client.jobStatusList( [ 'RUNNING', 'FINISHED' ], 1400000200 )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( result['Value'], { 'job_1400000000000_0001': 'Succeded',
+                                         'job_1400000000000_0002': 'Running' } )
+    self.assertEqual( self.server.requests, [ '/ws/v1/cluster/apps?states=RUNNING',
+                                              '/ws/v1/cluster/apps?states=FINISHED&finishedTimeBegin=1400000200000' ] )
+
+  def test_noApplications( self ):
+    result = self.client.jobStatusList( [ 'KILLED' ] )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( result['Value'], {} )
+
+  def test_noApplicationList( self ):
+    result = self.client.jobStatusList( [ 'NOLIST' ] )
+    self.assertFalse( result['OK'] )
+
+  def test_jobStatus( self ):
+    result = self.client.jobStatus( 'job_1400000000000_0001' )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( result['Value'], 'Succeded' )
+    self.assertEqual( self.server.requests, [ '/ws/v1/cluster/apps/application_1400000000000_0001' ] )
+
+  def test_jobStatusNotFound( self ):
+    result = self.client.jobStatus( 'job_1400000000000_0009' )
+    self.assertFalse( result['OK'] )
+
+  def test_keepAlive( self ):
+    for _i in range( 3 ):
+      self.assertTrue( self.client.jobStatusList()['OK'] )
+    self.assertEqual( len( self.server.requests ), 3 )
+    self.assertEqual( len( self.server.connections ), 1 )
+
+  def test_serverDown( self ):
+    self.tearDown()
+    result = self.client.jobStatusList()
+    self.assertFalse( result['OK'] )
+    self.setUp()
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( YarnRestClientTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
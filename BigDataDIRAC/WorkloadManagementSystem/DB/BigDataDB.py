@@ -13,8 +13,7 @@ from DIRAC                import gConfig, S_ERROR, S_OK
 from DIRAC.Core.Base.DB   import DB
 from DIRAC.Core.Utilities import DEncode, Time
 
-from DIRAC.WorkloadManagementSystem.Client.ServerUtils        import jobDB
-from DIRAC.Core.DISET.RPCClient                               import RPCClient
+from DIRAC.WorkloadManagementSystem.Client.ServerUtils        import jobDB, jobLoggingDB
 
 class BigDataDB( DB ):
 
@@ -48,7 +47,8 @@ class BigDataDB( DB ):
                                           'BdJobSoftwareID' : 'VARCHAR(255) NOT NULL DEFAULT ""'
                                           },
                                    'PrimaryKey' : 'BdJobID',
-                                   'Indexes': { 'BdJobStatus': [ 'BdJobStatus' ] },
+                                   'Indexes': { 'BdJobStatus': [ 'BdJobStatus' ],
+                                                'NameNodeStatus': [ 'NameNode', 'BdJobStatus' ] },
                                  }
 
   tablesDesc[ 'BD_History' ] = { 'Fields' : { 'His_ID' : 'BIGINT UNSIGNED AUTO_INCREMENT NOT NULL',
@@ -148,6 +148,31 @@ class BigDataDB( DB ):
 
     return S_OK( jobsDict )
 
+  def getBigDataJobsCountByEndpoint( self, statusList ):
+    """
+    Get the number of jobs in each of the given status for every endpoint,
+    as a dictionary { NameNode : { status : count } }
+    """
+    for status in statusList:
+      if status not in self.validJobStates:
+        return S_ERROR( 'Status %s is not known' % status )
+
+    # InstanceTuple
+    tableName, _validStates, _idName = self.__getTypeTuple( 'job' )
+
+    sqlSelect = 'SELECT NameNode, BdJobStatus, COUNT(*) FROM `%s` WHERE BdJobStatus IN ( "%s" ) GROUP BY NameNode, BdJobStatus' % \
+                ( tableName, '", "'.join( statusList ) )
+    result = self._query( sqlSelect )
+    if not result[ 'OK' ]:
+      return result
+
+    countDict = {}
+    for nameNode, status, count in result[ 'Value' ]:
+      if nameNode not in countDict:
+        countDict[ nameNode ] = {}
+      countDict[ nameNode ][ status ] = int( count )
+
+    return S_OK( countDict )
 
   def __initializeDB( self ):
     """
@@ -296,6 +321,33 @@ class BigDataDB( DB ):
     sqlUpdate = 'UPDATE %s SET BdJobSoftwareID= "%s" WHERE %s = %s' % ( tableName, HadoopID, idName, JobID )
     return self._update( sqlUpdate )
 
+  def setHadoopIDs( self, hadoopIDDict ):
+    """
+    Insert the HadoopID of several jobs, given as { JobID: HadoopID }, with one UPDATE
+    """
+    if not hadoopIDDict:
+      return S_OK( 0 )
+    tableName, _validStates, idName = self.__getTypeTuple( 'job' )
+    jobIDs = [ int( jobID ) for jobID in hadoopIDDict ]
+    result = self._escapeValues( [ hadoopIDDict[jobID] for jobID in hadoopIDDict ] )
+    if not result[ 'OK' ]:
+      return result
+    cases = ' '.join( [ 'WHEN %s THEN %s' % ( jobID, hadoopID ) for jobID, hadoopID in zip( jobIDs, result['Value'] ) ] )
+    sqlUpdate = 'UPDATE `%s` SET BdJobSoftwareID = CASE %s %s END WHERE %s IN ( %s )' % \
+                ( tableName, idName, cases, idName, ', '.join( [ str( jobID ) for jobID in jobIDs ] ) )
+    return self._update( sqlUpdate )
+
+  def deleteBigDataJobs( self, jobIDs ):
+    """
+    Delete the jobs, given as a list of JobIDs, with one DELETE
+    """
+    if not jobIDs:
+      return S_OK( 0 )
+    tableName, _validStates, idName = self.__getTypeTuple( 'job' )
+    sqlDelete = 'DELETE FROM `%s` WHERE %s IN ( %s )' % ( tableName, idName,
+                                                          ', '.join( [ str( int( jobID ) ) for jobID in jobIDs ] ) )
+    return self._update( sqlDelete )
+
   def updateHadoopIDAndJobStatus( self, JobID, HadoopID ):
     """
     Insert HadoopID
@@ -308,91 +360,139 @@ class BigDataDB( DB ):
 
   def setJobStatus( self, JobID, status ):
     """
-    Insert HadoopID
+    Change the status of a single job
+    """
+    return self.setJobsStatus( [ ( JobID, status ) ] )
+
+  def touchJobs( self, jobIDs ):
     """
-    resultInfo = self.getJobIDInfo( JobID )
+    Refresh the last update time of the jobs, given as a list of JobIDs, whose
+    status did not change
+    """
+    if not jobIDs:
+      return S_OK( 0 )
+    tableName, _validStates, idName = self.__getTypeTuple( 'job' )
+    sqlUpdate = 'UPDATE `%s` SET BdJobLastUpdate = "%s" WHERE %s IN ( %s )' % \
+                ( tableName, Time.toString(), idName, ', '.join( [ str( int( jobID ) ) for jobID in jobIDs ] ) )
+    return self._update( sqlUpdate )
+
+  def setJobsStatus( self, jobStatusList ):
+    """
+    Apply a list of ( JobID, status ) transitions with one SELECT, one UPDATE
+    and one history INSERT, then report them to the JobDB in bulk
+    """
+    jobStatusDict = {}
+    for jobID, status in jobStatusList:
+      if status not in self.validJobStates:
+        return S_ERROR( 'Status %s is not known' % status )
+      # If a job appears several times the last transition wins
+      jobStatusDict[ int( jobID ) ] = status
+    if not jobStatusDict:
+      return S_OK( 0 )
 
     tableName, _validStates, idName = self.__getTypeTuple( 'job' )
-    sqlUpdate = 'UPDATE %s SET BdJobStatus= "%s" WHERE %s = %s' % ( tableName, status, idName, JobID )
-    self._update( sqlUpdate )
-    sqlUpdate = 'UPDATE %s SET BdJobLastUpdate= "%s" WHERE %s = %s' % ( tableName, Time.toString(), idName, JobID )
-    self._update( sqlUpdate )
-
-    job_his = self.insertHistoryJob( str( JobID ), resultInfo[0][0], status, resultInfo[0][1], Time.toString(),
-                          resultInfo[0][2], resultInfo[0][3], resultInfo[0][4], resultInfo[0][5],
-                          resultInfo[0][6] )
-    if not job_his['OK']:
-      return S_ERROR( 'Failed to insert Big Data Job in history table' )
-    result = self.setIntoJobDBStatus( JobID, status, resultInfo[0][1], resultInfo[0][2], resultInfo[0][7].strip() )
 
-    return S_OK( result )
+    sqlSelect = 'SELECT %s, BdJobName, NameNode, SiteName, BdSoftName, BdSoftVersion, BdSoftHighLevelLang, ' \
+                'BdSoftHighLevelLangVersion, BdJobSoftwareID FROM `%s` WHERE %s IN ( %s )' % \
+                ( idName, tableName, idName, ', '.join( [ str( jobID ) for jobID in jobStatusDict ] ) )
+    resultInfo = self._query( sqlSelect )
+    if not resultInfo[ 'OK' ]:
+      return resultInfo
+    jobsInfo = {}
+    for row in resultInfo[ 'Value' ]:
+      jobsInfo[ int( row[0] ) ] = row[1:]
+    if not jobsInfo:
+      return S_OK( 0 )
+
+    jobIDs = ', '.join( [ str( jobID ) for jobID in jobsInfo ] )
+    update = Time.toString()
+    cases = ' '.join( [ 'WHEN %s THEN "%s"' % ( jobID, jobStatusDict[ jobID ] ) for jobID in jobsInfo ] )
+    sqlUpdate = 'UPDATE `%s` SET BdJobStatus = CASE %s %s END, BdJobLastUpdate = "%s" WHERE %s IN ( %s )' % \
+                ( tableName, idName, cases, update, idName, jobIDs )
+    result = self._update( sqlUpdate )
+    if not result[ 'OK' ]:
+      return result
 
-  def setIntoJobDBStatus( self, jobID, status, JobGroup, Site, jobBDSoftwareName ):
-    jobReport = RPCClient( 'WorkloadManagement/JobStateUpdate' )
+    fields = [ 'His_BdJobID', 'His_JobName', 'His_JobStatus', 'His_Update', 'His_NameNode',
+              'His_SiteName', 'His_BdSoftName', 'His_BdSoftVersion', 'His_BdSoftHighLevelLang',
+              'His_BdSoftHighLevelLangVersion']
+    rows = []
+    jobDBList = []
+    for jobID, info in jobsInfo.items():
+      status = jobStatusDict[ jobID ]
+      values = [ str( jobID ), info[0], status, update, info[1],
+                 info[2], info[3], info[4], info[5], info[6] ]
+      result = self._escapeValues( values )
+      if not result[ 'OK' ]:
+        return result
+      rows.append( '( %s )' % ', '.join( result[ 'Value' ] ) )
+      jobDBList.append( ( jobID, status, info[2], info[7].strip() ) )
+
+    sqlInsert = 'INSERT INTO `BD_History` ( %s ) VALUES %s' % ( ', '.join( fields ), ', '.join( rows ) )
+    job_his = self._update( sqlInsert )
+    if not job_his[ 'OK' ]:
+      return S_ERROR( 'Failed to insert Big Data Jobs in history table' )
+
+    result = self.setIntoJobDBStatusBulk( jobDBList )
+    if not result[ 'OK' ]:
+      self.log.error( 'Big Data Jobs status not reported to the JobDB:', result[ 'Message' ] )
+
+    return S_OK( len( jobsInfo ) )
+
+  def __getJobDBTransition( self, status, jobBDSoftwareName ):
+    """
+    Return the ( Status, MinorStatus, ApplicationStatus ) to report to the JobDB
+    for a BigData job status, None if nothing has to be reported
+    """
     if status == "Running":
-      self.log.verbose( 'setJobStatus(%s,%s,%s,%s)' % ( jobID,
-                                                        status,
-                                                        "Running with JobID: " + jobBDSoftwareName,
-                                                        'BigDataMonitoring@%s' % Site ) )
-      jobStatus = jobReport.setJobStatus( int( jobID ),
-                                          status,
-                                          "MapReducing Step, running with JobID: " + jobBDSoftwareName,
-                                          'BigDataMonitoring@%s' % Site )
-      if not jobStatus['OK']:
-        self.log.warn( jobStatus['Message'] )
-      jobSite = jobReport.setJobSite( int( jobID ), Site )
-      self.log.verbose( 'setJobSite(%s,%s)' % ( jobID, Site ) )
-      if not jobSite['OK']:
-        self.log.warn( jobSite['Message'] )
-      jobDB.setJobAttribute( jobID, "ApplicationStatus", "Running MapReduce" )
+      return ( status, "MapReducing Step, running with JobID: " + jobBDSoftwareName, "Running MapReduce" )
     if status == "Submitted":
       if ( jobBDSoftwareName != "" ):
-        jobStatus = jobReport.setJobStatus( int( jobID ),
-                                            status,
-                                            "Job in Queue with JobId:" + jobBDSoftwareName,
-                                            'BigDataMonitoring@%s' % Site )
-        self.log.verbose( 'setJobStatus(%s,%s,%s,%s)' % ( jobID,
-                                                          status,
-                                                          "Job in Queue with JobId:" + jobBDSoftwareName,
-                                                          'BigDataMonitoring@%s' % Site ) )
-        if not jobStatus['OK']:
-          self.log.warn( jobStatus['Message'] )
-        jobSite = jobReport.setJobSite( int( jobID ), Site )
-        self.log.verbose( 'setJobSite(%s,%s)' % ( jobID, Site ) )
-        if not jobSite['OK']:
-          self.log.warn( jobSite['Message'] )
-        jobDB.setJobAttribute( jobID, "ApplicationStatus", "Job in Queue" )
-      else:
-        jobStatus = jobReport.setJobStatus( int( jobID ),
-                                            status = 'Rescheduled',
-                                            application = "Unknown Status",
-                                            sendFlag = True )
-        self.log.verbose( 'setJobStatus(%s,%s,%s,%s)' % ( jobID,
-                                                          'Rescheduled',
-                                                          "Unknown Status",
-                                                          'BigDataMonitoring@%s' % Site ) )
-        if not jobStatus['OK']:
-          self.log.warn( jobStatus['Message'] )
-        jobSite = jobReport.setJobSite( int( jobID ), Site )
-        self.log.verbose( 'setJobSite(%s,%s)' % ( jobID, Site ) )
-        if not jobSite['OK']:
-          self.log.warn( jobSite['Message'] )
+        return ( status, "Job in Queue with JobId:" + jobBDSoftwareName, "Job in Queue" )
+      return ( 'Rescheduled', "Unknown Status", None )
     if status == "Done":
-      self.log.verbose( 'setJobStatus(%s,%s,%s,%s)' % ( jobID,
-                                                        status,
-                                                        "MapReducing Process Finished",
-                                                        'BigDataMonitoring@%s' % Site ) )
-      jobStatus = jobReport.setJobStatus( int( jobID ),
-                                          status,
-                                          "MapReducing Process Finished",
-                                          'BigDataMonitoring@%s' % Site )
-      if not jobStatus['OK']:
-        self.log.warn( jobStatus['Message'] )
-      jobSite = jobReport.setJobSite( int( jobID ), Site )
-      self.log.verbose( 'setJobSite(%s,%s)' % ( jobID, Site ) )
-      if not jobSite['OK']:
-        self.log.warn( jobSite['Message'] )
-      jobDB.setJobAttribute( jobID, "ApplicationStatus", "MapReduce Complete" )
+      return ( status, "MapReducing Process Finished", "MapReduce Complete" )
+    return None
+
+  def setIntoJobDBStatus( self, jobID, status, JobGroup, Site, jobBDSoftwareName ):
+    return self.setIntoJobDBStatusBulk( [ ( jobID, status, Site, jobBDSoftwareName ) ] )
+
+  def setIntoJobDBStatusBulk( self, jobsList ):
+    """
+    Report a list of ( jobID, status, Site, jobBDSoftwareName ) to the JobDB.
+    The jobs are grouped by Status, MinorStatus, Site and ApplicationStatus, each
+    group is set with a single JobDB update and every change is logged in the
+    JobLoggingDB as JobStateUpdate does.
+    """
+    groups = {}
+    for jobID, status, Site, jobBDSoftwareName in jobsList:
+      transition = self.__getJobDBTransition( status, jobBDSoftwareName )
+      if not transition:
+        continue
+      majorStatus, minorStatus, applicationStatus = transition
+      groups.setdefault( ( majorStatus, minorStatus, Site, applicationStatus ), [] ).append( int( jobID ) )
+
+    failed = []
+    for ( majorStatus, minorStatus, Site, applicationStatus ), jobIDs in groups.items():
+      attrNames = [ 'Status', 'MinorStatus', 'Site' ]
+      attrValues = [ majorStatus, minorStatus, Site ]
+      if applicationStatus:
+        attrNames.append( 'ApplicationStatus' )
+        attrValues.append( applicationStatus )
+      self.log.verbose( 'setJobAttributes(%s,%s,%s)' % ( jobIDs, attrNames, attrValues ) )
+      result = jobDB.setJobAttributes( jobIDs, attrNames, attrValues, update = True )
+      if not result['OK']:
+        self.log.warn( result['Message'] )
+        failed.extend( jobIDs )
+        continue
+      source = 'BigDataMonitoring@%s' % Site
+      for jobID in jobIDs:
+        result = jobLoggingDB.addLoggingRecord( jobID, majorStatus, minorStatus, source = source )
+        if not result['OK']:
+          self.log.warn( result['Message'] )
+
+    if failed:
+      return S_ERROR( 'Failed to report the status of jobs %s to the JobDB' % failed )
     return S_OK( 'OK' )
 
   def insertBigDataJob( self, JobID, JobName, LastUpdate, NameNode,
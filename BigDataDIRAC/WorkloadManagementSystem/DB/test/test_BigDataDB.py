@@ -1,21 +1,154 @@
 #!/usr/bin/env python
 #
+# Tests of BigDataDB, they need a BigDataDB to write to. The jobs are inserted
+# in NameNodes of their own and removed at the end of every test.
+#
 from DIRAC.Core.Base import Script
 Script.parseCommandLine( ignoreErrors = False )
 
+import unittest
+
+from DIRAC                import S_OK
+from DIRAC.Core.Utilities import Time
+import BigDataDIRAC.WorkloadManagementSystem.DB.BigDataDB as BigDataDBModule
 from BigDataDIRAC.WorkloadManagementSystem.DB.BigDataDB               import BigDataDB
 
-import DIRAC
+# JobID, JobName, NameNode, status
+JOBS = [ ( 1, 'Montecarlo', 'TestNameNode1', 'Submitted' ),
+         ( 2, 'Montecarlo2', 'TestNameNode1', 'Submitted' ),
+         ( 3, 'Montecarlo3', 'TestNameNode1', 'Running' ),
+         ( 4, 'Montecarlo4', 'TestNameNode2', 'Running' ),
+         ( 5, 'Montecarlo5', 'TestNameNode2', 'Done' ),
+         ( 6, 'Montecarlo6', 'TestNameNode2', 'Stalled' ),
+         ( 7, 'Montecarlo7', 'TestNameNode3', 'Submitted' ),
+         ( 8, 'Montecarlo8', 'TestNameNode3', 'Done' ) ]
+
+class FakeJobDB:
+  """ Keeps the attributes set in the JobDB and the number of updates
+  """
+
+  def __init__( self ):
+    self.attributes = {}
+    self.updates = 0
+
+  def setJobAttributes( self, jobIDs, attrNames, attrValues, update = False ):
+    self.updates += 1
+    for jobID in jobIDs:
+      self.attributes.setdefault( jobID, {} ).update( dict( zip( attrNames, attrValues ) ) )
+    return S_OK()
+
+class FakeJobLoggingDB:
+
+  def __init__( self ):
+    self.records = []
+
+  def addLoggingRecord( self, jobID, status = 'idem', minor = 'idem', application = 'idem', source = 'Unknown' ):
+    self.records.append( ( jobID, status, minor ) )
+    return S_OK()
+
+class BigDataDBTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.jobDB = BigDataDBModule.jobDB
+    self.jobLoggingDB = BigDataDBModule.jobLoggingDB
+    BigDataDBModule.jobDB = FakeJobDB()
+    BigDataDBModule.jobLoggingDB = FakeJobLoggingDB()
+    self.db = BigDataDB()
+    self.jobIDs = [ job[0] for job in JOBS ]
+    self.__cleanJobs()
+    for jobID, jobName, nameNode, status in JOBS:
+      result = self.db.insertBigDataJob( jobID, jobName, Time.toString(), nameNode, 'Cesga', '', '', '', '',
+                                         'hadoop', 'hdv1', 'none', '1', status )
+      self.assertTrue( result['OK'] )
+
+  def tearDown( self ):
+    self.__cleanJobs()
+    BigDataDBModule.jobDB = self.jobDB
+    BigDataDBModule.jobLoggingDB = self.jobLoggingDB
+
+  def __cleanJobs( self ):
+    self.assertTrue( self.db.deleteBigDataJobs( self.jobIDs )['OK'] )
+    self.assertTrue( self.db._update( 'DELETE FROM `BD_History` WHERE His_BdJobID IN ( %s )' %
+                                      ', '.join( [ '"%s"' % jobID for jobID in self.jobIDs ] ) )['OK'] )
+
+  def __getTestCounts( self, statusList ):
+    result = self.db.getBigDataJobsCountByEndpoint( statusList )
+    self.assertTrue( result['OK'] )
+    return dict( [ ( nameNode, counts ) for nameNode, counts in result['Value'].items()
+                   if nameNode.startswith( 'TestNameNode' ) ] )
+
+  def test_countByEndpoint( self ):
+    self.assertEqual( self.__getTestCounts( [ 'Submitted', 'Running' ] ),
+                      { 'TestNameNode1': { 'Submitted': 2, 'Running': 1 },
+                        'TestNameNode2': { 'Running': 1 },
+                        'TestNameNode3': { 'Submitted': 1 } } )
+
+  def test_countByEndpointOneStatus( self ):
+    self.assertEqual( self.__getTestCounts( [ 'Done' ] ),
+                      { 'TestNameNode2': { 'Done': 1 },
+                        'TestNameNode3': { 'Done': 1 } } )
+
+  def test_countByEndpointUnknownStatus( self ):
+    self.assertFalse( self.db.getBigDataJobsCountByEndpoint( [ 'Running', 'Mapping' ] )['OK'] )
+
+  def __getStatus( self, jobID ):
+    result = self.db._query( 'SELECT BdJobStatus FROM `BD_Jobs` WHERE BdJobID = %s' % jobID )
+    self.assertTrue( result['OK'] )
+    return result['Value'][0][0]
+
+  def __getHistory( self, jobID ):
+    result = self.db._query( 'SELECT His_JobStatus FROM `BD_History` WHERE His_BdJobID = "%s" ORDER BY His_ID' % jobID )
+    self.assertTrue( result['OK'] )
+    return [ row[0] for row in result['Value'] ]
+
+  def test_setJobsStatus( self ):
+    self.assertTrue( self.db.setHadoopIDs( { 1: 'job_1', 2: 'job_2', 4: 'job_4' } )['OK'] )
+    # The last transition of job 1 wins
+    result = self.db.setJobsStatus( [ ( 1, 'Done' ), ( 2, 'Running' ), ( 4, 'Done' ), ( 5, 'Done' ), ( 1, 'Running' ) ] )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( result['Value'], 4 )
+
+    self.assertEqual( [ self.__getStatus( jobID ) for jobID in [ 1, 2, 3, 4, 5 ] ],
+                      [ 'Running', 'Running', 'Running', 'Done', 'Done' ] )
+    self.assertEqual( self.__getHistory( 1 ), [ 'Submitted', 'Running' ] )
+    self.assertEqual( self.__getHistory( 3 ), [ 'Running' ] )
+    self.assertEqual( self.__getHistory( 4 ), [ 'Running', 'Done' ] )
+
+    jobDB = BigDataDBModule.jobDB
+    self.assertEqual( jobDB.attributes[1], { 'Status': 'Running', 'Site': 'Cesga',
+                                             'MinorStatus': 'MapReducing Step, running with JobID: job_1',
+                                             'ApplicationStatus': 'Running MapReduce' } )
+    self.assertEqual( jobDB.attributes[2]['MinorStatus'], 'MapReducing Step, running with JobID: job_2' )
+    for jobID in [ 4, 5 ]:
+      self.assertEqual( jobDB.attributes[jobID], { 'Status': 'Done', 'Site': 'Cesga',
+                                                   'MinorStatus': 'MapReducing Process Finished',
+                                                   'ApplicationStatus': 'MapReduce Complete' } )
+    # Jobs 4 and 5 share the same JobDB transition and are set at once
+    self.assertEqual( jobDB.updates, 3 )
+    self.assertEqual( sorted( BigDataDBModule.jobLoggingDB.records ),
+                      [ ( 1, 'Running', 'MapReducing Step, running with JobID: job_1' ),
+                        ( 2, 'Running', 'MapReducing Step, running with JobID: job_2' ),
+                        ( 4, 'Done', 'MapReducing Process Finished' ),
+                        ( 5, 'Done', 'MapReducing Process Finished' ) ] )
+
+  def test_setJobsStatusRescheduled( self ):
+    # A job back to Submitted without Hadoop ID is rescheduled in the JobDB
+    self.assertTrue( self.db.setJobsStatus( [ ( 3, 'Submitted' ) ] )['OK'] )
+    self.assertEqual( self.__getStatus( 3 ), 'Submitted' )
+    self.assertEqual( BigDataDBModule.jobDB.attributes[3], { 'Status': 'Rescheduled', 'Site': 'Cesga',
+                                                             'MinorStatus': 'Unknown Status' } )
 
-db = BigDataDB()
-validStates = db.validJobStates
+  def test_setJobsStatusUnknownStatus( self ):
+    self.assertFalse( self.db.setJobsStatus( [ ( 1, 'Running' ), ( 2, 'Mapping' ) ] )['OK'] )
+    self.assertEqual( self.__getStatus( 1 ), 'Submitted' )
+    self.assertEqual( BigDataDBModule.jobDB.updates, 0 )
 
-ret = db.insertBigDataJob( 1, 'Montecarlo', 'CesgaHadoop', 'Cesga' , 'Mapping', 0, '', '', 'Hadoop', '', '' )
-ret = db.insertBigDataJob( 2, 'Montecarlo2', 'CesgaHadoop', 'Cesga' , 'Mapping', 0, '', '', 'Hadoop', '', '' )
-ret = db.insertBigDataJob( 3, 'Montecarlo3', 'CesgaHadoop', 'Cesga' , 'Reduction', 0, '', '', 'Hadoop', '', '' )
-ret = db.insertBigDataJob( 4, 'Montecarlo4', 'CesgaHadoop', 'Cesga' , 'Submitted', 0, '', '', 'Hadoop', '', '' )
-ret = db.insertBigDataJob( 5, 'Montecarlo5', 'CesgaHadoop', 'Cesga' , 'Done', 0, '', '', 'Hadoop', '', '' )
-ret = db.insertBigDataJob( 6, 'Montecarlo6', 'CesgaHadoop', 'Cesga' , 'Stalled', 0, '', '', 'Hadoop', '', '' )
-ret = db.insertBigDataJob( 7, 'Montecarlo7', 'CesgaHadoop', 'Cesga' , 'Mapping', 0, '', '', 'Hadoop', '', '' )
-ret = db.insertBigDataJob( 8, 'Montecarlo8', 'CesgaHadoop', 'Cesga' , 'Mapping', 0, '', '', 'Hadoop', '', '' )
+  def test_setJobsStatusUnknownJob( self ):
+    result = self.db.setJobsStatus( [ ( 1000, 'Running' ) ] )
+    self.assertTrue( result['OK'] )
+    self.assertEqual( result['Value'], 0 )
+    self.assertEqual( BigDataDBModule.jobDB.updates, 0 )
 
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( BigDataDBTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
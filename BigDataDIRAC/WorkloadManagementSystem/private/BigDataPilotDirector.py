@@ -24,6 +24,9 @@ from DIRAC.Core.Security import CS
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient      import gProxyManager
 from DIRAC import S_OK, S_ERROR, DictCache, gConfig, rootPath
 
+from BigDataDIRAC.WorkloadManagementSystem.private.PayloadCache import gPayloadCache
+from BigDataDIRAC.WorkloadManagementSystem.private.ProxyCache   import gProxyCache
+
 ERROR_CE = 'No CE available'
 ERROR_JDL = 'Could not create Pilot script'
 ERROR_SCRIPT = 'Could not copy Pilot script'
@@ -34,6 +37,47 @@ WAITING_TO_RUNNING_RATIO = 0.5
 MAX_WAITING_JOBS = 50
 MAX_NUMBER_JOBS = 10000
 
+PILOT_WRAPPER_TEMPLATE = """#!/bin/bash
+/usr/bin/env python << EOF
+#
+import os, tempfile, sys, shutil, base64, bz2
+try:
+  pilotExecDir = '%(pilotExecDir)s'
+  if not pilotExecDir:
+    pilotExecDir = None
+  pilotWorkingDirectory = tempfile.mkdtemp( suffix = 'pilot', prefix = 'DIRAC_', dir = pilotExecDir )
+  os.chdir( pilotWorkingDirectory )
+  open( 'proxy', "w" ).write(bz2.decompress( base64.decodestring( "%(compressedAndEncodedProxy)s" ) ) )
+  open( '%(pilotScript)s', "w" ).write(bz2.decompress( base64.decodestring( "%(compressedAndEncodedPilot)s" ) ) )
+  open( '%(installScript)s', "w" ).write(bz2.decompress( base64.decodestring( "%(compressedAndEncodedInstall)s" ) ) )
+  os.chmod("proxy",0600)
+  os.chmod("%(pilotScript)s",0700)
+  os.chmod("%(installScript)s",0700)
+  if "LD_LIBRARY_PATH" not in os.environ:
+    os.environ["LD_LIBRARY_PATH"]=""
+  os.environ["X509_USER_PROXY"]=os.path.join(pilotWorkingDirectory, 'proxy')
+  if "%(httpProxy)s":
+    os.environ["HTTP_PROXY"]="%(httpProxy)s"
+  os.environ["X509_CERT_DIR"]=os.path.join(pilotWorkingDirectory, 'etc/grid-security/certificates')
+  # TODO: structure the output
+  print '==========================================================='
+  print 'Environment of execution host'
+  for key in os.environ.keys():
+    print key + '=' + os.environ[key]
+  print '==========================================================='
+except Exception, x:
+  print >> sys.stderr, x
+  sys.exit(-1)
+cmd = "python %(pilotScript)s %(pilotOptions)s"
+print 'Executing: ', cmd
+sys.stdout.flush()
+os.system( cmd )
+
+shutil.rmtree( pilotWorkingDirectory )
+
+EOF
+"""
+
 class BigDataPilotDirector( PilotDirector ):
   """
     DIRAC PilotDirector class
@@ -279,60 +323,20 @@ class BigDataPilotDirector( PilotDirector ):
      It assumes that the pilot script will have access to the submit working directory
     """
     try:
-      compressedAndEncodedProxy = base64.encodestring( bz2.compress( proxy.dumpAllToString()['Value'] ) ).replace( '\n', '' )
-      compressedAndEncodedPilot = base64.encodestring( bz2.compress( open( self.pilot, "rb" ).read(), 9 ) ).replace( '\n', '' )
-      compressedAndEncodedInstall = base64.encodestring( bz2.compress( open( self.install, "rb" ).read(), 9 ) ).replace( '\n', '' )
+      compressedAndEncodedProxy = gProxyCache.encodeProxy( proxy )
+      pilotTemplate = gPayloadCache.getTemplate( PILOT_WRAPPER_TEMPLATE,
+                                                 { 'compressedAndEncodedPilot': self.pilot,
+                                                   'compressedAndEncodedInstall': self.install } )
     except:
       self.log.exception( 'Exception during file compression of proxy, dirac-pilot or dirac-install' )
       return S_ERROR( 'Exception during file compression of proxy, dirac-pilot or dirac-install' )
 
-    localPilot = """#!/bin/bash
-/usr/bin/env python << EOF
-#
-import os, tempfile, sys, shutil, base64, bz2
-try:
-  pilotExecDir = '%(pilotExecDir)s'
-  if not pilotExecDir:
-    pilotExecDir = None
-  pilotWorkingDirectory = tempfile.mkdtemp( suffix = 'pilot', prefix = 'DIRAC_', dir = pilotExecDir )
-  os.chdir( pilotWorkingDirectory )
-  open( 'proxy', "w" ).write(bz2.decompress( base64.decodestring( "%(compressedAndEncodedProxy)s" ) ) )
-  open( '%(pilotScript)s', "w" ).write(bz2.decompress( base64.decodestring( "%(compressedAndEncodedPilot)s" ) ) )
-  open( '%(installScript)s', "w" ).write(bz2.decompress( base64.decodestring( "%(compressedAndEncodedInstall)s" ) ) )
-  os.chmod("proxy",0600)
-  os.chmod("%(pilotScript)s",0700)
-  os.chmod("%(installScript)s",0700)
-  if "LD_LIBRARY_PATH" not in os.environ:
-    os.environ["LD_LIBRARY_PATH"]=""
-  os.environ["X509_USER_PROXY"]=os.path.join(pilotWorkingDirectory, 'proxy')
-  if "%(httpProxy)s":
-    os.environ["HTTP_PROXY"]="%(httpProxy)s"
-  os.environ["X509_CERT_DIR"]=os.path.join(pilotWorkingDirectory, 'etc/grid-security/certificates')
-  # TODO: structure the output
-  print '==========================================================='
-  print 'Environment of execution host'
-  for key in os.environ.keys():
-    print key + '=' + os.environ[key]
-  print '==========================================================='
-except Exception, x:
-  print >> sys.stderr, x
-  sys.exit(-1)
-cmd = "python %(pilotScript)s %(pilotOptions)s"
-print 'Executing: ', cmd
-sys.stdout.flush()
-os.system( cmd )
-
-shutil.rmtree( pilotWorkingDirectory )
-
-EOF
-""" % { 'compressedAndEncodedProxy': compressedAndEncodedProxy,
-        'compressedAndEncodedPilot': compressedAndEncodedPilot,
-        'compressedAndEncodedInstall': compressedAndEncodedInstall,
-        'httpProxy': httpProxy,
-        'pilotScript': os.path.basename( self.pilot ),
-        'installScript': os.path.basename( self.install ),
-        'pilotOptions': ' '.join( pilotOptions ),
-        'pilotExecDir': pilotExecDir }
+    localPilot = pilotTemplate % { 'compressedAndEncodedProxy': compressedAndEncodedProxy,
+                                   'httpProxy': httpProxy,
+                                   'pilotScript': os.path.basename( self.pilot ),
+                                   'installScript': os.path.basename( self.install ),
+                                   'pilotOptions': ' '.join( pilotOptions ),
+                                   'pilotExecDir': pilotExecDir }
 
     fd, name = tempfile.mkstemp( suffix = '_pilotwrapper.py', prefix = 'DIRAC_', dir = workingDirectory )
     pilotWrapper = os.fdopen( fd, 'w' )
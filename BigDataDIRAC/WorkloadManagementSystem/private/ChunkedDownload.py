@@ -0,0 +1,94 @@
+########################################################################
+# $HeadURL$
+# File :   ChunkedDownload.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Download of large files from an http(s) transport URL with several parallel
+  range requests, each one writing its own part of the local file.
+"""
+
+import httplib
+import os
+import threading
+import urlparse
+
+from DIRAC                                                    import S_OK, S_ERROR, gLogger
+
+__RCSID__ = '$Id: $'
+
+BLOCK_SIZE = 1024 * 1024
+
+def _downloadRange( url, localFile, start, end, timeout, proxyFile, errors ):
+  """ Write the bytes start to end, both included, of the url in localFile
+  """
+  parsedURL = urlparse.urlparse( url )
+  try:
+    if parsedURL.scheme == 'https':
+      connection = httplib.HTTPSConnection( parsedURL.hostname, parsedURL.port, key_file = proxyFile,
+                                            cert_file = proxyFile, timeout = timeout )
+    else:
+      connection = httplib.HTTPConnection( parsedURL.hostname, parsedURL.port, timeout = timeout )
+    path = parsedURL.path
+    if parsedURL.query:
+      path = '%s?%s' % ( path, parsedURL.query )
+    connection.request( 'GET', path, headers = { 'Range': 'bytes=%s-%s' % ( start, end ) } )
+    response = connection.getresponse()
+    if response.status != 206:
+      errors.append( 'Range request not honoured, HTTP status %s' % response.status )
+      connection.close()
+      return
+    outputFile = open( localFile, 'r+b' )
+    try:
+      outputFile.seek( start )
+      remaining = end - start + 1
+      while remaining > 0:
+        block = response.read( min( BLOCK_SIZE, remaining ) )
+        if not block:
+          errors.append( 'Connection closed with %s bytes left at %s' % ( remaining, start ) )
+          break
+        outputFile.write( block )
+        remaining -= len( block )
+    finally:
+      outputFile.close()
+      connection.close()
+  except Exception, x:
+    errors.append( str( x ) )
+
+def downloadInChunks( url, localFile, size, streams = 4, timeout = 3600, proxyFile = None ):
+  """ Download the size bytes of the http(s) url to localFile with streams
+      parallel range requests. The local file is removed on failure.
+  """
+  log = gLogger.getSubLogger( "ChunkedDownload" )
+  if urlparse.urlparse( url ).scheme not in ( 'http', 'https' ):
+    return S_ERROR( 'Ranged download not supported for %s' % url )
+  if size <= 0:
+    return S_ERROR( 'Ranged download needs the size of %s' % url )
+  streams = max( 1, min( streams, size / BLOCK_SIZE or 1 ) )
+
+  outputFile = open( localFile, 'wb' )
+  outputFile.truncate( size )
+  outputFile.close()
+
+  chunkSize = ( size + streams - 1 ) / streams
+  errors = []
+  threads = []
+  for start in range( 0, size, chunkSize ):
+    end = min( start + chunkSize, size ) - 1
+    thread = threading.Thread( target = _downloadRange,
+                               args = ( url, localFile, start, end, timeout, proxyFile, errors ) )
+    thread.setDaemon( True )
+    thread.start()
+    threads.append( thread )
+  for thread in threads:
+    thread.join()
+
+  if not errors and os.path.getsize( localFile ) != size:
+    errors.append( 'Size mismatch, %s bytes instead of %s' % ( os.path.getsize( localFile ), size ) )
+  if errors:
+    os.unlink( localFile )
+    log.error( 'Ranged download of %s failed:' % url, errors[0] )
+    return S_ERROR( errors[0] )
+  log.verbose( 'Downloaded %s with %s streams' % ( url, len( threads ) ) )
+  return S_OK( size )
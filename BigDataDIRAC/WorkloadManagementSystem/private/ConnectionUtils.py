@@ -1,7 +1,29 @@
 # $HeadURL$
+"""
+  ssh/scp helpers used by the BigData clients to talk to the endpoint masters.
+
+  Unless disabled, every command reuses an OpenSSH ControlMaster connection
+  per ( user, host, port ), so only the first call to an endpoint pays the
+  TCP and key exchange handshake. The following options are read from
+  /LocalSite/BigDataSSH:
+    Multiplexing: use the shared master connections ( default True )
+    ControlPersist: seconds an idle master connection is kept open ( default 600 )
+    MaxSessions: concurrent sessions multiplexed over one master ( default 8 )
+    SessionWaitTime: seconds to wait for a free session before falling back
+                     to a dedicated connection ( default 30 )
+    ControlDirectory: directory holding the control sockets
+    TransferMode: 'tar' streams a compressed tar through one ssh channel to copy
+                  directory trees, 'scp' uses scp -r ( default tar )
+    TransferCompressor: gzip, bzip2, xz or none ( default gzip )
+  The tar transfers need passwordless login, scp is used when they fail.
+"""
 
 import os
+import re
 import time
+import pipes
+import tempfile
+import threading
 
 from DIRAC                                            import gConfig, S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities                             import List
@@ -9,6 +31,71 @@ from DIRAC.Core.Utilities.Subprocess                     import shellCall
 
 __RCSID__ = '$Id: $'
 
+SSH_CS_PATH = '/LocalSite/BigDataSSH'
+
+#tar flag of each compressor
+TAR_COMPRESSORS = { 'gzip': 'z', 'bzip2': 'j', 'xz': 'J', 'none': '' }
+
+class SSHSessionPool:
+  """ Book keeping of the sessions opened over the shared master connections,
+      it caps the number of concurrent sessions per endpoint
+  """
+
+  def __init__( self ):
+    self.__sessions = {}
+    self.__condition = threading.Condition( threading.Lock() )
+    self.__controlDirectory = ''
+
+  def getControlPath( self ):
+    """ Path template of the control sockets, the directory is created on first use
+    """
+    if not self.__controlDirectory:
+      controlDirectory = gConfig.getValue( '%s/ControlDirectory' % SSH_CS_PATH,
+                                           os.path.join( tempfile.gettempdir(), 'BigDataSSH-%s' % os.getuid() ) )
+      if not os.path.isdir( controlDirectory ):
+        try:
+          os.makedirs( controlDirectory, 0700 )
+        except OSError:
+          # Another thread may have created it in the meantime
+          if not os.path.isdir( controlDirectory ):
+            raise
+      self.__controlDirectory = controlDirectory
+    return os.path.join( self.__controlDirectory, '%r@%h:%p' )
+
+  def acquire( self, endPoint, maxSessions, waitTime ):
+    """ Reserve a session on the endPoint master connection, return False if
+        none got free within waitTime seconds
+    """
+    deadline = time.time() + waitTime
+    self.__condition.acquire()
+    try:
+      while self.__sessions.get( endPoint, 0 ) >= maxSessions:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+          return False
+        self.__condition.wait( remaining )
+      self.__sessions[endPoint] = self.__sessions.get( endPoint, 0 ) + 1
+      return True
+    finally:
+      self.__condition.release()
+
+  def release( self, endPoint ):
+    self.__condition.acquire()
+    try:
+      self.__sessions[endPoint] -= 1
+      self.__condition.notify()
+    finally:
+      self.__condition.release()
+
+  def forget( self, endPoint ):
+    self.__condition.acquire()
+    try:
+      if not self.__sessions.get( endPoint, 0 ):
+        self.__sessions.pop( endPoint, None )
+    finally:
+      self.__condition.release()
+
+gSSHSessionPool = SSHSessionPool()
 
 class ConnectionUtils:
 
@@ -19,6 +106,88 @@ class ConnectionUtils:
     self.password = password
     self.port = port
 
+    self.multiplexing = gConfig.getValue( '%s/Multiplexing' % SSH_CS_PATH, True )
+    self.controlPersist = gConfig.getValue( '%s/ControlPersist' % SSH_CS_PATH, 600 )
+    self.maxSessions = gConfig.getValue( '%s/MaxSessions' % SSH_CS_PATH, 8 )
+    self.sessionWaitTime = gConfig.getValue( '%s/SessionWaitTime' % SSH_CS_PATH, 30 )
+    self.transferMode = gConfig.getValue( '%s/TransferMode' % SSH_CS_PATH, 'tar' )
+    self.transferCompressor = gConfig.getValue( '%s/TransferCompressor' % SSH_CS_PATH, 'gzip' )
+
+  def __getEndPoint( self, port = None ):
+    """ Key of the master connection of the commands run on the given port
+    """
+    if not port:
+      port = 22
+    return ( self.user, self.host, int( port ) )
+
+  def __getSSHOptions( self, shared ):
+    """ Options to add to ssh/scp to use the endpoint master connection
+    """
+    if not shared:
+      return '-o ControlPath=none'
+    return '-o ControlMaster=auto -o ControlPath=%s -o ControlPersist=%s' % ( gSSHSessionPool.getControlPath(),
+                                                                                self.controlPersist )
+
+  def __addSSHOptions( self, command, shared ):
+    for program in [ 'ssh', 'scp' ]:
+      if command.startswith( '%s ' % program ):
+        return '%s %s %s' % ( program, self.__getSSHOptions( shared ), command[len( program ) + 1:] )
+    return command
+
+  def __acquireSession( self, endPoint ):
+    """ True if a session over the shared master connection is available
+    """
+    if not self.multiplexing:
+      return False
+    shared = gSSHSessionPool.acquire( endPoint, self.maxSessions, self.sessionWaitTime )
+    if not shared:
+      self.log.verbose( 'No free session to %s@%s, opening a dedicated connection' % ( self.user, self.host ) )
+    return shared
+
+  def __pooled_call( self, command, timeout, port = None ):
+    """ Run the ssh/scp command over the shared master connection when a
+        session is available, otherwise over a dedicated connection. port is
+        the one the command connects to
+    """
+    endPoint = self.__getEndPoint( port )
+    shared = self.__acquireSession( endPoint )
+    try:
+      return self.__ssh_call( self.__addSSHOptions( command, shared ), timeout )
+    finally:
+      if shared:
+        gSSHSessionPool.release( endPoint )
+
+  def __pooled_shell_call( self, buildCommand, timeout, port = None ):
+    """ Same as __pooled_call for shell pipelines, buildCommand gets the ssh
+        options and returns the command line. There is no password prompt to
+        answer and the pipeline fails if any of its commands fails.
+    """
+    endPoint = self.__getEndPoint( port )
+    shared = self.__acquireSession( endPoint )
+    try:
+      command = buildCommand( '-o BatchMode=yes %s' % self.__getSSHOptions( shared ) )
+      gLogger.info( 'Command Submitted: ', command )
+      result = shellCall( timeout, 'bash -o pipefail -c %s' % pipes.quote( command ) )
+    finally:
+      if shared:
+        gSSHSessionPool.release( endPoint )
+    if not result['OK']:
+      return result
+    status, _stdout, stderr = result['Value']
+    if status:
+      return S_ERROR( 'Command failed with status %s: %s' % ( status, stderr ) )
+    return result
+
+  def closeSession( self ):
+    """ Drop the book keeping of the endpoint sessions once none is in use. The
+        master connection is not stopped, other connections to the same user,
+        host and port may share it, it exits after ControlPersist idle seconds
+    """
+    if self.multiplexing:
+      gSSHSessionPool.forget( self.__getEndPoint() )
+      gSSHSessionPool.forget( self.__getEndPoint( self.port ) )
+    return S_OK()
+
   def __ssh_call( self, command, timeout ):
     try:
       import pexpect
@@ -72,7 +241,7 @@ class ConnectionUtils:
 
     command = "ssh -l %s %s '%s'" % ( self.user, self.host, command )
     gLogger.info( 'Command Submitted: ', command )
-    return self.__ssh_call( command, timeout )
+    return self.__pooled_call( command, timeout )
 
   def sshCallByPort( self, timeout, cmdSeq ):
     """ Execute remote command via a ssh remote call
@@ -83,13 +252,14 @@ class ConnectionUtils:
 
     command = "ssh -p %s -l %s %s '%s'" % ( self.port, self.user, self.host, command )
     gLogger.info( 'Command Submitted: ', command )
-    return self.__ssh_call( command, timeout )
+    return self.__pooled_call( command, timeout, self.port )
 
 
   def sshOnlyCall( self, timeout, cmdSeq ):
     """ Execute remote command via a ssh remote call
     """
-    return self.__ssh_call( cmdSeq, timeout )
+    port = re.search( r'\s-p\s*(\d+)', cmdSeq )
+    return self.__pooled_call( cmdSeq, timeout, port and port.group( 1 ) )
 
   def scpCall( self, timeout, localFile, destinationPath, upload = True ):
     """ Execute scp copy
@@ -98,7 +268,7 @@ class ConnectionUtils:
       command = "scp -r %s %s@%s:%s" % ( localFile, self.user, self.host, destinationPath )
     else:
       command = "scp -r %s@%s:%s %s" % ( self.user, self.host, destinationPath, localFile )
-    return self.__ssh_call( command, timeout )
+    return self.__pooled_call( command, timeout )
 
 
   def scpCallByPort( self, timeout, localFile, destinationPath, upload = True ):
@@ -108,4 +278,76 @@ class ConnectionUtils:
       command = "scp -P %s -r %s %s@%s:%s" % ( self.port, localFile, self.user, self.host, destinationPath )
     else:
       command = "scp -P %s -r %s@%s:%s %s" % ( self.port, self.user, self.host, destinationPath, localFile )
-    return self.__ssh_call( command, timeout )
+    return self.__pooled_call( command, timeout, self.port )
+
+  def transferCall( self, timeout, localPath, remotePath, upload = True, byPort = False ):
+    """ Copy a directory tree to or from the endpoint according to TransferMode,
+        scp is used when tar streaming is disabled or fails
+    """
+    if self.transferMode == 'tar':
+      result = self.tarCall( timeout, localPath, remotePath, upload, byPort )
+      if result['OK']:
+        return result
+      self.log.warn( 'Tar transfer failed, using scp:', result['Message'] )
+    if not isinstance( localPath, basestring ):
+      localPath = ' '.join( localPath )
+    if byPort:
+      return self.scpCallByPort( timeout, localPath, remotePath, upload )
+    return self.scpCall( timeout, localPath, remotePath, upload )
+
+  def tarCall( self, timeout, localPath, remotePath, upload = True, byPort = False ):
+    """ Stream a compressed tar through a single ssh channel, like scp -r:
+          upload: localPath, or each path of a list, is copied into the remote
+                  directory remotePath
+          download: remotePath ( a path or a glob ) is copied into localPath if it is
+                    a directory, otherwise it is created as localPath
+    """
+    flag = TAR_COMPRESSORS.get( self.transferCompressor )
+    if flag is None:
+      return S_ERROR( 'Unknown TransferCompressor %s' % self.transferCompressor )
+
+    if upload:
+      localPaths = localPath
+      if isinstance( localPath, basestring ):
+        localPaths = [ localPath ]
+      members = []
+      for path in localPaths:
+        localDir, localName = os.path.split( path.rstrip( '/' ) )
+        members.append( '-C %s %s' % ( pipes.quote( os.path.abspath( localDir or '.' ) ), pipes.quote( localName ) ) )
+      return self.pipeCall( timeout,
+                            "tar c%sf - %s" % ( flag, ' '.join( members ) ),
+                            "mkdir -p %s && tar x%sf - -C %s" % ( pipes.quote( remotePath ), flag, pipes.quote( remotePath ) ),
+                            True, byPort )
+    else:
+      remoteDir, remoteName = os.path.split( remotePath.rstrip( '/' ) )
+      remoteDir = remoteDir or '.'
+      localDir = localPath
+      if not os.path.isdir( localPath ):
+        localDir, localName = os.path.split( localPath.rstrip( '/' ) )
+        localDir = localDir or '.'
+        if localName != remoteName:
+          return S_ERROR( 'Cannot rename %s to %s with a tar transfer' % ( remoteName, localName ) )
+      if not os.path.isdir( localDir ):
+        os.makedirs( localDir )
+      #The remote name is left unquoted, it can be a glob
+      return self.pipeCall( timeout,
+                            "tar x%sf - -C %s" % ( flag, pipes.quote( localDir ) ),
+                            "cd %s && tar c%sf - %s" % ( pipes.quote( remoteDir ), flag, remoteName ),
+                            False, byPort )
+
+  def pipeCall( self, timeout, localCommand, remoteCommand, upload = True, byPort = False ):
+    """ Connect a local and a remote command through one ssh channel, the output of
+        localCommand is the input of remoteCommand on upload and the other way round
+    """
+    sshTarget = '-l %s %s' % ( self.user, self.host )
+    port = None
+    if byPort and self.port:
+      port = self.port
+      sshTarget = '-p %s %s' % ( port, sshTarget )
+    if upload:
+      buildCommand = lambda sshOptions: "%s | ssh %s %s %s" % ( localCommand, sshOptions, sshTarget,
+                                                                pipes.quote( remoteCommand ) )
+    else:
+      buildCommand = lambda sshOptions: "ssh %s %s %s | %s" % ( sshOptions, sshTarget,
+                                                                pipes.quote( remoteCommand ), localCommand )
+    return self.__pooled_shell_call( buildCommand, timeout, port )
@@ -0,0 +1,346 @@
+########################################################################
+# $HeadURL$
+# File :   InteractiveJobWatcher.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Single watcher of the interactive ( Hive ) jobs running on the endpoints.
+
+  The jobs are launched detached on the master and registered here. One thread
+  loops over all of them: every PollingTime seconds the new bytes of the output
+  logs of each endpoint are read with one ssh call over the shared master
+  connection, the endpoints in parallel, starting at the offset reached in the
+  previous cycle, and the
+  progress lines are parsed to update the job state. The same call checks with
+  kill -0 whether the launched process is still there, a job whose process has
+  ended is given its final status once its log is read completely. Jobs whose
+  log does not grow for MaxIdleTime seconds are set to Error. The watched jobs and
+  their offsets are saved in StateFile, so a restart resumes where it stopped.
+  The following options are read from /LocalSite/BigDataInteractiveJobs:
+    PollingTime: seconds between two reads of the logs ( default 5 )
+    MaxReadSize: maximum bytes read per log and cycle, longer lines are skipped ( default 1048576 )
+    ReadTimeout: seconds allowed to read the logs of an endpoint ( default 30 )
+    MaxIdleTime: seconds without new output before giving up a job ( default 21600 )
+    StateFile: file keeping the watched jobs ( default /tmp/BigDataInteractiveJobs.json )
+"""
+
+import datetime
+import json
+import os
+import pipes
+import tempfile
+import threading
+import time
+
+from DIRAC                                                          import S_OK, S_ERROR, gConfig, gLogger
+from DIRAC.WorkloadManagementSystem.Client.ServerUtils              import jobDB
+from DIRAC.WorkloadManagementSystem.Client.SandboxStoreClient       import SandboxStoreClient
+from DIRAC.AccountingSystem.Client.Types.Job                        import Job as AccountingJob
+
+from BigDataDIRAC.WorkloadManagementSystem.private.ConnectionUtils  import ConnectionUtils
+from BigDataDIRAC.WorkloadManagementSystem.private.ProgressReader   import TOTAL_JOBS_PATTERN, STARTED_JOB_PATTERN, \
+                                                                           ENDED_JOB_PATTERN
+from BigDataDIRAC.WorkloadManagementSystem.Client.ServerUtils       import BigDataDB
+
+__RCSID__ = '$Id: $'
+
+WATCHER_CS_PATH = '/LocalSite/BigDataInteractiveJobs'
+
+#Separates the logs of the jobs in the output of the remote command
+LOG_MARKER = '@@BigDataInteractiveJob '
+
+class InteractiveJobWatcher( threading.Thread ):
+
+  def __init__( self ):
+    threading.Thread.__init__( self )
+    self.setDaemon( True )
+    self.log = gLogger.getSubLogger( "InteractiveJobWatcher" )
+    self.pollingTime = gConfig.getValue( '%s/PollingTime' % WATCHER_CS_PATH, 5 )
+    self.maxReadSize = gConfig.getValue( '%s/MaxReadSize' % WATCHER_CS_PATH, 1024 * 1024 )
+    self.readTimeout = gConfig.getValue( '%s/ReadTimeout' % WATCHER_CS_PATH, 30 )
+    self.maxIdleTime = gConfig.getValue( '%s/MaxIdleTime' % WATCHER_CS_PATH, 21600 )
+    self.stateFile = gConfig.getValue( '%s/StateFile' % WATCHER_CS_PATH, '/tmp/BigDataInteractiveJobs.json' )
+    self.sandboxClient = SandboxStoreClient()
+    self.sandboxSizeLimit = 1024 * 1024 * 10
+    self.__connections = {}
+    self.__jobs = {}
+    self.__started = False
+    self.__lock = threading.Lock()
+
+  def resume( self ):
+    """ Load the jobs watched before a restart and start watching them, only
+        the process submitting the interactive jobs has to call it
+    """
+    self.__lock.acquire()
+    try:
+      if self.__started:
+        return S_OK()
+      self.__loadState()
+      self.__started = True
+      self.start()
+    finally:
+      self.__lock.release()
+    return S_OK( len( self.__jobs ) )
+
+  def watch( self, jobID, user, publicIP, port, output, pid = None ):
+    """ Follow the output log of an interactive job launched on the endpoint
+        by the process pid
+    """
+    self.resume()
+    self.__lock.acquire()
+    try:
+      self.__jobs[str( jobID )] = { 'User': user,
+                                    'PublicIP': publicIP,
+                                    'Port': port,
+                                    'Output': output,
+                                    'PID': pid,
+                                    'Offset': 0,
+                                    'TotalJobs': 0,
+                                    'StartedJobs': [],
+                                    'EndedJobs': [],
+                                    'StartTime': time.time(),
+                                    'LastOutput': time.time() }
+      self.__saveState()
+    finally:
+      self.__lock.release()
+    self.log.info( 'Watching interactive job %s in %s' % ( jobID, publicIP ) )
+    return S_OK()
+
+  def run( self ):
+    while True:
+      try:
+        self.__cycle()
+      except Exception:
+        self.log.exception( 'Error watching the interactive jobs' )
+      time.sleep( self.pollingTime )
+
+  def __cycle( self ):
+    self.__lock.acquire()
+    try:
+      endPoints = {}
+      for jobID, job in self.__jobs.items():
+        endPoint = ( job['User'], job['PublicIP'], job['Port'] )
+        endPoints.setdefault( endPoint, [] ).append( ( jobID, job['Offset'], job['Output'], job.get( 'PID' ) ) )
+    finally:
+      self.__lock.release()
+
+    #One thread per endpoint, a slow one does not delay the others
+    results = {}
+    def readLogs( endPoint, jobs ):
+      results[endPoint] = self.__readLogs( endPoint, jobs )
+    threads = []
+    for endPoint, jobs in endPoints.items():
+      thread = threading.Thread( target = readLogs, args = ( endPoint, jobs ) )
+      thread.setDaemon( True )
+      thread.start()
+      threads.append( thread )
+    for thread in threads:
+      thread.join()
+
+    changed = False
+    for endPoint, result in results.items():
+      if not result['OK']:
+        self.log.warn( 'Cannot read the logs in %s:' % endPoint[1], result['Message'] )
+        continue
+      now = time.time()
+      for jobID, ( alive, chunk ) in result['Value'].items():
+        if self.__processChunk( jobID, chunk, alive, now ):
+          changed = True
+
+    if changed:
+      self.__lock.acquire()
+      try:
+        self.__saveState()
+      finally:
+        self.__lock.release()
+
+  def __getConnection( self, endPoint ):
+    connection = self.__connections.get( endPoint )
+    if not connection:
+      user, publicIP, port = endPoint
+      connection = self.__connections.setdefault( endPoint, ConnectionUtils( user, publicIP, port ) )
+    return connection
+
+  def __readLogs( self, endPoint, jobs ):
+    """ Read the new bytes of the logs of the ( jobID, offset, output, pid ) jobs of
+        one endpoint with a single remote command, returns a dictionary of JobID
+        and whether the process was alive before reading its log and bytes read
+    """
+    lines = []
+    jobIDs = []
+    for jobID, offset, output, pid in jobs:
+      jobIDs.append( jobID )
+      alive = '1'
+      if pid:
+        alive = '$( kill -0 %d 2>/dev/null && echo 1 || echo 0 )' % int( pid )
+      lines.append( "printf '\\n%s%s %%s\\n' %s" % ( LOG_MARKER, jobID, alive ) )
+      lines.append( "tail -c +%s %s 2>/dev/null | head -c %s" % ( offset + 1, pipes.quote( output ),
+                                                               self.maxReadSize ) )
+    script = tempfile.NamedTemporaryFile( prefix = 'BigDataInteractiveJobs' )
+    try:
+      script.write( '\n'.join( lines ) + '\n' )
+      script.flush()
+      result = self.__getConnection( endPoint ).pipeCall( self.readTimeout, 'cat %s' % script.name, 'sh',
+                                                          True, bool( endPoint[2] ) )
+    finally:
+      script.close()
+    if not result['OK']:
+      return result
+
+    chunks = {}
+    for part in result['Value'][1].split( '\n' + LOG_MARKER )[1:]:
+      header, _sep, chunk = part.partition( '\n' )
+      jobID, _sep, alive = header.partition( ' ' )
+      if jobID in jobIDs:
+        chunks[jobID] = ( alive.strip() != '0', chunk )
+    return S_OK( chunks )
+
+  def __processChunk( self, jobID, chunk, alive, now ):
+    """ Parse the complete lines of the chunk and move the offset past them,
+        the finished jobs are forgotten. Returns whether the job has changed
+    """
+    complete = chunk[:chunk.rfind( '\n' ) + 1]
+    read = len( complete )
+    if not complete and len( chunk ) >= self.maxReadSize:
+      #The line is longer than MaxReadSize and would never be read complete
+      self.log.warn( 'Skipping %s bytes of a too long line of interactive job %s' % ( len( chunk ), jobID ) )
+      read = len( chunk )
+    status = None
+    self.__lock.acquire()
+    try:
+      job = self.__jobs.get( jobID )
+      if not job:
+        return False
+      if read:
+        job['Offset'] += read
+        job['LastOutput'] = now
+
+      for line in complete.splitlines():
+        match = TOTAL_JOBS_PATTERN.search( line )
+        if match and not job['TotalJobs']:
+          job['TotalJobs'] = int( match.group( 1 ) )
+          if job['TotalJobs']:
+            status = "Running"
+        match = STARTED_JOB_PATTERN.search( line )
+        if match:
+          job['StartedJobs'].append( match.group( 1 ) )
+        match = ENDED_JOB_PATTERN.search( line )
+        if match:
+          job['EndedJobs'].append( match.group( 1 ) )
+        if line.startswith( 'FAILED:' ):
+          self.log.error( 'Interactive job %s failed:' % jobID, line )
+          status = "Error"
+          break
+
+      if status == "Error":
+        pass
+      elif job['TotalJobs'] and len( job['EndedJobs'] ) >= job['TotalJobs']:
+        status = "Done"
+      elif not alive and len( chunk ) < self.maxReadSize:
+        #The process has ended and its whole log has been read, without
+        #MapReduce jobs the query is done, otherwise some of them were lost
+        if job['TotalJobs']:
+          self.log.error( 'Interactive job %s ended after %s of %s jobs' % ( jobID, len( job['EndedJobs'] ),
+                                                                            job['TotalJobs'] ) )
+          status = "Error"
+        else:
+          status = "Done"
+      elif now - job.get( 'LastOutput', job['StartTime'] ) > self.maxIdleTime:
+        self.log.error( 'Interactive job %s without output for %s seconds' % ( jobID, self.maxIdleTime ) )
+        status = "Error"
+
+      if status in ( "Done", "Error" ):
+        self.__jobs.pop( jobID, None )
+    finally:
+      self.__lock.release()
+
+    if status == "Done":
+      self.__jobFinished( jobID, job )
+    elif status:
+      BigDataDB.setJobStatus( jobID, status )
+    return bool( read ) or status is not None
+
+  def __jobFinished( self, jobID, job ):
+    self.log.info( 'Interactive job %s done' % jobID )
+    BigDataDB.setJobStatus( jobID, "Done" )
+    if job['EndedJobs']:
+      BigDataDB.setHadoopID( jobID, ','.join( job['EndedJobs'] ) )
+    self.__uploadOutputSandbox( jobID, job )
+    self.__sendAccounting( jobID, job )
+
+  def __uploadOutputSandbox( self, jobID, job ):
+    output = job['Output']
+    connection = self.__getConnection( ( job['User'], job['PublicIP'], job['Port'] ) )
+    if job['Port']:
+      result = connection.scpCallByPort( 100, output, output, False )
+    else:
+      result = connection.scpCall( 100, output, output, False )
+    if not result['OK']:
+      self.log.error( 'Error to get the output of the job:', result['Message'] )
+      return result
+    if not os.path.isfile( output ):
+      return S_ERROR( 'Missing output %s' % output )
+
+    result = self.sandboxClient.uploadFilesAsSandboxForJob( [ output ], int( jobID ),
+                                                            'Output', self.sandboxSizeLimit )
+    if not result['OK']:
+      self.log.error( 'Output sandbox upload failed with message', result['Message'] )
+    else:
+      self.log.info( 'Sandbox uploaded successfully' )
+    return result
+
+  def __sendAccounting( self, jobID, job ):
+    result = jobDB.getJobAttributes( int( jobID ) )
+    if not result['OK']:
+      return result
+    getting = result['Value']
+    execTime = time.time() - job['StartTime']
+    accountingReport = AccountingJob()
+    accountingReport.setStartTime( datetime.datetime.utcfromtimestamp( job['StartTime'] ) )
+    accountingReport.setEndTime()
+    accountingReport.setValuesFromDict( { 'User' : getting['Owner'],
+                                          'UserGroup' : getting['OwnerGroup'],
+                                          'JobGroup' : 'cesga',
+                                          'JobType' : 'User',
+                                          'JobClass' : 'unknown',
+                                          'ProcessingType' : 'unknown',
+                                          'FinalMajorStatus' : getting['Status'],
+                                          'FinalMinorStatus' : getting['MinorStatus'],
+                                          'CPUTime' : execTime,
+                                          'Site' : getting['Site'],
+                                          'NormCPUTime' : 0,
+                                          'ExecTime' : execTime,
+                                          'InputDataSize' : 0,
+                                          'OutputDataSize' : 0,
+                                          'InputDataFiles' : 0,
+                                          'OutputDataFiles' : 0,
+                                          'DiskSpace' : 0,
+                                          'InputSandBoxSize' : 0,
+                                          'OutputSandBoxSize' : 0,
+                                          'ProcessedEvents' : 0 } )
+    return accountingReport.commit()
+
+  def __loadState( self ):
+    if not os.path.exists( self.stateFile ):
+      return
+    try:
+      self.__jobs = json.load( open( self.stateFile ) )
+    except ( IOError, ValueError ), error:
+      self.log.error( 'Cannot load the watched jobs from %s:' % self.stateFile, str( error ) )
+      return
+    self.log.info( 'Resuming %s interactive jobs' % len( self.__jobs ) )
+
+  def __saveState( self ):
+    """ Write the watched jobs atomically, with the lock held
+    """
+    try:
+      fd, tmpName = tempfile.mkstemp( dir = os.path.dirname( self.stateFile ) or '.' )
+      stateFile = os.fdopen( fd, 'w' )
+      json.dump( self.__jobs, stateFile )
+      stateFile.close()
+      os.rename( tmpName, self.stateFile )
+    except ( IOError, OSError ), error:
+      self.log.error( 'Cannot save the watched jobs in %s:' % self.stateFile, str( error ) )
+
+gInteractiveJobWatcher = InteractiveJobWatcher()
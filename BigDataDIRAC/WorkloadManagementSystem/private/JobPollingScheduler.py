@@ -0,0 +1,113 @@
+########################################################################
+# $HeadURL$
+# File :   JobPollingScheduler.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Decides when the state of each BigData job has to be asked again to its endpoint.
+
+  The jobs are kept in a priority queue by next check time. A job is checked
+  every MinInterval seconds after submission or after any change of state, and
+  the interval grows by BackoffFactor up to MaxInterval while the state does not
+  change. When the job gets close to the average run time of the finished jobs
+  of its endpoint the interval is shortened again to catch the completion.
+"""
+
+import heapq
+import threading
+import time
+
+__RCSID__ = '$Id: $'
+
+class JobPollingScheduler:
+
+  def __init__( self, minInterval = 10, maxInterval = 600, backoffFactor = 2.0 ):
+    self.minInterval = minInterval
+    self.maxInterval = maxInterval
+    self.backoffFactor = backoffFactor
+    self.__heap = []
+    self.__jobs = {}
+    self.__runTimes = {}
+    self.__lock = threading.Lock()
+
+  def getDueJobs( self, jobIds, now = None ):
+    """
+      Return the set of jobs of the list that have to be checked now, the jobs
+      not known yet are always due. Known jobs no longer in the list are forgotten.
+    """
+    if now is None:
+      now = time.time()
+    jobIds = set( jobIds )
+    self.__lock.acquire()
+    try:
+      for jobId in self.__jobs.keys():
+        if jobId not in jobIds:
+          del self.__jobs[jobId]
+      while self.__heap and self.__heap[0][0] <= now:
+        nextCheck, jobId = heapq.heappop( self.__heap )
+        if jobId in self.__jobs and self.__jobs[jobId]['NextCheck'] == nextCheck:
+          self.__jobs[jobId]['NextCheck'] = None
+      dueJobs = set()
+      for jobId in jobIds:
+        if jobId not in self.__jobs or self.__jobs[jobId]['NextCheck'] is None:
+          dueJobs.add( jobId )
+      #Drop the stale entries when the queue grows too much
+      if len( self.__heap ) > 4 * len( self.__jobs ) + 64:
+        self.__heap = [ ( job['NextCheck'], jobId ) for jobId, job in self.__jobs.items() if job['NextCheck'] is not None ]
+        heapq.heapify( self.__heap )
+      return dueJobs
+    finally:
+      self.__lock.release()
+
+  def update( self, jobId, endPoint, state, now = None ):
+    """
+      Schedule the next check of the job after getting its state
+    """
+    if now is None:
+      now = time.time()
+    self.__lock.acquire()
+    try:
+      job = self.__jobs.get( jobId )
+      if job is None:
+        job = { 'EndPoint': endPoint, 'FirstSeen': now, 'Interval': 0, 'State': None, 'NextCheck': None }
+        self.__jobs[jobId] = job
+
+      if state != job['State']:
+        interval = self.minInterval
+      else:
+        interval = min( max( job['Interval'], self.minInterval ) * self.backoffFactor, self.maxInterval )
+
+      expectedRunTime = self.__getAverageRunTime( endPoint )
+      if expectedRunTime:
+        remaining = job['FirstSeen'] + expectedRunTime - now
+        if 0 < remaining < interval:
+          interval = max( self.minInterval, remaining )
+
+      job['State'] = state
+      job['Interval'] = interval
+      job['NextCheck'] = now + interval
+      heapq.heappush( self.__heap, ( job['NextCheck'], jobId ) )
+    finally:
+      self.__lock.release()
+
+  def jobFinished( self, jobId, endPoint, now = None ):
+    """
+      Account the run time of the finished job for its endpoint and forget it
+    """
+    if now is None:
+      now = time.time()
+    self.__lock.acquire()
+    try:
+      job = self.__jobs.pop( jobId, None )
+      if job is not None:
+        count, total = self.__runTimes.get( endPoint, ( 0, 0.0 ) )
+        self.__runTimes[endPoint] = ( count + 1, total + now - job['FirstSeen'] )
+    finally:
+      self.__lock.release()
+
+  def __getAverageRunTime( self, endPoint ):
+    count, total = self.__runTimes.get( endPoint, ( 0, 0.0 ) )
+    if not count:
+      return 0
+    return total / count
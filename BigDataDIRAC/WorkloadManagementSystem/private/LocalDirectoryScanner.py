@@ -0,0 +1,177 @@
+########################################################################
+# $HeadURL$
+# File :   LocalDirectoryScanner.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Incremental listing of the LocalDisk input directories of the output data
+  transfers.
+
+  The files found are kept between calls. With pyinotify the changes are
+  taken from the close-write, move and delete events of the directory. Without
+  it the directory is only listed again when its modification time changes,
+  and only the new entries are checked. In both cases a file is returned once
+  it is completely written: closed after writing, moved in, or with the same
+  size and modification time for settleTime seconds.
+"""
+
+import os
+import time
+
+from DIRAC                                                    import gLogger
+
+try:
+  import pyinotify
+except ImportError:
+  pyinotify = None
+
+try:
+  from scandir import scandir
+except ImportError:
+  scandir = None
+
+__RCSID__ = '$Id: $'
+
+class LocalDirectoryScanner:
+
+  def __init__( self, path, settleTime = 10 ):
+    self.log = gLogger.getSubLogger( "LocalDirectoryScanner" )
+    self.path = path
+    self.settleTime = settleTime
+    # Completely written files and their sizes
+    self.__files = {}
+    # Files still being written, with the ( size, mtime ) of the last check
+    self.__pendingFiles = {}
+    self.__dirMTime = None
+    self.__notifier = None
+    if pyinotify:
+      self.__startNotifier()
+
+  def getFiles( self ):
+    """
+    Return the names of the completely written files in the directory
+    """
+    return self.getFileSizes().keys()
+
+  def getFileSizes( self ):
+    """
+    Return a dictionary with the completely written files in the directory and
+    their sizes
+    """
+    if self.__notifier:
+      self.__readEvents()
+    else:
+      self.__scan()
+    self.__checkPendingFiles()
+    return dict( self.__files )
+
+  def close( self ):
+    if self.__notifier:
+      self.__notifier.stop()
+      self.__notifier = None
+
+  def __startNotifier( self ):
+    watchManager = pyinotify.WatchManager()
+    mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | pyinotify.IN_CREATE | \
+           pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM
+    try:
+      result = watchManager.add_watch( self.path, mask, quiet = False )
+    except pyinotify.WatchManagerError, x:
+      self.log.warn( 'Cannot watch %s, scanning it:' % self.path, str( x ) )
+      return
+    if result.get( self.path, -1 ) < 0:
+      return
+    self.__notifier = pyinotify.Notifier( watchManager, self.__handleEvent, timeout = 0 )
+    # The files already there are found with a full scan
+    self.__scan()
+
+  def __readEvents( self ):
+    while self.__notifier.check_events( 0 ):
+      self.__notifier.read_events()
+      self.__notifier.process_events()
+
+  def __handleEvent( self, event ):
+    if event.mask & pyinotify.IN_Q_OVERFLOW:
+      self.log.warn( 'Events of %s lost, scanning it' % self.path )
+      self.__dirMTime = None
+      self.__scan()
+      return
+    if event.dir:
+      return
+    name = event.name
+    if event.mask & ( pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM ):
+      self.__files.pop( name, None )
+      self.__pendingFiles.pop( name, None )
+    elif event.mask & ( pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO ):
+      self.__pendingFiles.pop( name, None )
+      try:
+        self.__files[name] = os.stat( event.pathname ).st_size
+      except OSError:
+        self.__files.pop( name, None )
+    elif event.mask & pyinotify.IN_CREATE:
+      self.__pendingFiles[name] = None
+
+  def __scan( self ):
+    """
+    List the directory again only when it has changed, and check only the new
+    entries
+    """
+    try:
+      dirMTime = os.stat( self.path ).st_mtime
+    except OSError, x:
+      self.log.error( 'Cannot stat %s:' % self.path, str( x ) )
+      return
+    scanTime = time.time()
+    if dirMTime == self.__dirMTime:
+      return
+
+    try:
+      if scandir:
+        entries = dict( [ ( entry.name, entry ) for entry in scandir( self.path ) ] )
+      else:
+        entries = dict( [ ( name, None ) for name in os.listdir( self.path ) ] )
+    except OSError, x:
+      self.log.error( 'Cannot list %s:' % self.path, str( x ) )
+      return
+
+    for name in self.__files.keys():
+      if name not in entries:
+        del self.__files[name]
+    for name in self.__pendingFiles.keys():
+      if name not in entries:
+        del self.__pendingFiles[name]
+    for name, entry in entries.items():
+      if name in self.__files or name in self.__pendingFiles:
+        continue
+      if entry is not None:
+        isFile = entry.is_file( follow_symlinks = True )
+      else:
+        isFile = os.path.isfile( os.path.join( self.path, name ) )
+      if isFile:
+        self.__pendingFiles[name] = None
+
+    # Entries added in the same tick as the listing would not change the
+    # modification time again, so a recent one is not trusted
+    if dirMTime < scanTime - 1:
+      self.__dirMTime = dirMTime
+    else:
+      self.__dirMTime = None
+
+  def __checkPendingFiles( self ):
+    """
+    Move to the complete files the pending ones unchanged for settleTime seconds
+    """
+    now = time.time()
+    for name, lastState in self.__pendingFiles.items():
+      try:
+        fileStat = os.stat( os.path.join( self.path, name ) )
+      except OSError:
+        del self.__pendingFiles[name]
+        continue
+      state = ( fileStat.st_size, fileStat.st_mtime )
+      if state == lastState and now - fileStat.st_mtime >= self.settleTime:
+        del self.__pendingFiles[name]
+        self.__files[name] = fileStat.st_size
+      else:
+        self.__pendingFiles[name] = state
@@ -1,10 +1,13 @@
 # $HeadURL$
 
 import os
+import errno
+import threading
 import time
 
-from DIRAC                                            import gConfig, S_OK, S_ERROR, gLogger
+from DIRAC                                            import gConfig, S_OK, S_ERROR, gLogger, rootPath
 from DIRAC.Core.Utilities                             import List
+from DIRAC.Core.Utilities.File                        import makeGuid
 from DIRAC.Core.Utilities.Subprocess                  import pythonCall
 from DIRAC.Core.Utilities.ThreadPool                  import ThreadPool
 from DIRAC.Core.Utilities.ThreadSafe                  import Synchronizer
@@ -12,10 +15,38 @@ from DIRAC.DataManagementSystem.Client.ReplicaManager import ReplicaManager
 from DIRAC.Resources.Catalog.FileCatalog              import FileCatalog
 from DIRAC.Resources.Storage.StorageElement           import StorageElement
 
+from BigDataDIRAC.WorkloadManagementSystem.private.TransferProcessPool import TransferProcessPool
+from BigDataDIRAC.WorkloadManagementSystem.private.LocalDirectoryScanner import LocalDirectoryScanner
+from BigDataDIRAC.WorkloadManagementSystem.private.TransferJournal import TransferJournal
+from BigDataDIRAC.WorkloadManagementSystem.private.ChunkedDownload import downloadInChunks
+
 __RCSID__ = '$Id: $'
 
 transferSync = Synchronizer()
 
+class TokenBucket:
+  """
+  Allow up to rate operations per second on average, with bursts of capacity
+  """
+
+  def __init__( self, rate, capacity = 0 ):
+    self.rate = float( rate )
+    self.capacity = float( capacity or max( rate, 1 ) )
+    self.__tokens = self.capacity
+    self.__lastTime = time.time()
+
+  def consume( self, tokens = 1 ):
+    """
+    Take the tokens if they are available, never waits
+    """
+    now = time.time()
+    self.__tokens = min( self.capacity, self.__tokens + ( now - self.__lastTime ) * self.rate )
+    self.__lastTime = now
+    if self.__tokens < tokens:
+      return False
+    self.__tokens -= tokens
+    return True
+
 class OutputDataExecutor:
 
   def __init__( self, csPath = "" ):
@@ -28,14 +59,42 @@ class OutputDataExecutor:
     self.log.verbose( "Reading transfer paths from %s" % self.__transfersCSPath )
     self.__requiredCSOptions = ['InputPath', 'InputFC', 'OutputPath', 'OutputFC', 'OutputSE']
 
-    self.__threadPool = ThreadPool( gConfig.getValue( "%s/MinTransfers" % self.__transfersCSPath, 1 ),
-                                    gConfig.getValue( "%s/MaxTransfers" % self.__transfersCSPath, 4 ),
+    minTransfers = gConfig.getValue( "%s/MinTransfers" % self.__transfersCSPath, 1 )
+    maxTransfers = gConfig.getValue( "%s/MaxTransfers" % self.__transfersCSPath, 4 )
+    self.__threadPool = ThreadPool( minTransfers, maxTransfers,
                                     gConfig.getValue( "%s/MaxQueuedTransfers" % self.__transfersCSPath, 100 ) )
     self.__threadPool.daemonize()
+    # Subprocess forks a process per storage operation, ProcessPool reuses workers
+    self.__processPool = None
+    transferBackend = gConfig.getValue( "%s/TransferBackend" % self.__transfersCSPath, "Subprocess" )
+    if transferBackend == "ProcessPool":
+      self.__processPool = TransferProcessPool( minTransfers, maxTransfers )
+    elif transferBackend != "Subprocess":
+      self.log.warn( "Unknown TransferBackend %s, using Subprocess" % transferBackend )
+    # Transfers queued per second, 0 means no limit
+    maxRate = gConfig.getValue( "%s/MaxTransfersPerSecond" % self.__transfersCSPath, 0.0 )
+    self.__rateLimiter = None
+    if maxRate > 0:
+      self.__rateLimiter = TokenBucket( maxRate, gConfig.getValue( "%s/MaxTransfersBurst" % self.__transfersCSPath, 0 ) )
     self.__processingFiles = set()
+    self.__localScanners = {}
+    # Failed files wait RetryDelay * 2^( attempts - 1 ) seconds up to MaxRetryDelay
+    # before being queued again, and are quarantined after MaxAttempts failures
+    self.__journal = TransferJournal( gConfig.getValue( "%s/JournalFile" % self.__transfersCSPath,
+                                                        os.path.join( rootPath, 'work', 'OutputData', 'TransferJournal.db' ) ),
+                                      gConfig.getValue( "%s/RetryDelay" % self.__transfersCSPath, 60 ),
+                                      gConfig.getValue( "%s/MaxRetryDelay" % self.__transfersCSPath, 3600 ),
+                                      gConfig.getValue( "%s/MaxAttempts" % self.__transfersCSPath, 10 ) )
+    self.__inFlightResumed = False
+    # The transfer paths are checked starting from a different one every cycle
+    self.__pathRotation = 0
+    # First time each file was seen, for the aging of the shortest first order
+    self.__firstSeen = {}
+    # Bytes and seconds of the transfers to each output SE
+    self.__seTransfers = {}
+    self.__seTransfersLock = threading.Lock()
     self.__okTransferredFiles = 0
     self.__okTransferredBytes = 0
-    self.__failedFiles = {}
 
   def getNumOKTransferredFiles( self ):
     return self.__okTransferredFiles
@@ -43,6 +102,29 @@ class OutputDataExecutor:
   def getNumOKTransferredBytes( self ):
     return self.__okTransferredBytes
 
+  def getTransferRates( self ):
+    """
+    Return a dictionary of output SE and average bytes per second of a transfer
+    """
+    self.__seTransfersLock.acquire()
+    try:
+      rates = {}
+      for seName, ( transferredBytes, seconds ) in self.__seTransfers.items():
+        if seconds > 0:
+          rates[ seName ] = transferredBytes / seconds
+      return rates
+    finally:
+      self.__seTransfersLock.release()
+
+  def __addTransferTime( self, seName, transferredBytes, seconds ):
+    self.__seTransfersLock.acquire()
+    try:
+      seTransfers = self.__seTransfers.setdefault( seName, [ 0, 0.0 ] )
+      seTransfers[0] += transferredBytes
+      seTransfers[1] += seconds
+    finally:
+      self.__seTransfersLock.release()
+
   def transfersPending( self ):
     return self.__threadPool.isWorking()
 
@@ -90,34 +172,43 @@ class OutputDataExecutor:
     """
     Get list of files to be processed from InputPath
     """
+    return self.getOutgoingFileSizes( transferDict ).keys()
+
+  def getOutgoingFileSizes( self, transferDict ):
+    """
+    Get a dictionary of files to be processed from InputPath and their sizes
+    """
     inputFCName = transferDict['InputFC']
     inputPath = transferDict['InputPath']
 
     if inputFCName == 'LocalDisk':
-      files = []
-      try:
-        for fileName in os.listdir( inputPath ):
-          if os.path.isfile( os.path.join( inputPath, fileName ) ):
-            files.append( fileName )
-      except:
-        pass
-      return files
+      settleTime = int( transferDict.get( 'SettleTime', 10 ) )
+      scanner = self.__localScanners.get( inputPath )
+      if not scanner or scanner.settleTime != settleTime:
+        if scanner:
+          scanner.close()
+        scanner = LocalDirectoryScanner( inputPath, settleTime )
+        self.__localScanners[ inputPath ] = scanner
+      return scanner.getFileSizes()
 
     inputFC = FileCatalog( [inputFCName] )
     result = inputFC.listDirectory( inputPath, True )
 
     if not result['OK']:
       self.log.error( result['Message'] )
-      return []
+      return {}
     if not inputPath in result['Value']['Successful']:
       self.log.error( result['Value']['Failed'][inputPath] )
-      return []
+      return {}
 
     subDirs = result['Value']['Successful'][inputPath]['SubDirs']
     files = result['Value']['Successful'][inputPath]['Files']
     for subDir in subDirs:
       self.log.info( 'Ignoring subdirectory:', subDir )
-    return files.keys()
+    fileSizes = {}
+    for lfn in files:
+      fileSizes[ lfn ] = files[ lfn ].get( 'MetaData', {} ).get( 'Size', 0 )
+    return fileSizes
 
   def checkForTransfers( self ):
     """
@@ -127,50 +218,147 @@ class OutputDataExecutor:
     if not result[ 'OK' ]:
       return result
     tPaths = result[ 'Value' ]
-    for name in tPaths:
+    if not self.__inFlightResumed:
+      self.__resumeInFlight( tPaths )
+    self.__journal.purge()
+    names = sorted( tPaths )
+    if names:
+      self.__pathRotation = ( self.__pathRotation + 1 ) % len( names )
+      names = names[ self.__pathRotation: ] + names[ :self.__pathRotation ]
+    for name in names:
       transferPath = tPaths[ name ]
       self.log.verbose( "Checking %s transfer path" % name )
-      filesToTransfer = self.getOutgoingFiles( tPaths[ name ] )
+      filesToTransfer = self.__sortFiles( name, transferPath, self.getOutgoingFileSizes( transferPath ) )
       self.log.info( "Transfer path %s has %d files" % ( name, len( filesToTransfer ) ) )
-      ret = self.__addFilesToThreadPool( filesToTransfer, transferPath )
+      result = self.__journal.getBlockedFiles( name )
+      if result['OK'] and result['Value']:
+        blockedFiles = result['Value']
+        filesToTransfer = [ fileName for fileName in filesToTransfer
+                            if os.path.basename( fileName ) not in blockedFiles ]
+        self.log.verbose( "%d files of %s wait for retry or are quarantined" % ( len( blockedFiles ), name ) )
+      result = self.getRegisteredFiles( filesToTransfer, transferPath )
+      if result['OK']:
+        registeredFiles = result['Value']
+      else:
+        # Each transfer will check its own file
+        self.log.warn( "Cannot check the output catalog of %s:" % name, result['Message'] )
+        registeredFiles = None
+      ret = self.__addFilesToThreadPool( filesToTransfer, transferPath, registeredFiles, name )
       if not ret['OK']:
+        if ret.get( 'RateLimited' ):
+          # The rest of the paths may still use tokens refilled meanwhile
+          continue
         # The thread pool got full 
         break
 
+  def __sortFiles( self, name, transferDict, fileSizes ):
+    """
+    Order the files shortest first, the size of a file is divided by
+    1 + waiting time / AgingTime so large files are not delayed for ever.
+    Scheduling = FIFO keeps the listing order.
+    """
+    if transferDict.get( 'Scheduling', 'ShortestFirst' ) == 'FIFO':
+      return fileSizes.keys()
+    agingTime = float( transferDict.get( 'AgingTime', 3600 ) )
+    now = time.time()
+    firstSeen = self.__firstSeen.setdefault( name, {} )
+    for fileName in firstSeen.keys():
+      if fileName not in fileSizes:
+        del firstSeen[ fileName ]
+    priorities = []
+    for fileName, size in fileSizes.items():
+      waitingTime = now - firstSeen.setdefault( fileName, now )
+      priorities.append( ( size / ( 1.0 + waitingTime / agingTime ), fileName ) )
+    priorities.sort()
+    return [ fileName for _priority, fileName in priorities ]
+
+  def __resumeInFlight( self, tPaths ):
+    """
+    Queue again the files being transferred when the executor stopped, without
+    listing the input paths
+    """
+    result = self.__journal.getInFlight()
+    if not result['OK']:
+      return result
+    self.__inFlightResumed = True
+    for name, files in result['Value'].items():
+      if name not in tPaths:
+        continue
+      self.log.info( "Resuming %d transfers of %s" % ( len( files ), name ) )
+      ret = self.__addFilesToThreadPool( files, tPaths[ name ], None, name )
+      if not ret['OK'] and not ret.get( 'RateLimited' ):
+        break
+    return S_OK()
+
   def processAllPendingTransfers( self ):
     self.__threadPool.processAllResults()
 
   @transferSync
-  def __addFilesToThreadPool( self, files, transferDict ):
-    for fileName in files:
-      fileName = os.path.basename( fileName )
-      if fileName in self.__processingFiles:
-        continue
-      self.__processingFiles.add( fileName )
-      time.sleep( 1 )
-      ret = self.__threadPool.generateJobAndQueueIt( self.__transferIfNotRegistered,
-                                            args = ( fileName, transferDict ),
-                                            oCallback = self.transferCallback,
-                                            blocking = False )
-      if not ret['OK']:
-        # The thread pool got full 
-        return ret
-    return S_OK()
+  def __addFilesToThreadPool( self, files, transferDict, registeredFiles = None, transferName = '' ):
+    queuedFiles = []
+    try:
+      for fileName in files:
+        fileName = os.path.basename( fileName )
+        if fileName in self.__processingFiles:
+          continue
+        if self.__rateLimiter and not self.__rateLimiter.consume():
+          # The rest of the files are queued in the next cycles
+          ret = S_ERROR( "Transfer rate limit reached" )
+          ret['RateLimited'] = True
+          return ret
+        registered = None
+        if registeredFiles is not None:
+          registered = fileName in registeredFiles
+        self.__processingFiles.add( fileName )
+        ret = self.__threadPool.generateJobAndQueueIt( self.__transferIfNotRegistered,
+                                              args = ( fileName, transferDict, registered, transferName ),
+                                              oCallback = self.transferCallback,
+                                              blocking = False )
+        if not ret['OK']:
+          # The thread pool got full 
+          self.__processingFiles.discard( fileName )
+          return ret
+        queuedFiles.append( fileName )
+      return S_OK()
+    finally:
+      if queuedFiles:
+        self.__journal.setTransferring( transferName, queuedFiles )
 
-  def __transferIfNotRegistered( self, file, transferDict ):
-    result = self.isRegisteredInOutputCatalog( file, transferDict )
+  def __transferIfNotRegistered( self, file, transferDict, registered = None, transferName = '' ):
+    """
+    Run in the thread pool, any failure, exceptions included, is recorded in the
+    journal and returned with the file name for transferCallback to release it
+    """
+    try:
+      result = self.__deleteOrTransferFile( file, transferDict, registered, transferName )
+    except Exception, x:
+      self.log.exception( 'Error transferring %s' % file )
+      result = S_ERROR( file )
     if not result[ 'OK' ]:
-      self.log.error( result[ 'Message' ] )
-      return result
+      self.__journal.setFailed( transferName, file )
+    return result
+
+  def __deleteOrTransferFile( self, file, transferDict, registered, transferName ):
+    if registered is None:
+      result = self.isRegisteredInOutputCatalog( file, transferDict )
+      if not result[ 'OK' ]:
+        self.log.error( result[ 'Message' ] )
+        return S_ERROR( file )
+      registered = result[ 'Value' ]
     #Already registered. Need to delete
-    if result[ 'Value' ]:
+    if registered:
       self.log.info( "Transfer file %s is already registered in the output catalog" % file )
       #Delete
       filePath = os.path.join( transferDict[ 'InputPath' ], file )
       if transferDict[ 'InputFC' ] == 'LocalDisk':
-        os.unlink( filePath )
-      #FIXME: what is inFile supposed to be ??
+        try:
+          os.unlink( filePath )
+        except OSError, x:
+          #Already gone, removed by a previous attempt
+          if x.errno != errno.ENOENT:
+            raise
       else:
+        inFile = filePath
         inputFC = FileCatalog( [ transferDict['InputFC'] ] )
         replicaDict = inputFC.getReplicas( filePath )
         if not replicaDict['OK']:
@@ -183,29 +371,44 @@ class OutputDataExecutor:
             se = StorageElement( se )
             self.log.info( 'Removing from %s:' % se.name, inFile )
             se.removeFile( inFile )
-          inputFC.removeFile( file )
+          inputFC.removeFile( inFile )
       self.log.info( "File %s deleted from %s" % ( file, transferDict[ 'InputFC' ] ) )
-      self.__processingFiles.discard( file )
+      self.__journal.setDone( transferName, file )
       return S_OK( file )
     #Do the transfer
-    return self.__retrieveAndUploadFile( file, transferDict )
+    return self.__retrieveAndUploadFile( file, transferDict, transferName )
 
   def isRegisteredInOutputCatalog( self, file, transferDict ):
+    result = self.getRegisteredFiles( [ file ], transferDict )
+    if not result[ 'OK' ]:
+      return result
+    return S_OK( os.path.basename( file ) in result[ 'Value' ] )
+
+  def getRegisteredFiles( self, files, transferDict ):
+    """
+    Return the set of file names already registered in one of the output SEs,
+    asking the output catalog once for all of them
+    """
+    if not files:
+      return S_OK( set() )
     fc = FileCatalog( [ transferDict[ 'OutputFC' ] ] )
-    lfn = os.path.join( transferDict['OutputPath'], os.path.basename( file ) )
-    result = fc.getReplicas( lfn )
+    lfns = {}
+    for file in files:
+      lfns[ os.path.join( transferDict['OutputPath'], os.path.basename( file ) ) ] = os.path.basename( file )
+    result = fc.getReplicas( lfns.keys() )
     if not result[ 'OK' ]:
       return result
-    if lfn not in result[ 'Value' ][ 'Successful' ]:
-      return S_OK( False )
-    replicas = result[ 'Value' ][ 'Successful' ][ lfn ]
-    for seName in List.fromChar( transferDict[ 'OutputSE' ], "," ):
-      if seName in replicas:
-        self.log.verbose( "Transfer file %s is already registered in %s SE" % ( file, seName ) )
-        return S_OK( True )
-    return S_OK( False )
-
-  def __retrieveAndUploadFile( self, file, outputDict ):
+    outputSEs = List.fromChar( transferDict[ 'OutputSE' ], "," )
+    registeredFiles = set()
+    for lfn, replicas in result[ 'Value' ][ 'Successful' ].items():
+      for seName in outputSEs:
+        if seName in replicas:
+          self.log.verbose( "Transfer file %s is already registered in %s SE" % ( lfns[ lfn ], seName ) )
+          registeredFiles.add( lfns[ lfn ] )
+          break
+    return S_OK( registeredFiles )
+
+  def __retrieveAndUploadFile( self, file, outputDict, transferName = '' ):
     """
     Retrieve, Upload, and remove
     """
@@ -230,20 +433,40 @@ class OutputDataExecutor:
       seList = replicaDict['Value']['Successful'][inFile].keys()
 
       inputSE = StorageElement( seList[0] )
-      self.log.info( 'Retrieving from %s:' % inputSE.name, inFile )
-      # ret = inputSE.getFile( inFile )
-      # lcg_util binding prevent multithreading, use subprocess instead
-      res = pythonCall( 2 * 3600, inputSE.getFile, inFile )
-      if not res['OK']:
-        self.log.error( res['Message'] )
-        return S_ERROR( fileName )
-      ret = res['Value']
-      if not ret['OK']:
-        self.log.error( ret['Message'] )
-        return S_ERROR( fileName )
-      if not inFile in ret['Value']['Successful']:
-        self.log.error( ret['Value']['Failed'][inFile] )
-        return S_ERROR( fileName )
+      streamingProtocols = List.fromChar( outputDict.get( 'StreamingProtocols', '' ), "," )
+      if streamingProtocols:
+        startTime = time.time()
+        result = self.__streamFile( inFile, inputSE, inputFC, outputDict, streamingProtocols )
+        if result['OK']:
+          inBytes, outputSEName = result['Value']
+          self.__addTransferTime( outputSEName, inBytes, time.time() - startTime )
+          self.log.info( "Finished streaming %s [%s bytes]" % ( inFile, inBytes ) )
+          self.__okTransferredFiles += 1
+          self.__okTransferredBytes += inBytes
+          self.__journal.setDone( transferName, fileName, inBytes )
+          self.__removeFromInput( inFile, seList, inputFC )
+          return S_OK( fileName )
+        # The protocols of the SEs do not allow it, stage the file locally
+        self.log.warn( 'Cannot stream %s, staging it:' % inFile, result['Message'] )
+
+      result = self.__downloadInChunks( inFile, inputSE, inputFC, outputDict )
+      if not result['OK']:
+        self.log.warn( 'Cannot download %s in chunks:' % inFile, result['Message'] )
+      if not result['OK'] or not result['Value']:
+        self.log.info( 'Retrieving from %s:' % inputSE.name, inFile )
+        # ret = inputSE.getFile( inFile )
+        # lcg_util binding prevent multithreading, use subprocess instead
+        res = self.__storageCall( inputSE, 'getFile', inFile )
+        if not res['OK']:
+          self.log.error( res['Message'] )
+          return S_ERROR( fileName )
+        ret = res['Value']
+        if not ret['OK']:
+          self.log.error( ret['Message'] )
+          return S_ERROR( fileName )
+        if not inFile in ret['Value']['Successful']:
+          self.log.error( ret['Value']['Failed'][inFile] )
+          return S_ERROR( fileName )
 
     if os.path.isfile( file ):
       inBytes = os.stat( file )[6]
@@ -256,12 +479,14 @@ class OutputDataExecutor:
     for outputSEName in List.fromChar( outputDict['OutputSE'], "," ):
       outputSE = StorageElement( outputSEName )
       self.log.info( 'Trying to upload to %s:' % outputSE.name, outFile )
+      startTime = time.time()
       # ret = replicaManager.putAndRegister( outFile, os.path.realpath( file ), outputSE.name, catalog=outputFCName )
       # lcg_util binding prevent multithreading, use subprocess instead
-      result = pythonCall( 2 * 3600, replicaManager.putAndRegister, outFile, os.path.realpath( file ), outputSE.name, catalog = outputFCName )
+      result = self.__storageCall( replicaManager, 'putAndRegister', outFile, os.path.realpath( file ), outputSE.name, catalog = outputFCName )
       if result['OK'] and result['Value']['OK']:
         if outFile in result['Value']['Value']['Successful']:
           transferOK = True
+          self.__addTransferTime( outputSE.name, inBytes, time.time() - startTime )
           break
         else:
           self.log.error( result['Value']['Value']['Failed'][outFile] )
@@ -284,11 +509,66 @@ class OutputDataExecutor:
     self.log.info( "Finished transferring %s [%s bytes]" % ( inFile, inBytes ) )
     self.__okTransferredFiles += 1
     self.__okTransferredBytes += inBytes
+    self.__journal.setDone( transferName, fileName, inBytes )
 
     if inputFCName == 'LocalDisk':
       return S_OK( fileName )
 
     # Now the file is on final SE/FC, remove from input SE/FC
+    self.__removeFromInput( inFile, seList, inputFC )
+
+    return S_OK( fileName )
+
+  def __storageCall( self, target, method, *args, **kwargs ):
+    """
+    Run the method of the StorageElement or ReplicaManager out of the threads,
+    returns S_OK with its result as pythonCall
+    """
+    if not self.__processPool:
+      return pythonCall( 2 * 3600, getattr( target, method ), *args, **kwargs )
+    seName = None
+    if isinstance( target, StorageElement ):
+      seName = target.name
+    return self.__processPool.call( 2 * 3600, seName, method, *args, **kwargs )
+
+  def __downloadInChunks( self, inFile, inputSE, inputFC, outputDict ):
+    """
+    Download files larger than ChunkedMinSize MB with ChunkedStreams parallel
+    range requests, when the input SE gives an URL in one of ChunkedProtocols.
+    Returns S_OK( False ) when the file has to be retrieved as usual.
+    """
+    protocols = List.fromChar( outputDict.get( 'ChunkedProtocols', '' ), "," )
+    if not protocols:
+      return S_OK( False )
+    result = inputFC.getFileMetadata( inFile )
+    if not result['OK']:
+      return result
+    if inFile not in result['Value']['Successful']:
+      return S_ERROR( result['Value']['Failed'][inFile] )
+    size = result['Value']['Successful'][inFile]['Size']
+    if size < float( outputDict.get( 'ChunkedMinSize', 1024 ) ) * 1024 * 1024:
+      return S_OK( False )
+    result = inputSE.getPfnForLfn( inFile )
+    if not result['OK']:
+      return result
+    inPfn = result['Value']
+    # lcg_util binding prevent multithreading, use subprocess instead
+    result = self.__storageCall( inputSE, 'getAccessUrl', inPfn, protocol = protocols )
+    if result['OK']:
+      result = result['Value']
+    if not result['OK']:
+      return result
+    if inPfn not in result['Value']['Successful']:
+      return S_ERROR( result['Value']['Failed'][inPfn] )
+    self.log.info( 'Retrieving in chunks from %s:' % inputSE.name, inFile )
+    result = downloadInChunks( result['Value']['Successful'][inPfn], os.path.basename( inFile ), size,
+                               int( outputDict.get( 'ChunkedStreams', 4 ) ), 2 * 3600,
+                               os.environ.get( 'X509_USER_PROXY' ) )
+    if not result['OK']:
+      return result
+    return S_OK( True )
+
+  def __removeFromInput( self, inFile, seList, inputFC ):
     for se in seList:
       se = StorageElement( se )
       self.log.info( 'Removing from %s:' % se.name, inFile )
@@ -296,19 +576,72 @@ class OutputDataExecutor:
 
     inputFC.removeFile( inFile )
 
-    return S_OK( fileName )
+  def __streamFile( self, inFile, inputSE, inputFC, outputDict, protocols ):
+    """
+    Copy the file from the input SE to the first output SE accepting it, the
+    output SE reads it from a transport URL of the input SE so there is no local
+    copy, and register it in the output catalog
+    """
+    result = inputFC.getFileMetadata( inFile )
+    if not result['OK']:
+      return result
+    if inFile not in result['Value']['Successful']:
+      return S_ERROR( result['Value']['Failed'][inFile] )
+    metadata = result['Value']['Successful'][inFile]
+    result = inputSE.getPfnForLfn( inFile )
+    if not result['OK']:
+      return result
+    inPfn = result['Value']
+    # lcg_util binding prevent multithreading, use subprocess instead
+    result = self.__storageCall( inputSE, 'getAccessUrl', inPfn, protocol = protocols )
+    if result['OK']:
+      result = result['Value']
+    if not result['OK']:
+      return result
+    if inPfn not in result['Value']['Successful']:
+      return S_ERROR( result['Value']['Failed'][inPfn] )
+    inUrl = result['Value']['Successful'][inPfn]
+
+    outFile = os.path.join( outputDict['OutputPath'], os.path.basename( inFile ) )
+    replicaManager = ReplicaManager()
+    result = S_ERROR( 'No output SE accepted the stream' )
+    for outputSEName in List.fromChar( outputDict['OutputSE'], "," ):
+      outputSE = StorageElement( outputSEName )
+      result = outputSE.getPfnForLfn( outFile )
+      if not result['OK']:
+        continue
+      outPfn = result['Value']
+      self.log.info( 'Streaming from %s to %s:' % ( inputSE.name, outputSE.name ), outFile )
+      # lcg_util binding prevent multithreading, use subprocess instead
+      result = self.__storageCall( outputSE, 'putFile', { outPfn: inUrl } )
+      if result['OK']:
+        result = result['Value']
+      if not result['OK']:
+        continue
+      if outPfn not in result['Value']['Successful']:
+        result = S_ERROR( result['Value']['Failed'][outPfn] )
+        continue
+      fileTuple = ( outFile, outPfn, metadata['Size'], outputSE.name,
+                    metadata.get( 'GUID' ) or makeGuid(), metadata.get( 'Checksum', '' ) )
+      result = replicaManager.registerFile( fileTuple, catalog = outputDict['OutputFC'] )
+      if result['OK'] and outFile in result['Value']['Successful']:
+        return S_OK( ( metadata['Size'], outputSE.name ) )
+      if result['OK']:
+        result = S_ERROR( result['Value']['Failed'][outFile] )
+      self.log.error( 'Cannot register %s, removing it from %s' % ( outFile, outputSE.name ) )
+      removal = self.__storageCall( outputSE, 'removeFile', outPfn )
+      if removal['OK']:
+        removal = removal['Value']
+      if not removal['OK']:
+        self.log.error( 'Cannot remove %s from %s:' % ( outPfn, outputSE.name ), removal['Message'] )
+    return result
 
   @transferSync
   def transferCallback( self, threadedJob, submitResult ):
     if not submitResult['OK']:
       fileName = submitResult['Message']
-      if fileName not in self.__failedFiles:
-        self.__failedFiles[fileName] = 0
-      self.__failedFiles[fileName] += 1
     else:
       fileName = submitResult['Value']
-      if fileName in self.__failedFiles:
-        del self.__failedFiles[fileName]
     #Take out from processing files
     if fileName in self.__processingFiles:
       self.__processingFiles.discard( fileName )
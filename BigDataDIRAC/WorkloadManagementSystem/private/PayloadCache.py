@@ -0,0 +1,93 @@
+########################################################################
+# $HeadURL$
+# File :   PayloadCache.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Cache of the files shipped inside the pilot wrappers.
+
+  dirac-pilot.py and dirac-install.py only change with a DIRAC upgrade, so their
+  bz2 compressed and base64 encoded contents are kept until the modification
+  time or the size of the file changes. The wrapper templates are prebuilt with
+  those blobs, leaving only the per submission values to be substituted.
+"""
+
+import base64
+import bz2
+import os
+import threading
+
+from DIRAC                                                    import gLogger
+
+__RCSID__ = '$Id: $'
+
+class _KeepPlaceholders( dict ):
+  """ Leave the placeholders without value untouched in a partial substitution
+  """
+  def __missing__( self, key ):
+    return '%%(%s)s' % key
+
+class PayloadCache:
+
+  def __init__( self ):
+    self.log = gLogger.getSubLogger( "PayloadCache" )
+    self.__payloads = {}
+    self.__templates = {}
+    self.__lock = threading.Lock()
+
+  def getEncodedFile( self, filePath ):
+    """ Return the contents of the file compressed and encoded in base64 in a
+        single line
+    """
+    signature = self.__getSignature( filePath )
+    self.__lock.acquire()
+    try:
+      if filePath in self.__payloads and self.__payloads[filePath][0] == signature:
+        return self.__payloads[filePath][1]
+    finally:
+      self.__lock.release()
+
+    self.log.verbose( 'Compressing', filePath )
+    encodedFile = base64.encodestring( bz2.compress( open( filePath, "rb" ).read(), 9 ) ).replace( '\n', '' )
+    self.__lock.acquire()
+    try:
+      self.__payloads[filePath] = ( signature, encodedFile )
+    finally:
+      self.__lock.release()
+    return encodedFile
+
+  def getTemplate( self, template, files ):
+    """ Return the template with the placeholders in the files dictionary
+        replaced by the encoded contents of the files, the other placeholders
+        are kept for the final substitution. The template must not contain '%%'.
+    """
+    signature = ( template, tuple( [ ( key, filePath, self.__getSignature( filePath ) )
+                                     for key, filePath in sorted( files.items() ) ] ) )
+    self.__lock.acquire()
+    try:
+      if signature in self.__templates:
+        return self.__templates[signature]
+    finally:
+      self.__lock.release()
+
+    values = _KeepPlaceholders()
+    for key, filePath in files.items():
+      values[key] = self.getEncodedFile( filePath )
+    prebuiltTemplate = template % values
+    self.__lock.acquire()
+    try:
+      # Drop the versions built for older files
+      for oldSignature in self.__templates.keys():
+        if oldSignature[0] == template:
+          del self.__templates[oldSignature]
+      self.__templates[signature] = prebuiltTemplate
+    finally:
+      self.__lock.release()
+    return prebuiltTemplate
+
+  def __getSignature( self, filePath ):
+    fileStat = os.stat( filePath )
+    return ( fileStat.st_mtime, fileStat.st_size )
+
+gPayloadCache = PayloadCache()
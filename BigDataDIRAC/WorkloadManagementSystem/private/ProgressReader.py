@@ -0,0 +1,138 @@
+########################################################################
+# $HeadURL$
+# File :   ProgressReader.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Progress reader of the interactive jobs, run on the endpoint next to the job
+  output.
+
+  Each call reads only the bytes appended to the output since the previous one,
+  the offset reached is kept in <output>.offset, and prints the progress found
+  in the new complete lines as one compact JSON event per line:
+    {"event":"running","job":"job_201401011200_0001"}
+    {"event":"total","jobs":2}
+    {"event":"started","job":"job_201401011200_0001"}
+    {"event":"ended","job":"job_201401011200_0001"}
+    {"event":"progress","map":100,"reduce":33}
+    {"event":"counter","name":"Map input records","value":1000}
+    {"event":"failed","message":"FAILED: ..."}
+  The poll cost grows with the new output, not with the size of the log.
+"""
+
+import json
+import re
+
+__RCSID__ = '$Id: $'
+
+# Patterns shared by the remote reader and the local watcher
+RUNNING_JOB_PATTERN = re.compile( '(?:Running job:|Submitting tokens for job:) (job_\S+)' )
+TOTAL_JOBS_PATTERN = re.compile( 'Total MapReduce jobs = (\d+)' )
+STARTED_JOB_PATTERN = re.compile( 'Starting Job = (.*?),' )
+ENDED_JOB_PATTERN = re.compile( 'Ended Job = (\S+)' )
+PROGRESS_PATTERN = re.compile( 'map (\d+)% reduce (\d+)%' )
+COUNTER_PATTERN = re.compile( '^(?:.*JobClient:)?\s+([A-Za-z][\w \-()]*?)=(\d+)\s*$' )
+
+PROGRESS_READER_TEMPLATE = """#!/usr/bin/env python
+# Progress reader of a BigData interactive job output
+import os, sys, re, getopt, json
+
+output = '%(output)s'
+offsetFile = output + '.offset'
+
+patterns = [ ( 'running', re.compile( %(running)r ) ),
+             ( 'total', re.compile( %(total)r ) ),
+             ( 'started', re.compile( %(started)r ) ),
+             ( 'ended', re.compile( %(ended)r ) ),
+             ( 'progress', re.compile( %(progress)r ) ),
+             ( 'counter', re.compile( %(counter)r ) ) ]
+
+def getEvent( name, match ):
+  if name == 'total':
+    return { 'event': name, 'jobs': int( match.group( 1 ) ) }
+  if name == 'progress':
+    return { 'event': name, 'map': int( match.group( 1 ) ), 'reduce': int( match.group( 2 ) ) }
+  if name == 'counter':
+    return { 'event': name, 'name': match.group( 1 ).strip(), 'value': int( match.group( 2 ) ) }
+  return { 'event': name, 'job': match.group( 1 ) }
+
+def readNewLines( maxSize ):
+  offset = 0
+  if os.path.exists( offsetFile ):
+    offset = int( open( offsetFile ).read().strip() or 0 )
+  if not os.path.exists( output ):
+    return []
+  log = open( output, 'rb' )
+  if os.path.getsize( output ) < offset:
+    offset = 0
+  log.seek( offset )
+  chunk = log.read( maxSize )
+  log.close()
+  complete = chunk[:chunk.rfind( '\\n' ) + 1]
+  if complete:
+    tmpName = '%%s.%%s' %% ( offsetFile, os.getpid() )
+    open( tmpName, 'w' ).write( str( offset + len( complete ) ) )
+    os.rename( tmpName, offsetFile )
+  return complete.splitlines()
+
+def main( argv ):
+  command = 'events'
+  maxSize = 1048576
+  try:
+    opts, args = getopt.getopt( argv, 'hc:m:', [''] )
+  except getopt.GetoptError:
+    print 'name.py -c <events|step1> [-m <maxbytes>]'
+    sys.exit( 2 )
+  for opt, arg in opts:
+    if opt == '-h':
+      print 'name.py -c <events|step1> [-m <maxbytes>]'
+      sys.exit()
+    elif opt in ( '-c', '--command' ):
+      command = arg
+    elif opt == '-m':
+      maxSize = int( arg )
+  for line in readNewLines( maxSize ):
+    if line.startswith( 'FAILED:' ):
+      print json.dumps( { 'event': 'failed', 'message': line }, separators = ( ',', ':' ) )
+      continue
+    for name, pattern in patterns:
+      match = pattern.search( line )
+      if not match:
+        continue
+      if command == 'step1':
+        if name == 'running':
+          print line
+      else:
+        print json.dumps( getEvent( name, match ), separators = ( ',', ':' ) )
+  sys.stdout.flush()
+
+if __name__ == '__main__':
+  main( sys.argv[1:] )
+"""
+
+def getProgressReader( output ):
+  """ Return the source of the progress reader of the given job output
+  """
+  return PROGRESS_READER_TEMPLATE % { 'output': output,
+                                      'running': RUNNING_JOB_PATTERN.pattern,
+                                      'total': TOTAL_JOBS_PATTERN.pattern,
+                                      'started': STARTED_JOB_PATTERN.pattern,
+                                      'ended': ENDED_JOB_PATTERN.pattern,
+                                      'progress': PROGRESS_PATTERN.pattern,
+                                      'counter': COUNTER_PATTERN.pattern }
+
+def parseEvents( output ):
+  """ Return the list of events printed by the progress reader, the lines that
+      are not events are ignored
+  """
+  events = []
+  for line in output.splitlines():
+    line = line.strip()
+    if not line.startswith( '{' ):
+      continue
+    try:
+      events.append( json.loads( line ) )
+    except ValueError:
+      continue
+  return events
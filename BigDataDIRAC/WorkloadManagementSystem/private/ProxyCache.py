@@ -0,0 +1,109 @@
+########################################################################
+# $HeadURL$
+# File :   ProxyCache.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Cache of the payload proxies used by the BigData submitters.
+
+  The proxy of a job owner is downloaded once per ( DN, group ) and reused by
+  the following submissions while it keeps at least MinProxyLifeTime seconds of
+  life. The bz2 compressed and base64 encoded version written in the job
+  wrappers is kept along with it.
+"""
+
+import base64
+import bz2
+import threading
+
+from DIRAC                                                    import S_OK, S_ERROR, gConfig, gLogger
+from DIRAC.Core.Utilities.DictCache                           import DictCache
+from DIRAC.FrameworkSystem.Client.ProxyManagerClient          import gProxyManager
+
+__RCSID__ = '$Id: $'
+
+class ProxyCache:
+
+  def __init__( self, minLifeTime = 3600 ):
+    self.log = gLogger.getSubLogger( "ProxyCache" )
+    self.minLifeTime = minLifeTime
+    self.__proxies = DictCache()
+    self.__encodedProxies = DictCache()
+    # One lock per ( DN, group ), the global one only guards the dictionary
+    self.__ownerLocks = {}
+    self.__lock = threading.Lock()
+
+  def getProxy( self, ownerDN, ownerGroup ):
+    """ Return the proxy chain of the owner, from the cache when it is still valid
+    """
+    key = ( ownerDN, ownerGroup )
+    chain = self.__proxies.get( key )
+    if chain:
+      return S_OK( chain )
+
+    # Only one download per owner when several submissions miss at the same time,
+    # the downloads of different owners do not wait for each other
+    self.__lock.acquire()
+    try:
+      ownerLock = self.__ownerLocks.setdefault( key, threading.Lock() )
+    finally:
+      self.__lock.release()
+    ownerLock.acquire()
+    try:
+      chain = self.__proxies.get( key )
+      if chain:
+        return S_OK( chain )
+      result = self.__downloadProxy( ownerDN, ownerGroup )
+      if not result['OK']:
+        return result
+      chain = result['Value']
+
+      result = chain.getRemainingSecs()
+      if not result['OK']:
+        return result
+      validity = result['Value'] - self.minLifeTime
+      if validity > 0:
+        self.__proxies.add( key, validity, chain )
+      self.log.verbose( 'Proxy of %s@%s cached for %s seconds' % ( ownerDN, ownerGroup, max( validity, 0 ) ) )
+      return S_OK( chain )
+    finally:
+      ownerLock.release()
+
+  def encodeProxy( self, chain ):
+    """ Return the proxy compressed and encoded in base64 in a single line, as it
+        is written in the job wrappers
+    """
+    entry = self.__encodedProxies.get( id( chain ) )
+    if entry and entry[0] is chain:
+      return entry[1]
+    encodedProxy = base64.encodestring( bz2.compress( chain.dumpAllToString()['Value'] ) ).replace( '\n', '' )
+    result = chain.getRemainingSecs()
+    if result['OK'] and result['Value'] > 0:
+      self.__encodedProxies.add( id( chain ), result['Value'], ( chain, encodedProxy ) )
+    return encodedProxy
+
+  def __downloadProxy( self, ownerDN, ownerGroup ):
+    """ Download the proxy of the owner, or ask a payload proxy for the group
+        when the owner has not uploaded one
+    """
+    result = gProxyManager.userHasProxy( ownerDN, ownerGroup, self.minLifeTime )
+    if result['OK'] and result['Value']:
+      result = gProxyManager.downloadProxy( ownerDN, ownerGroup, requiredTimeLeft = self.minLifeTime )
+      if result['OK']:
+        return result
+      self.log.warn( 'Could not download proxy of %s@%s:' % ( ownerDN, ownerGroup ), result['Message'] )
+
+    self.log.info( "Requesting proxy for %s@%s" % ( ownerDN, ownerGroup ) )
+    token = gConfig.getValue( "/Security/ProxyToken", "" )
+    if not token:
+      self.log.info( "No token defined. Trying to download proxy without token" )
+      token = False
+    proxyLength = gConfig.getValue( '/Registry/DefaultProxyLifeTime', 86400 * 5 )
+    result = gProxyManager.getPayloadProxyFromDIRACGroup( ownerDN, ownerGroup, proxyLength, token )
+    if not result[ 'OK' ]:
+      self.log.error( 'Could not retrieve proxy', result['Message'] )
+      return S_ERROR( 'Error retrieving proxy' )
+    return result
+
+gProxyCache = ProxyCache()
@@ -0,0 +1,157 @@
+########################################################################
+# $HeadURL$
+# File :   SandboxCache.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Content addressed cache of the input sandbox files on the endpoint master.
+
+  Every file of a job sandbox is stored once in the cache directory of the
+  endpoint under its sha1. Uploading a sandbox only ships the files whose hash
+  is missing remotely, the job directory is then built with hard links to the
+  cache ( symbolic links when the cache is in another file system ). Files not
+  used during MaxAge hours are evicted, and the oldest ones when the cache
+  grows over MaxSize MB. Job directories built with symbolic links depend on
+  the cache, so MaxAge must be longer than the jobs on such endpoints.
+
+  It is enabled per endpoint in /Resources/BigDataEndPoints/<EndPoint> with:
+    SandboxCache = True
+    SandboxCacheDirectory = /tmp/BigDataSandboxCache
+    SandboxCacheMaxSize = 2048
+    SandboxCacheMaxAge = 168
+"""
+
+import os
+import pipes
+import shutil
+import hashlib
+import tempfile
+
+from DIRAC                                                    import S_OK, S_ERROR, gLogger
+
+__RCSID__ = '$Id: $'
+
+class SandboxCache:
+
+  def __init__( self, sshConnect, cacheDirectory = '/tmp/BigDataSandboxCache',
+                maxSize = 2048, maxAge = 168, byPort = False ):
+    self.log = gLogger.getSubLogger( "SandboxCache" )
+    self.sshConnect = sshConnect
+    self.cacheDirectory = cacheDirectory.rstrip( '/' )
+    self.maxSize = maxSize
+    self.maxAge = maxAge
+    self.byPort = byPort
+
+  def upload( self, timeout, localPath, remotePath ):
+    """ Copy the directory localPath into the remote directory remotePath, like scp -r
+    """
+    localPath = localPath.rstrip( '/' )
+    remoteJobPath = '%s/%s' % ( remotePath.rstrip( '/' ), os.path.basename( localPath ) )
+
+    files = self.__hashFiles( localPath )
+    hashes = sorted( set( files.values() ) )
+
+    result = self.__getMissingHashes( timeout, hashes )
+    if not result['OK']:
+      return result
+    missing = result['Value']
+    self.log.info( '%s files in sandbox, %s not cached in %s' % ( len( files ), len( missing ),
+                                                                   self.sshConnect.host ) )
+    if missing:
+      result = self.__uploadFiles( timeout, localPath, files, missing )
+      if not result['OK']:
+        return result
+
+    return self.__linkFiles( timeout, remoteJobPath, files )
+
+  def __hashFiles( self, localPath ):
+    """ Return a dictionary with the relative path and the sha1 of every file
+    """
+    files = {}
+    for root, _dirs, fileNames in os.walk( localPath ):
+      for fileName in fileNames:
+        filePath = os.path.join( root, fileName )
+        sha1 = hashlib.sha1()
+        with open( filePath, 'rb' ) as fd:
+          for block in iter( lambda: fd.read( 1024 * 1024 ), '' ):
+            sha1.update( block )
+        files[os.path.relpath( filePath, localPath )] = sha1.hexdigest()
+    return files
+
+  def __getMissingHashes( self, timeout, hashes ):
+    """ One call lists the hashes not in the cache, the ones found are touched
+        so that they are not evicted
+    """
+    script = "mkdir -p %(cache)s && cd %(cache)s && while read h; do " \
+             "if [ -f \"$h\" ]; then touch \"$h\"; else echo \"$h\"; fi; done" % { 'cache': pipes.quote( self.cacheDirectory ) }
+    hashList = tempfile.NamedTemporaryFile( prefix = 'BigDataSandboxCache' )
+    try:
+      hashList.write( '\n'.join( hashes ) + '\n' )
+      hashList.flush()
+      result = self.sshConnect.pipeCall( timeout, 'cat %s' % hashList.name, script, True, self.byPort )
+    finally:
+      hashList.close()
+    if not result['OK']:
+      return result
+    return S_OK( set( result['Value'][1].split() ) )
+
+  def __uploadFiles( self, timeout, localPath, files, missing ):
+    """ Ship the missing files named by their hash in a single tar stream, they
+        are extracted in a directory of their own so a partial upload is never
+        used, and made read only since the job directories link to them
+    """
+    stagingDir = tempfile.mkdtemp( prefix = 'BigDataSandboxCache' )
+    try:
+      for relPath, fileHash in files.items():
+        stagedFile = os.path.join( stagingDir, '%s.part' % fileHash )
+        if fileHash not in missing or os.path.exists( stagedFile ):
+          continue
+        try:
+          os.link( os.path.join( localPath, relPath ), stagedFile )
+        except OSError:
+          shutil.copy( os.path.join( localPath, relPath ), stagedFile )
+      script = "cd %(cache)s && upload=$(mktemp -d .upload.XXXXXX) || exit 1; " \
+               "tar xzf - -C \"$upload\" && for f in \"$upload\"/*.part; do " \
+               "[ -f \"$f\" ] || continue; h=$(basename \"$f\" .part); mv -f \"$f\" \"$h\" && chmod a-w \"$h\"; done; " \
+               "status=$?; rm -rf \"$upload\"; exit $status" % { 'cache': pipes.quote( self.cacheDirectory ) }
+      return self.sshConnect.pipeCall( timeout, "tar czf - -C %s ." % pipes.quote( stagingDir ),
+                                       script, True, self.byPort )
+    finally:
+      shutil.rmtree( stagingDir, True )
+
+  def __linkFiles( self, timeout, remoteJobPath, files ):
+    """ Build the job directory from the cache and evict old files
+    """
+    lines = [ 'cd %s || exit 1' % pipes.quote( self.cacheDirectory ) ]
+    dirs = set( [ os.path.dirname( relPath ) for relPath in files ] )
+    for dirName in sorted( dirs ):
+      lines.append( 'mkdir -p %s' % pipes.quote( os.path.join( remoteJobPath, dirName ) ) )
+    for relPath, fileHash in sorted( files.items() ):
+      dest = pipes.quote( os.path.join( remoteJobPath, relPath ) )
+      lines.append( 'ln -f %s %s 2>/dev/null || ln -sf %s/%s %s' % ( fileHash, dest,
+                                                                      pipes.quote( self.cacheDirectory ), fileHash, dest ) )
+    lines.append( self.__getEvictionScript() )
+
+    script = tempfile.NamedTemporaryFile( prefix = 'BigDataSandboxCache' )
+    try:
+      script.write( '\n'.join( lines ) + '\n' )
+      script.flush()
+      return self.sshConnect.pipeCall( timeout, 'cat %s' % script.name, 'sh', True, self.byPort )
+    finally:
+      script.close()
+
+  def __getEvictionScript( self ):
+    """ Remove the files not used in maxAge hours, then the oldest ones until the
+        cache fits in maxSize MB
+    """
+    return "find . -maxdepth 1 -type f -mmin +%(maxAge)s -exec rm -f {} +\n" \
+           "find . -maxdepth 1 -type d -name '.upload.*' -mmin +%(maxAge)s -exec rm -rf {} +\n" \
+           "total=$(du -sk . | cut -f1)\n" \
+           "if [ \"$total\" -gt %(maxSize)s ]; then\n" \
+           "  for f in $(ls -tr); do\n" \
+           "    [ \"$total\" -le %(maxSize)s ] && break\n" \
+           "    size=$(du -k \"$f\" | cut -f1); rm -f \"$f\"; total=$((total - size))\n" \
+           "  done\n" \
+           "fi\n" \
+           "true" % { 'maxAge': int( self.maxAge * 60 ), 'maxSize': int( self.maxSize * 1024 ) }
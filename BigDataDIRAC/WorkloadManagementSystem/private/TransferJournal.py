@@ -0,0 +1,152 @@
+########################################################################
+# $HeadURL$
+# File :   TransferJournal.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  On disk journal of the output data transfers, kept in a SQLite file.
+
+  Each file of a transfer path has a State ( Transferring, Done, Failed or
+  Quarantined ), the number of failed Attempts, the Bytes transferred and the
+  NextRetry time. A failed file waits retryDelay * 2^( attempts - 1 ) seconds,
+  up to maxRetryDelay, before the next attempt, and is quarantined after
+  maxAttempts failures. The files Transferring when the executor stopped are
+  returned by getInFlight to be queued again after a restart.
+
+  A quarantined file is transferred again once release is called for it, or
+  when purge drops it after failedMaxAge seconds without changes.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from DIRAC                                                    import S_OK, S_ERROR, gLogger
+
+__RCSID__ = '$Id: $'
+
+class TransferJournal:
+
+  def __init__( self, journalFile, retryDelay = 60, maxRetryDelay = 3600, maxAttempts = 10 ):
+    self.log = gLogger.getSubLogger( "TransferJournal" )
+    self.journalFile = journalFile
+    self.retryDelay = retryDelay
+    self.maxRetryDelay = maxRetryDelay
+    self.maxAttempts = maxAttempts
+    self.__lock = threading.Lock()
+    journalDir = os.path.dirname( journalFile )
+    if journalDir and not os.path.isdir( journalDir ):
+      os.makedirs( journalDir )
+    self.__connection = sqlite3.connect( journalFile, check_same_thread = False )
+    self.__connection.execute( """CREATE TABLE IF NOT EXISTS Transfers (
+                                    TransferPath TEXT NOT NULL,
+                                    FileName TEXT NOT NULL,
+                                    State TEXT NOT NULL,
+                                    Attempts INTEGER NOT NULL DEFAULT 0,
+                                    Bytes INTEGER NOT NULL DEFAULT 0,
+                                    NextRetry REAL NOT NULL DEFAULT 0,
+                                    LastUpdate REAL NOT NULL,
+                                    PRIMARY KEY ( TransferPath, FileName ) )""" )
+    self.__connection.execute( "CREATE INDEX IF NOT EXISTS TransfersState ON Transfers ( State )" )
+    self.__connection.commit()
+
+  def __execute( self, query, args = (), many = False ):
+    self.__lock.acquire()
+    try:
+      try:
+        if many:
+          cursor = self.__connection.executemany( query, args )
+        else:
+          cursor = self.__connection.execute( query, args )
+        rows = cursor.fetchall()
+        self.__connection.commit()
+      except sqlite3.Error, x:
+        self.__connection.rollback()
+        self.log.error( 'Journal query failed:', str( x ) )
+        return S_ERROR( 'Transfer journal error: %s' % str( x ) )
+    finally:
+      self.__lock.release()
+    return S_OK( rows )
+
+  def setTransferring( self, transferPath, fileNames ):
+    """ Record the files queued for transfer, keeping their previous attempts
+    """
+    now = time.time()
+    return self.__execute( """INSERT OR REPLACE INTO Transfers
+                              ( FileName, TransferPath, State, Attempts, Bytes, NextRetry, LastUpdate )
+                              VALUES ( ?, ?, 'Transferring',
+                                       COALESCE( ( SELECT Attempts FROM Transfers WHERE TransferPath = ? AND
+                                                   FileName = ? AND State != 'Done' ), 0 ),
+                                       0, 0, ? )""",
+                           [ ( fileName, transferPath, transferPath, fileName, now ) for fileName in fileNames ],
+                           many = True )
+
+  def setDone( self, transferPath, fileName, transferredBytes = 0 ):
+    return self.__execute( """UPDATE Transfers SET State = 'Done', Bytes = ?, NextRetry = 0, LastUpdate = ?
+                              WHERE TransferPath = ? AND FileName = ?""",
+                           ( transferredBytes, time.time(), transferPath, fileName ) )
+
+  def setFailed( self, transferPath, fileName ):
+    """ Count a failed attempt and delay the next one, or quarantine the file
+    """
+    result = self.__execute( "SELECT Attempts FROM Transfers WHERE TransferPath = ? AND FileName = ?",
+                             ( transferPath, fileName ) )
+    if not result['OK']:
+      return result
+    if not result['Value']:
+      return S_ERROR( 'File %s not in the transfer journal' % fileName )
+    attempts = result['Value'][0][0] + 1
+    now = time.time()
+    if attempts >= self.maxAttempts:
+      self.log.warn( 'File %s quarantined after %s failed attempts' % ( fileName, attempts ) )
+      state = 'Quarantined'
+      nextRetry = 0
+    else:
+      state = 'Failed'
+      nextRetry = now + min( self.retryDelay * 2 ** ( attempts - 1 ), self.maxRetryDelay )
+    result = self.__execute( """UPDATE Transfers SET State = ?, Attempts = ?, NextRetry = ?, LastUpdate = ?
+                                WHERE TransferPath = ? AND FileName = ?""",
+                             ( state, attempts, nextRetry, now, transferPath, fileName ) )
+    if not result['OK']:
+      return result
+    return S_OK( state )
+
+  def getBlockedFiles( self, transferPath ):
+    """ Return the set of files of the transfer path that must not be queued now,
+        waiting for their next retry or quarantined
+    """
+    result = self.__execute( """SELECT FileName FROM Transfers WHERE TransferPath = ? AND
+                                ( State = 'Quarantined' OR ( State = 'Failed' AND NextRetry > ? ) )""",
+                             ( transferPath, time.time() ) )
+    if not result['OK']:
+      return result
+    return S_OK( set( [ row[0] for row in result['Value'] ] ) )
+
+  def getInFlight( self ):
+    """ Return a dictionary of transfer path and files being transferred when the
+        journal was last used
+    """
+    result = self.__execute( "SELECT TransferPath, FileName FROM Transfers WHERE State = 'Transferring'" )
+    if not result['OK']:
+      return result
+    inFlight = {}
+    for transferPath, fileName in result['Value']:
+      inFlight.setdefault( transferPath, [] ).append( fileName )
+    return S_OK( inFlight )
+
+  def release( self, transferPath, fileName ):
+    """ Forget the quarantine of a file so it is transferred again
+    """
+    return self.__execute( "DELETE FROM Transfers WHERE TransferPath = ? AND FileName = ?",
+                           ( transferPath, fileName ) )
+
+  def purge( self, maxAge = 86400, failedMaxAge = 7 * 86400 ):
+    """ Remove the files done more than maxAge seconds ago, and the failed or
+        quarantined ones not changed for failedMaxAge seconds
+    """
+    now = time.time()
+    return self.__execute( """DELETE FROM Transfers WHERE ( State = 'Done' AND LastUpdate < ? ) OR
+                              ( State IN ( 'Failed', 'Quarantined' ) AND LastUpdate < ? )""",
+                           ( now - maxAge, now - failedMaxAge ) )
@@ -0,0 +1,181 @@
+########################################################################
+# $HeadURL$
+# File :   TransferProcessPool.py
+# Author : Victor Fernandez
+########################################################################
+
+"""
+  Pool of long lived processes running the storage operations of the output
+  data transfers.
+
+  lcg_util bindings are not thread safe, so the operations can not run in the
+  threads of the executor. Instead of forking a new process per operation, the
+  workers are kept between transfers together with their StorageElement and
+  ReplicaManager objects. Each call takes an idle worker, or starts a new one
+  while there are less than maxWorkers, and sends it the operation through a
+  pipe. A worker exceeding the timeout is terminated and replaced.
+"""
+
+import multiprocessing
+import threading
+
+from DIRAC                                            import S_OK, S_ERROR, gLogger
+from DIRAC.DataManagementSystem.Client.ReplicaManager import ReplicaManager
+from DIRAC.Resources.Storage.StorageElement           import StorageElement
+
+__RCSID__ = '$Id: $'
+
+def _runWorker( connection ):
+  """ Loop of the worker processes, the operations are ( seName, method, args, kwargs )
+      and seName None means a ReplicaManager operation
+  """
+  storageElements = {}
+  replicaManager = None
+  while True:
+    try:
+      task = connection.recv()
+    except ( EOFError, IOError ):
+      break
+    if task is None:
+      break
+    seName, method, args, kwargs = task
+    try:
+      if seName is None:
+        if not replicaManager:
+          replicaManager = ReplicaManager()
+        target = replicaManager
+      else:
+        if seName not in storageElements:
+          storageElements[seName] = StorageElement( seName )
+        target = storageElements[seName]
+      result = getattr( target, method )( *args, **kwargs )
+    except Exception, x:
+      result = S_ERROR( 'Exception in %s: %s' % ( method, str( x ) ) )
+    try:
+      connection.send( result )
+    except ( EOFError, IOError ):
+      break
+    except Exception, x:
+      connection.send( S_ERROR( 'Result of %s not sent: %s' % ( method, str( x ) ) ) )
+
+class TransferProcessPool:
+
+  def __init__( self, minWorkers = 1, maxWorkers = 4 ):
+    self.log = gLogger.getSubLogger( "TransferProcessPool" )
+    self.minWorkers = max( 0, minWorkers )
+    self.maxWorkers = max( 1, maxWorkers, self.minWorkers )
+    self.__idleWorkers = []
+    self.__numWorkers = 0
+    self.__condition = threading.Condition()
+    for _i in range( self.minWorkers ):
+      self.__idleWorkers.append( self.__startWorker() )
+      self.__numWorkers += 1
+
+  def call( self, timeout, seName, method, *args, **kwargs ):
+    """ Run the method of the StorageElement seName, or of the ReplicaManager when
+        seName is None, in a worker. Returns S_OK with the result of the method,
+        as pythonCall does.
+    """
+    worker = self.__getWorker()
+    if not worker:
+      return S_ERROR( 'Transfer process pool closed' )
+    process, connection = worker
+    try:
+      connection.send( ( seName, method, args, kwargs ) )
+      if not connection.poll( timeout ):
+        self.log.error( 'Timeout running %s, terminating worker %s' % ( method, process.pid ) )
+        self.__dropWorker( worker )
+        return S_ERROR( 'Timeout after %s seconds running %s' % ( timeout, method ) )
+      result = connection.recv()
+    except ( EOFError, IOError ), x:
+      self.log.error( 'Worker %s lost running %s:' % ( process.pid, method ), str( x ) )
+      self.__dropWorker( worker )
+      return S_ERROR( 'Transfer worker lost: %s' % str( x ) )
+    except Exception, x:
+      # e.g. arguments or result that can not be pickled, the pipe may be left
+      # with a partial message so the worker is not used again
+      self.log.error( 'Error exchanging %s with worker %s:' % ( method, process.pid ), str( x ) )
+      self.__dropWorker( worker )
+      return S_ERROR( 'Exception in %s: %s' % ( method, str( x ) ) )
+    self.__releaseWorker( worker )
+    return S_OK( result )
+
+  def close( self ):
+    """ Stop the idle workers, the busy ones stop when released
+    """
+    self.__condition.acquire()
+    try:
+      self.maxWorkers = 0
+      while self.__idleWorkers:
+        self.__stopWorker( self.__idleWorkers.pop() )
+        self.__numWorkers -= 1
+      self.__condition.notifyAll()
+    finally:
+      self.__condition.release()
+
+  def __startWorker( self ):
+    parentConnection, childConnection = multiprocessing.Pipe()
+    process = multiprocessing.Process( target = _runWorker, args = ( childConnection, ) )
+    process.daemon = True
+    process.start()
+    childConnection.close()
+    self.log.verbose( 'Started transfer worker', process.pid )
+    return ( process, parentConnection )
+
+  def __stopWorker( self, worker ):
+    process, connection = worker
+    try:
+      connection.send( None )
+    except IOError:
+      pass
+    connection.close()
+    process.join( 1 )
+    if process.is_alive():
+      process.terminate()
+
+  def __getWorker( self ):
+    self.__condition.acquire()
+    try:
+      while not self.__idleWorkers and self.__numWorkers >= self.maxWorkers:
+        if not self.maxWorkers:
+          return None
+        self.__condition.wait()
+      if self.__idleWorkers:
+        return self.__idleWorkers.pop()
+      self.__numWorkers += 1
+    finally:
+      self.__condition.release()
+    try:
+      return self.__startWorker()
+    except OSError:
+      self.__condition.acquire()
+      try:
+        self.__numWorkers -= 1
+        self.__condition.notify()
+      finally:
+        self.__condition.release()
+      raise
+
+  def __releaseWorker( self, worker ):
+    self.__condition.acquire()
+    try:
+      if self.__numWorkers > self.maxWorkers or not worker[0].is_alive():
+        self.__stopWorker( worker )
+        self.__numWorkers -= 1
+      else:
+        self.__idleWorkers.append( worker )
+      self.__condition.notify()
+    finally:
+      self.__condition.release()
+
+  def __dropWorker( self, worker ):
+    process, connection = worker
+    process.terminate()
+    process.join( 1 )
+    connection.close()
+    self.__condition.acquire()
+    try:
+      self.__numWorkers -= 1
+      self.__condition.notify()
+    finally:
+      self.__condition.release()
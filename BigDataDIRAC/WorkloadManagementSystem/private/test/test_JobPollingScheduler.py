@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+#
+# Tests of the JobPollingScheduler of the BigData job monitoring
+#
+import unittest
+
+from BigDataDIRAC.WorkloadManagementSystem.private.JobPollingScheduler import JobPollingScheduler
+
+class JobPollingSchedulerTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.scheduler = JobPollingScheduler( minInterval = 10, maxInterval = 60, backoffFactor = 2.0 )
+
+  def __getIntervals( self, jobId, states, now = 0 ):
+    """ Update the job with each state when it is due, returns the intervals used
+    """
+    intervals = []
+    for state in states:
+      self.assertEqual( self.scheduler.getDueJobs( [ jobId ], now ), set( [ jobId ] ) )
+      self.scheduler.update( jobId, 'EndPoint', state, now )
+      nextCheck = now
+      while not self.scheduler.getDueJobs( [ jobId ], nextCheck ):
+        nextCheck += 1
+      intervals.append( nextCheck - now )
+      now = nextCheck
+    return intervals
+
+  def test_newJobsDue( self ):
+    self.assertEqual( self.scheduler.getDueJobs( [ 1, 2 ], 0 ), set( [ 1, 2 ] ) )
+
+  def test_backoff( self ):
+    intervals = self.__getIntervals( 1, [ 'Running' ] * 5 )
+    self.assertEqual( intervals, [ 10, 20, 40, 60, 60 ] )
+
+  def test_stateChange( self ):
+    intervals = self.__getIntervals( 1, [ 'Submitted', 'Submitted', 'Submitted', 'Running', 'Running' ] )
+    self.assertEqual( intervals, [ 10, 20, 40, 10, 20 ] )
+
+  def test_notDueBeforeInterval( self ):
+    self.scheduler.update( 1, 'EndPoint', 'Running', 0 )
+    self.assertEqual( self.scheduler.getDueJobs( [ 1 ], 9 ), set() )
+    self.assertEqual( self.scheduler.getDueJobs( [ 1 ], 10 ), set( [ 1 ] ) )
+
+  def test_forgetJobs( self ):
+    self.scheduler.update( 1, 'EndPoint', 'Running', 0 )
+    # Job 1 left the list and is forgotten, when it comes back it is due at once
+    self.assertEqual( self.scheduler.getDueJobs( [ 2 ], 1 ), set( [ 2 ] ) )
+    self.assertEqual( self.scheduler.getDueJobs( [ 1 ], 2 ), set( [ 1 ] ) )
+
+  def test_expectedRunTime( self ):
+    # A job of the endpoint took 100 seconds
+    self.scheduler.update( 1, 'EndPoint', 'Running', 0 )
+    self.scheduler.jobFinished( 1, 'EndPoint', 100 )
+    # At 75 the backoff to 60 seconds is shortened to 25 to check it at 100
+    self.scheduler.update( 2, 'EndPoint', 'Running', 0 )
+    self.scheduler.update( 2, 'EndPoint', 'Running', 15 )
+    self.scheduler.update( 2, 'EndPoint', 'Running', 35 )
+    self.scheduler.update( 2, 'EndPoint', 'Running', 75 )
+    self.assertEqual( self.scheduler.getDueJobs( [ 2 ], 99 ), set() )
+    self.assertEqual( self.scheduler.getDueJobs( [ 2 ], 100 ), set( [ 2 ] ) )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( JobPollingSchedulerTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+#
+# Tests of the LocalDirectoryScanner of the LocalDisk output data transfers,
+# the directory is scanned as done without pyinotify
+#
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import BigDataDIRAC.WorkloadManagementSystem.private.LocalDirectoryScanner as LocalDirectoryScanner
+
+class LocalDirectoryScannerTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.pyinotify = LocalDirectoryScanner.pyinotify
+    LocalDirectoryScanner.pyinotify = None
+    self.path = tempfile.mkdtemp()
+    self.scanner = LocalDirectoryScanner.LocalDirectoryScanner( self.path, settleTime = 10 )
+
+  def tearDown( self ):
+    LocalDirectoryScanner.pyinotify = self.pyinotify
+    shutil.rmtree( self.path )
+
+  def __writeFile( self, name, content, age = 0 ):
+    fileName = os.path.join( self.path, name )
+    open( fileName, 'w' ).write( content )
+    if age:
+      mTime = time.time() - age
+      os.utime( fileName, ( mTime, mTime ) )
+
+  def test_settledFile( self ):
+    self.__writeFile( 'old', 'abc', age = 60 )
+    # The first listing only records the size and modification time
+    self.assertEqual( self.scanner.getFileSizes(), {} )
+    self.assertEqual( self.scanner.getFileSizes(), { 'old': 3 } )
+
+  def test_fileBeingWritten( self ):
+    self.__writeFile( 'new', 'abc' )
+    self.scanner.getFiles()
+    self.assertEqual( self.scanner.getFiles(), [] )
+    # Still growing, the settle time starts again
+    self.__writeFile( 'new', 'abcdef', age = 60 )
+    self.assertEqual( self.scanner.getFiles(), [] )
+    self.assertEqual( self.scanner.getFileSizes(), { 'new': 6 } )
+
+  def test_removedFile( self ):
+    self.__writeFile( 'old', 'abc', age = 60 )
+    self.scanner.getFiles()
+    self.assertEqual( self.scanner.getFiles(), [ 'old' ] )
+    os.unlink( os.path.join( self.path, 'old' ) )
+    self.assertEqual( self.scanner.getFiles(), [] )
+
+  def test_subdirectories( self ):
+    os.mkdir( os.path.join( self.path, 'subdir' ) )
+    self.scanner.getFiles()
+    self.assertEqual( self.scanner.getFiles(), [] )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( LocalDirectoryScannerTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#
+# Tests of the TokenBucket limiting the output data transfers queued per second
+#
+import unittest
+
+import BigDataDIRAC.WorkloadManagementSystem.private.OutputDataExecutor as OutputDataExecutor
+from BigDataDIRAC.WorkloadManagementSystem.private.OutputDataExecutor import TokenBucket
+
+class FakeClock:
+
+  def __init__( self ):
+    self.now = 1000.0
+
+  def time( self ):
+    return self.now
+
+class TokenBucketTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.clock = FakeClock()
+    self.realTime = OutputDataExecutor.time
+    OutputDataExecutor.time = self.clock
+
+  def tearDown( self ):
+    OutputDataExecutor.time = self.realTime
+
+  def test_burst( self ):
+    bucket = TokenBucket( 2, 5 )
+    for _i in range( 5 ):
+      self.assertTrue( bucket.consume() )
+    self.assertFalse( bucket.consume() )
+
+  def test_defaultCapacity( self ):
+    bucket = TokenBucket( 0.5 )
+    self.assertTrue( bucket.consume() )
+    self.assertFalse( bucket.consume() )
+
+  def test_refill( self ):
+    bucket = TokenBucket( 2, 4 )
+    for _i in range( 4 ):
+      bucket.consume()
+    self.clock.now += 1
+    self.assertTrue( bucket.consume() )
+    self.assertTrue( bucket.consume() )
+    self.assertFalse( bucket.consume() )
+
+  def test_capacityCap( self ):
+    bucket = TokenBucket( 10, 3 )
+    self.clock.now += 3600
+    for _i in range( 3 ):
+      self.assertTrue( bucket.consume() )
+    self.assertFalse( bucket.consume() )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( TokenBucketTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )
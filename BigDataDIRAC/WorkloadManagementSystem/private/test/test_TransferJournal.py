@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+#
+# Tests of the TransferJournal of the output data transfers
+#
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from BigDataDIRAC.WorkloadManagementSystem.private.TransferJournal import TransferJournal
+
+class TransferJournalTestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    self.journalDir = tempfile.mkdtemp()
+    self.journalFile = os.path.join( self.journalDir, 'journal', 'TransferJournal.db' )
+    self.journal = TransferJournal( self.journalFile, retryDelay = 10, maxRetryDelay = 30, maxAttempts = 4 )
+
+  def tearDown( self ):
+    shutil.rmtree( self.journalDir )
+
+  def __getNextRetry( self, transferPath, fileName ):
+    connection = TransferJournal( self.journalFile )._TransferJournal__connection
+    return connection.execute( "SELECT NextRetry FROM Transfers WHERE TransferPath = ? AND FileName = ?",
+                               ( transferPath, fileName ) ).fetchone()[0]
+
+  def test_done( self ):
+    self.assertTrue( self.journal.setTransferring( 'PathA', [ 'file1' ] )['OK'] )
+    self.assertTrue( self.journal.setDone( 'PathA', 'file1', 100 )['OK'] )
+    self.assertEqual( self.journal.getInFlight()['Value'], {} )
+    self.assertEqual( self.journal.getBlockedFiles( 'PathA' )['Value'], set() )
+
+  def test_backoff( self ):
+    self.journal.setTransferring( 'PathA', [ 'file1' ] )
+    delays = []
+    for _i in range( 3 ):
+      before = time.time()
+      self.assertEqual( self.journal.setFailed( 'PathA', 'file1' )['Value'], 'Failed' )
+      delays.append( self.__getNextRetry( 'PathA', 'file1' ) - before )
+      self.assertEqual( self.journal.getBlockedFiles( 'PathA' )['Value'], set( [ 'file1' ] ) )
+      # Queued again keeps the failed attempts
+      self.journal.setTransferring( 'PathA', [ 'file1' ] )
+    # 10, 20 and then capped at 30 seconds
+    for delay, expected in zip( delays, [ 10, 20, 30 ] ):
+      self.assertTrue( expected <= delay < expected + 1 )
+
+  def test_quarantine( self ):
+    self.journal.setTransferring( 'PathA', [ 'file1' ] )
+    for _i in range( 3 ):
+      self.assertEqual( self.journal.setFailed( 'PathA', 'file1' )['Value'], 'Failed' )
+    self.assertEqual( self.journal.setFailed( 'PathA', 'file1' )['Value'], 'Quarantined' )
+    self.assertEqual( self.journal.getBlockedFiles( 'PathA' )['Value'], set( [ 'file1' ] ) )
+    self.assertTrue( self.journal.release( 'PathA', 'file1' )['OK'] )
+    self.assertEqual( self.journal.getBlockedFiles( 'PathA' )['Value'], set() )
+
+  def test_transferPaths( self ):
+    self.journal.setTransferring( 'PathA', [ 'file1' ] )
+    self.journal.setTransferring( 'PathB', [ 'file1' ] )
+    self.journal.setFailed( 'PathA', 'file1' )
+    self.journal.setDone( 'PathB', 'file1' )
+    self.assertEqual( self.journal.getBlockedFiles( 'PathA' )['Value'], set( [ 'file1' ] ) )
+    self.assertEqual( self.journal.getBlockedFiles( 'PathB' )['Value'], set() )
+    self.assertFalse( self.journal.setFailed( 'PathC', 'file1' )['OK'] )
+
+  def test_inFlight( self ):
+    self.journal.setTransferring( 'PathA', [ 'file1', 'file2' ] )
+    self.journal.setTransferring( 'PathB', [ 'file3' ] )
+    self.journal.setDone( 'PathA', 'file2' )
+    # A new journal on the same file finds the transfers left by the previous one
+    journal = TransferJournal( self.journalFile )
+    inFlight = journal.getInFlight()['Value']
+    self.assertEqual( inFlight, { 'PathA': [ 'file1' ], 'PathB': [ 'file3' ] } )
+
+  def test_purge( self ):
+    self.journal.setTransferring( 'PathA', [ 'file1', 'file2', 'file3' ] )
+    self.journal.setDone( 'PathA', 'file1' )
+    for _i in range( 4 ):
+      self.journal.setFailed( 'PathA', 'file2' )
+    self.journal.purge( maxAge = 3600, failedMaxAge = 3600 )
+    self.assertEqual( self.journal.getBlockedFiles( 'PathA' )['Value'], set( [ 'file2' ] ) )
+    self.journal.purge( maxAge = -1, failedMaxAge = -1 )
+    self.assertEqual( self.journal.getBlockedFiles( 'PathA' )['Value'], set() )
+    # Transferring files are never purged
+    self.assertEqual( self.journal.getInFlight()['Value'], { 'PathA': [ 'file3' ] } )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( TransferJournalTestCase )
+  unittest.TextTestRunner( verbosity = 2 ).run( suite )